@@ -0,0 +1,344 @@
+import atexit
+import logging
+import math
+import multiprocessing
+import signal
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import record_chunk_stats
+from rules import get_ruleset, use_ruleset
+from validator import (analyze_code_with_stats, analysis_error_result, chunk_cache, split_statements,
+                       INCREMENTAL_MIN_LINES)
+
+
+class AnalysisTimeout(BaseException):
+    """
+    Raised inside a pool process when a file takes too long to analyze.
+
+    It is a BaseException so the analyzer's own error handling cannot
+    swallow it.
+    """
+
+
+def _raise_timeout(signum, frame):
+    raise AnalysisTimeout()
+
+
+def limit_memory(max_bytes):
+    """
+    Cap the address space of the current process (pool initializer).
+
+    Allocations beyond the cap raise MemoryError in this process only, so a
+    pathological file cannot make the host swap or trigger the OOM killer.
+    Does nothing where the resource module is unavailable (Windows).
+    """
+    if not max_bytes:
+        return
+    try:
+        import resource
+    except ImportError:
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ValueError, OSError) as e:
+        logging.warning(f"Could not limit analysis memory: {e}")
+
+
+def _init_worker(memory_limit, chunk_cache_size, ruleset_definition):
+    """Set up a pool process: memory cap, size of its chunk cache and rule set."""
+    limit_memory(memory_limit)
+    chunk_cache.configure(chunk_cache_size)
+    use_ruleset(ruleset_definition)
+
+
+def _analyze_in_worker(code, python_version, timeout, limits=None):
+    """
+    Analyze one file inside a pool process.
+
+    The time limit is enforced with SIGALRM where available, so a slow file
+    gives up without killing the pool process. Returns (result,
+    suggestions, chunk stats), or None on timeout.
+    """
+    use_alarm = timeout and hasattr(signal, "setitimer")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            return analyze_code_with_stats(code, python_version, limits)
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except AnalysisTimeout:
+        # Also raised when the alarm goes off just before it is disarmed
+        return None
+    except (MemoryError, RecursionError):
+        return analysis_error_result(
+            "A submissão é muito grande ou complexa para ser analisada "
+            "(limite de memória excedido)."), [], None
+
+
+class AnalysisPool:
+    """
+    Persistent process pool shared by all requests of a worker.
+
+    Each of the max_workers processes runs in its own single-process
+    executor, created on first use with the "spawn" start method, so the
+    processes never inherit the database connections or threads of the
+    gunicorn worker. Each process caps its own memory with setrlimit. A
+    process broken by a crash or a stuck file is discarded and a new one is
+    started by the next request.
+
+    Every process keeps its own chunk cache, so files are routed by chunk
+    affinity: a file goes to the process that was last given most of its
+    chunks (an edited resubmission lands where its unchanged chunks are
+    cached), unless that process already has its share of the batch. Files
+    without affinity go to the least busy process, the first one on ties,
+    so sequential traffic uses a single process.
+    """
+
+    def __init__(self, max_workers=0, timeout=10, memory_limit=0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._executors = {}
+        # Files in flight per process, across concurrent requests
+        self._busy = Counter()
+        # When the file each busy process is working on started (files run
+        # one at a time, in order: the next one starts when one finishes)
+        self._started = {}
+        # Hash of a chunk's text -> process last given that chunk, LRU
+        self._affinity = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, max_workers, timeout, memory_limit=0):
+        """
+        Set the pool size, the per-file timeout (in seconds) and the memory
+        limit of each process (in bytes, 0 for none).
+        """
+        with self._lock:
+            if memory_limit != self.memory_limit:
+                # Running processes keep the old limit: start new ones
+                executors, self._executors = list(self._executors.values()), {}
+                self._affinity.clear()
+            else:
+                executors = [self._executors.pop(slot) for slot in list(self._executors)
+                             if slot >= max_workers]
+            self.max_workers = max_workers
+            self.timeout = timeout
+            self.memory_limit = memory_limit
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    def _get_executor(self, slot):
+        with self._lock:
+            executor = self._executors.get(slot)
+            if executor is None:
+                executor = self._executors[slot] = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit, chunk_cache.maxsize, get_ruleset().definition)
+                )
+            return executor
+
+    def _discard(self, slot, executor, kill=False):
+        """Drop a broken executor, terminating its process if asked."""
+        with self._lock:
+            if self._executors.get(slot) is executor:
+                del self._executors[slot]
+                # The new process starts with an empty chunk cache
+                for key in [key for key, owner in self._affinity.items() if owner == slot]:
+                    del self._affinity[key]
+        if kill:
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _assign(self, codes):
+        """
+        Pick the process of each file by chunk affinity (see the class).
+
+        Returns:
+            list: The process slot of each file, in order
+        """
+        # Chunks are only cached for incrementally analyzed files; splitting
+        # is a cheap text scan, and the hash only has to match in this process
+        chunk_hashes = [
+            [hash(text) for _, text in split_statements(code)]
+            if chunk_cache.enabled and code.count('\n') + 1 >= INCREMENTAL_MIN_LINES else []
+            for code in codes
+        ]
+        share = math.ceil(len(codes) / self.max_workers)
+        max_entries = chunk_cache.maxsize * self.max_workers
+        load = Counter()
+        slots = []
+        with self._lock:
+            for hashes in chunk_hashes:
+                votes = Counter(self._affinity[key] for key in hashes if key in self._affinity)
+                slot = next((slot for slot, _ in votes.most_common()
+                             if slot < self.max_workers and load[slot] < share), None)
+                if slot is None:
+                    slot = min(range(self.max_workers),
+                               key=lambda candidate: (load[candidate] + self._busy[candidate], candidate))
+                load[slot] += 1
+                slots.append(slot)
+                for key in hashes:
+                    self._affinity[key] = slot
+                    self._affinity.move_to_end(key)
+                while len(self._affinity) > max_entries:
+                    self._affinity.popitem(last=False)
+        return slots
+
+    def _done(self, slot):
+        with self._lock:
+            self._busy[slot] -= 1
+            if self._busy[slot] > 0:
+                self._started[slot] = time.monotonic()
+            else:
+                self._started.pop(slot, None)
+
+    def _overdue_at(self, slot):
+        """
+        Time after which the file a process is working on has had its
+        timeout plus one timeout of slack, or None when the process is idle.
+        """
+        started = self._started.get(slot)
+        return None if started is None else started + 2 * self.timeout
+
+    def analyze_many(self, codes, python_version, limits=None):
+        """
+        Analyze several files in parallel.
+
+        Args:
+            codes (list): The source code of each file
+            python_version (str): The Python version to validate against
+            limits (AnalysisLimits): Size and complexity limits
+
+        Returns:
+            list: (validation result, suggestions) for each file, in the same
+            order as codes; None for files that timed out or could not be
+            analyzed
+        """
+        if not codes:
+            return []
+
+        slots = self._assign(codes)
+        futures = []
+        for code, slot in zip(codes, slots):
+            try:
+                executor = self._get_executor(slot)
+                try:
+                    future = executor.submit(_analyze_in_worker, code, python_version, self.timeout, limits)
+                except BrokenProcessPool:
+                    # The process died since the last request: start a new one
+                    self._discard(slot, executor)
+                    executor = self._get_executor(slot)
+                    future = executor.submit(_analyze_in_worker, code, python_version, self.timeout, limits)
+            except BrokenProcessPool:
+                self._discard(slot, executor)
+                for _, _, submitted in futures:
+                    submitted.cancel()
+                raise
+            with self._lock:
+                self._busy[slot] += 1
+                if self._busy[slot] == 1:
+                    self._started[slot] = time.monotonic()
+            future.add_done_callback(lambda _, slot=slot: self._done(slot))
+            futures.append((slot, executor, future))
+
+        self._wait(futures, slots)
+
+        results = []
+        broken = {}
+        for slot, executor, future in futures:
+            if not future.done() or future.cancelled():
+                results.append(None)
+                continue
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                broken[slot] = executor
+                results.append(None)
+            except Exception as e:
+                logging.error(f"Error analyzing file in pool: {e!r}")
+                results.append(None)
+            else:
+                if result is not None:
+                    # Chunks were reused in the pool process: count them here
+                    record_chunk_stats(result[2])
+                    result = result[:2]
+                results.append(result)
+
+        for slot, executor in broken.items():
+            self._discard(slot, executor)
+
+        return results
+
+    def _wait(self, futures, slots):
+        """
+        Wait for the files of one request, with a backstop for files the
+        alarm cannot interrupt (e.g. a long ast.parse call).
+
+        A process is terminated only when the file it is working on, whoever
+        submitted it, has run for its timeout plus one timeout of slack;
+        time spent waiting in a queue never counts. The request itself gives
+        up after one round of timeout per file queued on its busiest process
+        (counting other requests' files) plus one round of slack: files
+        still queued then are cancelled and their result is None.
+        """
+        if not self.timeout:
+            wait([future for _, _, future in futures])
+            return
+        with self._lock:
+            rounds = max(self._busy[slot] for slot in set(slots)) + 1
+        deadline = time.monotonic() + self.timeout * rounds
+
+        killed = set()
+        while True:
+            pending = [(slot, executor, future) for slot, executor, future in futures
+                       if not future.done()]
+            if not pending:
+                return
+            now = time.monotonic()
+            if now >= deadline:
+                for _, _, future in pending:
+                    future.cancel()
+                return
+            with self._lock:
+                overdue_at = {slot: self._overdue_at(slot) for slot, executor, _ in pending
+                              if executor not in killed}
+            wake = deadline
+            for slot, executor, _ in pending:
+                at = overdue_at.get(slot)
+                if at is None:
+                    continue
+                if at > now:
+                    wake = min(wake, at)
+                elif executor not in killed:
+                    logging.warning(f"Analysis process {slot} is stuck on a file: terminating it")
+                    killed.add(executor)
+                    self._discard(slot, executor, kill=True)
+            # Wake up when a file finishes or a process may be overdue
+            wait([future for _, _, future in pending], timeout=max(wake - now, 0),
+                 return_when=FIRST_COMPLETED)
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+            self._affinity.clear()
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Pool shared by all requests handled by this process
+analysis_pool = AnalysisPool()
+atexit.register(analysis_pool.shutdown)
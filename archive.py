@@ -0,0 +1,118 @@
+import tarfile
+import zipfile
+
+
+class ArchiveError(Exception):
+    """Raised when an archive cannot be read or exceeds a limit."""
+
+
+def _read_limited(fileobj, max_file_size):
+    """Read at most max_file_size bytes, failing if there is more data."""
+    data = fileobj.read(max_file_size + 1)
+    if len(data) > max_file_size:
+        return None
+    return data
+
+
+def iter_archive_members(fileobj, filename, max_members, max_file_size, max_total_size):
+    """
+    Yield the Python files of a .zip or .tar(.gz) archive one at a time.
+
+    Members are read one by one, never extracting the whole archive. Limits
+    are checked on the data the archive makes us decompress, not only on
+    the Python files returned: a .tar stream has to decompress every member
+    it skips, so its position in the decompressed stream is checked before
+    each member is read or skipped, and a zip bomb stops as soon as it
+    exceeds the limits.
+
+    Args:
+        fileobj: The uploaded archive (a seekable binary file for .zip)
+        filename (str): The name of the archive, used to detect its format
+        max_members (int): Maximum number of entries (of any kind)
+        max_file_size (int): Maximum size in bytes of each Python file
+        max_total_size (int): Maximum number of bytes decompressed
+
+    Yields:
+        tuple: (member name, content bytes or None when the file is over
+        max_file_size)
+
+    Raises:
+        ArchiveError: If the archive is invalid or exceeds a limit
+    """
+    name = filename.lower()
+    if name.endswith('.zip'):
+        return _iter_zip(fileobj, max_members, max_file_size, max_total_size)
+    if name.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+        return _iter_tar(fileobj, max_members, max_file_size, max_total_size)
+    raise ArchiveError("Formato de arquivo não suportado. Envie um .zip ou .tar.gz.")
+
+
+def _too_many_members(max_members):
+    return ArchiveError(f"O arquivo compactado tem mais de {max_members} arquivos.")
+
+
+def _too_large(max_total_size):
+    return ArchiveError(f"O conteúdo descompactado excede {max_total_size} bytes.")
+
+
+def _is_python_file(name):
+    return name.endswith('.py') and not name.split('/')[-1].startswith('.')
+
+
+def _iter_zip(fileobj, max_members, max_file_size, max_total_size):
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ArchiveError(f"Arquivo .zip inválido: {str(e)}")
+
+    with archive:
+        members = archive.infolist()
+        if len(members) > max_members:
+            raise _too_many_members(max_members)
+
+        # Members are read by random access: only the Python files are
+        # decompressed, and an oversize one counts as max_file_size
+        total_size = 0
+        for info in members:
+            if info.is_dir() or not _is_python_file(info.filename):
+                continue
+            if info.file_size > max_file_size:
+                data = None
+            else:
+                try:
+                    with archive.open(info) as member:
+                        data = _read_limited(member, max_file_size)
+                except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+                    raise ArchiveError(f"Erro ao ler {info.filename}: {str(e)}")
+            total_size += max_file_size if data is None else len(data)
+            if total_size > max_total_size:
+                raise _too_large(max_total_size)
+            yield info.filename, data
+
+
+def _iter_tar(fileobj, max_members, max_file_size, max_total_size):
+    try:
+        # Stream mode: members are read in order without seeking
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except (tarfile.TarError, OSError) as e:
+        raise ArchiveError(f"Arquivo .tar inválido: {str(e)}")
+
+    with archive:
+        try:
+            count = 0
+            for info in archive:
+                count += 1
+                if count > max_members:
+                    raise _too_many_members(max_members)
+                # Reading or skipping this member decompresses the stream up
+                # to its end, whether it is a Python file or not
+                if info.offset_data + info.size > max_total_size:
+                    raise _too_large(max_total_size)
+                if not info.isfile() or not _is_python_file(info.name):
+                    continue
+                if info.size > max_file_size:
+                    yield info.name, None
+                    continue
+                yield info.name, _read_limited(archive.extractfile(info), max_file_size)
+        except (tarfile.TarError, OSError, EOFError) as e:
+            raise ArchiveError(f"Erro ao ler o arquivo .tar: {str(e)}")
@@ -0,0 +1,582 @@
+"""
+Benchmarks for the validator and the /validate request path.
+
+Usage:
+    python -m benchmark -o baseline.json             # record a baseline
+    python -m benchmark --compare baseline.json      # fail on regressions
+
+The corpus is generated deterministically (same seed, same programs), so
+results recorded on the same machine can be compared between commits.
+"""
+import ast
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import minhash
+from rules import get_ruleset
+from validator import (analyzer_version, validate_python_code, analyze_skill_level,
+                       suggest_improvements, chunk_cache)
+
+# Categories of the generated corpus, in the order they are reported
+CATEGORIES = ("tiny", "typical", "huge", "broken", "nested")
+
+# Metrics compared against the baseline and whether a higher value is better
+METRICS = {
+    "throughput": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_memory_kb": False,
+}
+
+_CLASSIFICATIONS = [
+    (18.5, "Abaixo do peso"),
+    (25, "Peso normal"),
+    (30, "Sobrepeso"),
+    (35, "Obesidade grau I"),
+    (40, "Obesidade grau II"),
+]
+
+
+def _imc_program(rng, suffix=""):
+    """Generate a typical IMC calculator (about 60 lines)."""
+    calc = f"calcular_imc{suffix}"
+    classify = f"classificar_imc{suffix}"
+    formula = rng.choice(["peso / (altura ** 2)", "peso / (altura * altura)",
+                          "peso / altura ** 2", "peso / pow(altura, 2)"])
+    lines = [
+        f"def {calc}(peso, altura):",
+        '    """Calcula o índice de massa corporal."""',
+        "    if altura <= 0:",
+        '        raise ValueError("Altura deve ser positiva")',
+        f"    return {formula}",
+        "",
+        "",
+        f"def {classify}(imc):",
+        '    """Retorna a classificação do IMC segundo a OMS."""',
+    ]
+    for i, (limit, label) in enumerate(_CLASSIFICATIONS):
+        keyword = "if" if i == 0 else "elif"
+        lines += [f"    {keyword} imc < {limit}:", f'        return "{label}"']
+    lines += ["    else:", '        return "Obesidade grau III"', ""]
+
+    if rng.random() < 0.5:
+        lines += [
+            "",
+            f"class Paciente{suffix}:",
+            '    """Dados de um paciente."""',
+            "",
+            "    def __init__(self, nome, peso, altura):",
+            "        self.nome = nome",
+            "        self.peso = peso",
+            "        self.altura = altura",
+            "",
+            "    def imc(self):",
+            f"        return {calc}(self.peso, self.altura)",
+            "",
+            "    def relatorio(self):",
+            "        valor = self.imc()",
+            f'        return f"{{self.nome}}: {{valor:.2f}} ({{{classify}(valor)}})"',
+            "",
+        ]
+
+    lines += [
+        "",
+        f"def ler_numero{suffix}(mensagem):",
+        "    while True:",
+        "        try:",
+        '            return float(input(mensagem).replace(",", "."))',
+        "        except ValueError:",
+        '            print("Valor inválido, tente novamente.")',
+        "",
+        "",
+        f"def main{suffix}():",
+        f'    peso = ler_numero{suffix}("Digite seu peso (kg): ")',
+        f'    altura = ler_numero{suffix}("Digite sua altura (m): ")',
+        f"    imc = {calc}(peso, altura)",
+        f'    print(f"Seu IMC é {{imc:.2f}}")',
+        f'    print("Classificação:", {classify}(imc))',
+        f"    historico = [round({calc}(p, altura), 1) for p in range(40, 120, 10)]",
+        '    print("Histórico:", historico)',
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _tiny_program(rng):
+    peso = rng.randint(40, 120)
+    altura = rng.choice([1.55, 1.62, 1.70, 1.78, 1.85])
+    return f"peso = {peso}\naltura = {altura}\nimc = peso / altura ** 2\nprint(imc)\n"
+
+
+def _huge_program(rng, min_lines=10000):
+    parts = ["import math", "import sys", ""]
+    count = 0
+    i = 0
+    while count < min_lines:
+        part = _imc_program(rng, suffix=f"_{i}")
+        parts.append(part)
+        count += part.count("\n") + 1
+        i += 1
+    parts.append('if __name__ == "__main__":\n    main_0()\n')
+    return "\n".join(parts)
+
+
+def _broken_program(rng):
+    lines = _imc_program(rng).split("\n")
+    candidates = [i for i, line in enumerate(lines) if line.rstrip().endswith(":")]
+    index = rng.choice(candidates)
+    if "(" in lines[index] and rng.random() < 0.5:
+        lines[index] = lines[index].replace("(", "((", 1)   # parêntese não fechado
+    else:
+        lines[index] = lines[index].rstrip()[:-1]           # dois-pontos ausente
+    return "\n".join(lines)
+
+
+def _nested_program(rng, depth=60):
+    lines = ["def classificar(imc, faixas):"]
+    indent = "    "
+    for level in range(depth):
+        kind = rng.choice(["if", "for", "while"])
+        if kind == "if":
+            lines.append(f"{indent}if imc > {level}:")
+        elif kind == "for":
+            lines.append(f"{indent}for faixa_{level} in faixas:")
+        else:
+            lines.append(f"{indent}while imc > {level}:")
+        indent += "    "
+    lines.append(f"{indent}return imc")
+    lines.append("    return None")
+    expr = "peso"
+    for _ in range(depth):
+        expr = f"({expr} / 1)"
+    lines += ["", "peso, altura = 70, 1.75", f"imc = {expr} / (altura ** 2)", "print(classificar(imc, []))", ""]
+    return "\n".join(lines)
+
+
+def generate_corpus(seed=0, size=20):
+    """
+    Generate the benchmark corpus.
+
+    Args:
+        seed (int): Seed of the random generator
+        size (int): Number of programs per category (the huge category uses
+            a fifth of it, at least one)
+
+    Returns:
+        dict: Category name -> list of programs
+    """
+    rng = random.Random(seed)
+    return {
+        "tiny": [_tiny_program(rng) for _ in range(size)],
+        "typical": [_imc_program(rng) for _ in range(size)],
+        "huge": [_huge_program(rng) for _ in range(max(1, size // 5))],
+        "broken": [_broken_program(rng) for _ in range(size)],
+        "nested": [_nested_program(rng) for _ in range(size)],
+    }
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(func, inputs, repeat=1):
+    """
+    Time func over every input and measure its peak memory.
+
+    Timings and memory are collected in separate passes because tracemalloc
+    slows down every allocation.
+
+    Returns:
+        dict: calls, throughput (calls/s), p50_ms, p99_ms and peak_memory_kb
+    """
+    func(inputs[0])  # aquecimento (imports, caches de regex)
+
+    durations = []
+    gc.collect()
+    for _ in range(repeat):
+        for item in inputs:
+            started = time.perf_counter()
+            func(item)
+            durations.append(time.perf_counter() - started)
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            tracemalloc.reset_peak()
+            func(item)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    total = sum(durations)
+    return {
+        "calls": len(durations),
+        "throughput": round(len(durations) / total, 2) if total else 0.0,
+        "p50_ms": round(statistics.median(durations) * 1000, 4),
+        "p99_ms": round(_percentile(durations, 99) * 1000, 4),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _route_client(database_uri, **config):
+    from main import create_app
+    from database import init_db
+
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": database_uri,
+        "TESTING": True,
+        "LOG_LEVEL": "WARNING",
+        **config,
+    })
+    init_db(app)
+    return app.test_client()
+
+
+def run_benchmarks(corpus, repeat=3, route=True):
+    """
+    Run every benchmark over the corpus.
+
+    The validator functions are measured with the chunk cache disabled, so
+    every call analyzes the whole file; incremental_edit measures a
+    resubmission with one changed line after the file was analyzed once.
+    The /validate path runs through the Flask test client against a
+    temporary SQLite database, analyzing in this process (no pool) and
+    committing each request on its own (no group writer). Each request gets
+    a unique trailing comment so that it measures a real analysis instead
+    of a result cache hit. validate_route is measured with the chunk cache
+    disabled (cold); validate_route_warm after every program was submitted
+    once, so only the changed comment is analyzed again.
+
+    Returns:
+        dict: "<benchmark>/<category>" -> metrics (see measure)
+    """
+    benchmarks = {
+        "validate_python_code": validate_python_code,
+        "analyze_skill_level": analyze_skill_level,
+        "suggest_improvements": suggest_improvements,
+    }
+    results = {}
+    chunk_cache_size = chunk_cache.maxsize
+    chunk_cache.configure(0)
+    try:
+        for name, func in benchmarks.items():
+            for category in CATEGORIES:
+                results[f"{name}/{category}"] = measure(func, corpus[category], repeat)
+    finally:
+        chunk_cache.configure(chunk_cache_size)
+
+    edits = iter(range(sys.maxsize))
+
+    def edit(code):
+        validate_python_code(f"{code}\n# edição {next(edits)}\n")
+
+    for category in CATEGORIES:
+        for code in corpus[category]:
+            validate_python_code(code)
+        results[f"incremental_edit/{category}"] = measure(edit, corpus[category], repeat)
+
+    if route:
+        from database import db
+
+        counter = iter(range(sys.maxsize))
+        for name, cache_size in (("validate_route", 0), ("validate_route_warm", chunk_cache_size)):
+            with tempfile.TemporaryDirectory() as directory:
+                # The route reconfigures the chunk cache of this process
+                client = _route_client("sqlite:///" + os.path.join(directory, "benchmark.db"),
+                                       VALIDATION_ISOLATED=False, GROUP_COMMIT=False,
+                                       ANALYSIS_CHUNK_CACHE_SIZE=cache_size)
+
+                def post(code):
+                    response = client.post("/validate", data={
+                        "code": f"{code}\n# requisição {next(counter)}\n",
+                        "python_version": "3",
+                    })
+                    if response.status_code != 200:
+                        raise RuntimeError(f"/validate returned {response.status_code}")
+
+                for category in CATEGORIES:
+                    if cache_size:
+                        for code in corpus[category]:
+                            post(code)
+                    results[f"{name}/{category}"] = measure(post, corpus[category], repeat)
+
+                with client.application.app_context():
+                    db.engine.dispose()
+        chunk_cache.configure(chunk_cache_size)
+
+    return results
+
+
+# Names kept by _Renamer (renaming them would change what the program does)
+_BUILTINS = {"print", "range", "len", "sum", "min", "max", "abs", "int", "float", "str",
+             "input", "sorted", "enumerate", "ValueError", "ZeroDivisionError"}
+
+
+def _random_block(rng, names, depth, indent):
+    """Random statements; the structure (not only the names) varies between calls."""
+    pad = "    " * indent
+    lines = []
+    for _ in range(rng.randint(2, 5)):
+        kind = rng.choice(("assign", "augassign", "call", "comprehension", "dict")
+                          + (("if", "for", "while", "try") if depth < 2 else ()))
+        target, source = rng.choice(names), rng.choice(names)
+        if kind == "assign":
+            lines.append(f"{pad}{target} = {source} {rng.choice('+-*')} {rng.randint(1, 9)}")
+        elif kind == "augassign":
+            lines.append(f"{pad}{target} {rng.choice('+-*')}= {source}")
+        elif kind == "call":
+            lines.append(f"{pad}print({source}, len(str({target})))")
+        elif kind == "comprehension":
+            lines.append(f"{pad}{target} = sum([i * {source} for i in range({rng.randint(2, 9)}) if i % 2])")
+        elif kind == "dict":
+            lines.append(f"{pad}{target} = len({{'a': {source}, 'b': [{target}, {rng.randint(0, 9)}]}})")
+        elif kind == "if":
+            lines.append(f"{pad}if {source} > {rng.randint(0, 50)}:")
+            lines.extend(_random_block(rng, names, depth + 1, indent + 1))
+            if rng.random() < 0.5:
+                lines.append(f"{pad}else:")
+                lines.extend(_random_block(rng, names, depth + 1, indent + 1))
+        elif kind == "for":
+            lines.append(f"{pad}for i in range({rng.randint(2, 20)}):")
+            lines.extend(_random_block(rng, names + ["i"], depth + 1, indent + 1))
+        elif kind == "while":
+            lines.append(f"{pad}while {target} < {rng.randint(10, 99)}:")
+            lines.append(f"{pad}    {target} += 1")
+            lines.extend(_random_block(rng, names, depth + 1, indent + 1))
+        else:
+            lines.append(f"{pad}try:")
+            lines.extend(_random_block(rng, names, depth + 1, indent + 1))
+            lines.append(f"{pad}except {rng.choice(['ValueError', 'ZeroDivisionError'])}:")
+            lines.append(f"{pad}    {target} = 0")
+    return lines
+
+
+def _random_program(rng):
+    """A program of a few functions with random control flow."""
+    lines = []
+    for number in range(rng.randint(3, 6)):
+        params = [f"p{i}" for i in range(rng.randint(1, 3))]
+        lines.append(f"def funcao{number}({', '.join(params)}):")
+        lines.append(f"    total = {rng.randint(0, 9)}")
+        lines.extend(_random_block(rng, params + ["total"], 0, 1))
+        lines.append("    return total")
+        lines.append("")
+    return "\n".join(lines)
+
+
+class _Renamer(ast.NodeTransformer):
+    """Rename every identifier and change every number, keeping the structure."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.names = {}
+
+    def _rename(self, name):
+        if name in _BUILTINS:
+            return name
+        return self.names.setdefault(name, f"nome_{len(self.names)}_{self.rng.randint(0, 999)}")
+
+    def visit_Name(self, node):
+        node.id = self._rename(node.id)
+        return node
+
+    def visit_arg(self, node):
+        node.arg = self._rename(node.arg)
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self._rename(node.name)
+        self.generic_visit(node)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, int) and not isinstance(node.value, bool):
+            node.value = self.rng.randint(0, 99)
+        return node
+
+
+def _disguised_copy(rng, code):
+    """A copy with renamed identifiers, other numbers and one extra statement."""
+    tree = _Renamer(rng).visit(ast.parse(code))
+    function = rng.choice([node for node in tree.body if isinstance(node, ast.FunctionDef)])
+    function.body.insert(rng.randrange(len(function.body)), ast.parse("print('copiado')").body[0])
+    return ast.unparse(ast.fix_missing_locations(tree))
+
+
+def run_similarity_benchmark(seed=0, size=200, threshold=0.8):
+    """
+    Measure the near-duplicate detection on a synthetic corpus.
+
+    size structurally distinct programs are indexed in a temporary SQLite
+    database, then a disguised copy of each one (renamed identifiers,
+    other numbers, one extra statement) is looked up.
+
+    Returns:
+        dict: indexed, queries, precision, recall, p50_ms and p99_ms of a lookup
+    """
+    from database import db
+    from similarity import index_signatures, similar_to
+
+    rng = random.Random(seed)
+    originals = [_random_program(rng) for _ in range(size)]
+    copies = [_disguised_copy(rng, code) for code in originals]
+
+    with tempfile.TemporaryDirectory() as directory:
+        client = _route_client("sqlite:///" + os.path.join(directory, "similarity.db"))
+        with client.application.app_context():
+            entries = []
+            for number, code in enumerate(originals, 1):
+                data, shingles = minhash.code_signature(code)
+                entries.append((number, {"signature": data.hex(), "shingles": shingles}))
+            indexed = index_signatures(entries, db)
+            db.session.commit()
+
+            found = returned = 0
+            durations = []
+            for number, code in enumerate(copies, 1):
+                data, _ = minhash.code_signature(code)
+                started = time.perf_counter()
+                matches = similar_to(minhash.decode(data), db, threshold)
+                durations.append(time.perf_counter() - started)
+                returned += len(matches)
+                found += any(match_id == number for match_id, _ in matches)
+            db.session.remove()
+            db.engine.dispose()
+
+    return {
+        "indexed": indexed,
+        "queries": len(copies),
+        "precision": round(found / returned, 4) if returned else 0.0,
+        "recall": round(found / len(copies), 4),
+        "p50_ms": round(statistics.median(durations) * 1000, 4),
+        "p99_ms": round(_percentile(durations, 99) * 1000, 4),
+    }
+
+
+def compare(baseline, current, threshold=0.2, memory_threshold=0.2, min_delta_ms=0.05):
+    """
+    Compare two benchmark runs.
+
+    A metric regresses when it gets worse by more than the threshold
+    (relative to the baseline). Latency changes smaller than min_delta_ms are
+    ignored, since sub-millisecond timings are dominated by noise.
+
+    Returns:
+        list: One dict per regression (benchmark, metric, baseline, current, change)
+    """
+    regressions = []
+    for name, before in baseline.get("results", {}).items():
+        after = current.get("results", {}).get(name)
+        if after is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (old - new) / old if higher_is_better else (new - old) / old
+            limit = memory_threshold if metric == "peak_memory_kb" else threshold
+            if metric.endswith("_ms") and abs(new - old) < min_delta_ms:
+                continue
+            if change > limit:
+                regressions.append({
+                    "benchmark": name,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4),
+                })
+    return regressions
+
+
+def main(argv=None):
+    """Run the command line interface; returns the process exit code."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="Mede o desempenho do validador e da rota /validate.")
+    parser.add_argument("-o", "--output", help="Grava os resultados neste arquivo JSON (baseline)")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compara com um baseline e falha se houver regressão")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Piora relativa tolerada em latência e vazão (padrão: 0.2)")
+    parser.add_argument("--memory-threshold", type=float, default=0.2,
+                        help="Piora relativa tolerada no pico de memória (padrão: 0.2)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Repetições de cada programa do corpus (padrão: 3)")
+    parser.add_argument("--size", type=int, default=20,
+                        help="Programas gerados por categoria (padrão: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Semente do corpus (padrão: 0)")
+    parser.add_argument("--no-route", action="store_true",
+                        help="Não mede a rota /validate (apenas as funções do validador)")
+    parser.add_argument("--similarity-size", type=int, default=200,
+                        help="Programas indexados no teste de detecção de cópias (padrão: 200, 0 desativa)")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.seed, args.size)
+    report = {
+        "meta": {
+            "analyzer_version": analyzer_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "size": args.size,
+            "repeat": args.repeat,
+        },
+        "results": run_benchmarks(corpus, args.repeat, route=not args.no_route),
+        # Custo de cada regra isolada, em µs por programa (informativo, não comparado)
+        "rule_costs": {
+            name: round(cost, 3) for name, cost in
+            get_ruleset().rule_costs([code for category in CATEGORIES for code in corpus[category]]).items()
+        },
+    }
+    if args.similarity_size > 0:
+        # Precisão, revocação e latência da busca de cópias (informativo, não comparado)
+        report["similarity"] = run_similarity_benchmark(args.seed, args.similarity_size)
+
+    for name, metrics in report["results"].items():
+        print(f"{name:40} {metrics['throughput']:>10.1f}/s  p50 {metrics['p50_ms']:>9.3f} ms  "
+              f"p99 {metrics['p99_ms']:>9.3f} ms  pico {metrics['peak_memory_kb']:>9.1f} KiB")
+
+    for name, cost in sorted(report["rule_costs"].items(), key=lambda item: -item[1]):
+        print(f"regra {name:34} {cost:>10.3f} µs/programa")
+
+    if "similarity" in report:
+        similarity = report["similarity"]
+        print(f"similaridade: {similarity['indexed']} indexados, precisão {similarity['precision']:.1%}, "
+              f"revocação {similarity['recall']:.1%}, busca p50 {similarity['p50_ms']:.3f} ms "
+              f"p99 {similarity['p99_ms']:.3f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            json.dump(report, out, indent=2, ensure_ascii=False)
+            out.write("\n")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("seed") != args.seed or baseline.get("meta", {}).get("size") != args.size:
+            print("Aviso: o baseline foi gerado com outro corpus (--seed/--size)", file=sys.stderr)
+        regressions = compare(baseline, report, args.threshold, args.memory_threshold)
+        for item in regressions:
+            print(f"REGRESSÃO {item['benchmark']} {item['metric']}: "
+                  f"{item['baseline']} -> {item['current']} ({item['change']:+.1%})", file=sys.stderr)
+        if regressions:
+            return 1
+        print("Nenhuma regressão acima do limite.", file=sys.stderr)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import delete, or_, select
+from sqlalchemy.exc import IntegrityError
+
+from metrics import registry
+from models import CachedAnalysis
+from validator import analyzer_version
+
+
+def cache_key(code, python_version, limits=None):
+    """
+    Build the cache key for a submission.
+
+    The key is the SHA-256 of the analyzer version (which includes the
+    active rule set), the Python version, the analysis limits and the code,
+    so bumping ANALYZER_VERSION or changing the rules invalidates every
+    cached result, and a "too complex" result computed under some limits
+    is never served under others.
+    """
+    digest = hashlib.sha256()
+    limits_text = ",".join(str(value) for value in limits) if limits else ""
+    digest.update(f"{analyzer_version()}\0{python_version}\0{limits_text}\0".encode('utf-8'))
+    digest.update(code.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results.
+
+    The first tier is a bounded LRU kept in the memory of each process; the
+    second is the CachedAnalysis table, shared by every gunicorn worker.
+    Entries are stored as JSON text so callers always get a fresh copy.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize):
+        """Change the LRU size, evicting the oldest entries if needed."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _remember(self, key, payload):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get(self, code, python_version, db, limits=None):
+        """
+        Look up a cached result.
+
+        Returns:
+            tuple: (validation result, suggestions), or None on a miss
+        """
+        key = cache_key(code, python_version, limits)
+
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+
+        if payload is None:
+            entry = db.session.get(CachedAnalysis, key)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+
+            payload = entry.result
+            with self._lock:
+                self.db_hits += 1
+            self._remember(key, payload)
+
+        data = json.loads(payload)
+        return data["validation"], data["suggestions"]
+
+    def put(self, code, python_version, validation_result, suggestions, db, limits=None):
+        """Store a result in both tiers."""
+        self.put_many([(code, python_version, validation_result, suggestions)], db, limits)
+
+    def prepare(self, results, limits=None):
+        """
+        Add results to the in-process tier and return the database rows to
+        store, so the caller can write them in its own transaction (see
+        store).
+
+        Args:
+            results (list): (code, python_version, validation result,
+                suggestions) tuples
+            limits (AnalysisLimits): The limits the results were computed under
+
+        Returns:
+            dict: cache key -> serialized result
+        """
+        entries = {}
+        for code, python_version, validation_result, suggestions in results:
+            key = cache_key(code, python_version, limits)
+            payload = json.dumps({
+                "validation": validation_result,
+                "suggestions": suggestions
+            })
+            self._remember(key, payload)
+            entries[key] = payload
+        return entries
+
+    def store(self, entries, db):
+        """
+        Insert prepared entries in the current transaction, without committing.
+
+        Another worker may have stored the same key concurrently; the
+        results are identical, so existing keys are skipped (ON CONFLICT DO
+        NOTHING where supported) instead of failing the transaction.
+        """
+        if not entries:
+            return
+        version = analyzer_version()
+        rows = [{"key": key, "result": payload, "analyzer_version": version}
+                for key, payload in entries.items()]
+
+        dialect = db.engine.dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            db.session.execute(insert(CachedAnalysis).on_conflict_do_nothing(index_elements=['key']), rows)
+            return
+
+        existing = set(db.session.execute(
+            select(CachedAnalysis.key).where(CachedAnalysis.key.in_(list(entries)))).scalars())
+        try:
+            with db.session.begin_nested():
+                db.session.add_all([CachedAnalysis(**row) for row in rows if row["key"] not in existing])
+        except IntegrityError:
+            pass
+
+    def put_many(self, results, db, limits=None):
+        """Store several results in both tiers with a single commit of their own."""
+        entries = self.prepare(results, limits)
+        if not entries:
+            return
+        try:
+            self.store(entries, db)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"Could not persist cached analysis: {str(e)}")
+
+    def prune(self, db, max_entries=0):
+        """
+        Delete the database entries of other analyzer versions and, with
+        max_entries, the oldest entries beyond that many.
+
+        Returns:
+            int: Number of deleted entries
+        """
+        deleted = db.session.execute(delete(CachedAnalysis).where(or_(
+            CachedAnalysis.analyzer_version.is_(None),
+            CachedAnalysis.analyzer_version != analyzer_version()
+        ))).rowcount
+        if max_entries > 0:
+            cutoff = db.session.execute(
+                select(CachedAnalysis.created_at).order_by(CachedAnalysis.created_at.desc())
+                .offset(max_entries - 1).limit(1)).scalar()
+            if cutoff is not None:
+                deleted += db.session.execute(
+                    delete(CachedAnalysis).where(CachedAnalysis.created_at < cutoff)).rowcount
+        db.session.commit()
+        return deleted
+
+    def clear(self):
+        """Empty the in-process tier."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the counters of this process, used to size the cache."""
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "analyzer_version": analyzer_version(),
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": hits / lookups if lookups else 0.0
+            }
+
+    def metric_families(self):
+        """Expose the counters to the /metrics endpoint."""
+        stats = self.stats()
+        return [
+            ("validator_cache_lookups_total", "counter", "Result cache lookups by outcome.", [
+                ("validator_cache_lookups_total", f'{{result="{outcome}"}}', stats[outcome])
+                for outcome in ("memory_hits", "db_hits", "misses")
+            ]),
+            ("validator_cache_evictions_total", "counter", "Entries evicted from the in-process cache.",
+             [("validator_cache_evictions_total", "", stats["evictions"])]),
+            ("validator_cache_entries", "gauge", "Entries in the in-process cache.",
+             [("validator_cache_entries", "", stats["size"])]),
+        ]
+
+
+# Cache shared by all requests handled by this process
+result_cache = ResultCache()
+registry.add_collector(result_cache.metric_families)
@@ -0,0 +1,164 @@
+import sys
+
+import click
+
+from cache import result_cache
+from database import init_db
+from queries import explain_planned_queries
+from storage import migrate_sources, storage_report
+from stats import rebuild_rollups
+from similarity import index_missing_signatures
+from routes import get_archive_dir, get_analysis_limits, get_analysis_pool
+from validator import analyze_code
+
+
+def init_commands(app, db):
+    """Register the maintenance commands of the application (flask --app main ...)."""
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create the missing tables, columns and indexes."""
+        init_db(app)
+        click.echo("✓ Banco de dados inicializado")
+
+    @app.cli.command("create-indexes")
+    def create_indexes():
+        """Create the indexes missing from existing tables."""
+        # db.create_all() only creates indexes together with new tables
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+                click.echo(f"✓ {index.name}")
+
+    @app.cli.command("check-indexes")
+    def check_indexes():
+        """Check that the planned listing queries use the indexes."""
+        failed = False
+        for name, (plan, uses_index) in explain_planned_queries(db.session).items():
+            click.echo(f"{'✓' if uses_index else '✗'} {name}")
+            for line in plan:
+                click.echo(f"    {line}")
+            failed = failed or not uses_index
+        if failed:
+            click.echo("Some queries do a full table scan.", err=True)
+            sys.exit(1)
+
+    @app.cli.command("migrate-sources")
+    @click.option("--batch-size", default=500, show_default=True, help="Rows migrated per transaction.")
+    def migrate_sources_command(batch_size):
+        """Move code stored inline in old analyses to compressed, deduplicated storage."""
+        migrated = migrate_sources(db, batch_size)
+        click.echo(f"✓ {migrated} análises migradas")
+        if db.engine.dialect.name == 'sqlite':
+            click.echo("  Execute VACUUM para devolver o espaço liberado ao sistema de arquivos.")
+
+    @app.cli.command("storage-report")
+    def storage_report_command():
+        """Report the space used by submitted code and the savings of compression."""
+        report = storage_report(db)
+        click.echo(f"Análises: {report['analyses']} ({report['inline_analyses']} ainda sem migrar)")
+        click.echo(f"Códigos distintos: {report['blobs']}")
+        click.echo(f"Tamanho original: {report['logical_bytes']} bytes")
+        click.echo(f"Sem duplicatas: {report['unique_bytes']} bytes")
+        click.echo(f"Armazenado: {report['stored_bytes']} bytes")
+        click.echo(f"Economia: {report['saved_bytes']} bytes ({(1 - report['ratio']) * 100:.1f}%)")
+
+    @app.cli.command("rebuild-stats")
+    @click.option("--check", is_flag=True, help="Only report the drift, without fixing it.")
+    def rebuild_stats(check):
+        """Recompute the statistics rollups from the analyses."""
+        drift = rebuild_rollups(db, check_only=check)
+        for key, have, want in drift:
+            click.echo(f"  {key}: armazenado {have}, esperado {want}")
+        if check:
+            click.echo(f"{len(drift)} agregados divergentes")
+            if drift:
+                sys.exit(1)
+        else:
+            click.echo(f"✓ Agregados recalculados ({len(drift)} estavam divergentes)")
+
+    @app.cli.command("prune-cache")
+    @click.option("--max-entries", type=int, default=None,
+                  help="Keep at most this many cached results (default: ANALYSIS_CACHE_DB_MAX_ENTRIES, 0 for no cap).")
+    def prune_cache_command(max_entries):
+        """Delete cached results of other analyzer versions and the oldest beyond the cap."""
+        max_entries = app.config.get("ANALYSIS_CACHE_DB_MAX_ENTRIES", 0) if max_entries is None else max_entries
+        deleted = result_cache.prune(db, max_entries)
+        click.echo(f"✓ {deleted} resultados removidos do cache")
+
+    @app.cli.command("archive-analyses")
+    @click.option("--days", type=int, default=None,
+                  help="Keep this many days in the database (default: RETENTION_DAYS).")
+    @click.option("--batch-size", type=int, default=None,
+                  help="Rows archived per transaction (default: ARCHIVE_BATCH_SIZE).")
+    @click.option("--no-compact", is_flag=True, help="Skip VACUUM/ANALYZE after archiving.")
+    def archive_analyses_command(days, batch_size, no_compact):
+        """Move old analyses to monthly JSONL.gz archives and compact the database."""
+        from retention import archive_analyses, compact_database, retention_cutoff
+
+        days = app.config.get("RETENTION_DAYS", 0) if days is None else days
+        if days <= 0:
+            click.echo("Retenção desativada (defina RETENTION_DAYS ou use --days).", err=True)
+            sys.exit(1)
+        batch_size = batch_size or app.config.get("ARCHIVE_BATCH_SIZE", 500)
+        archive_dir = get_archive_dir()
+        before = retention_cutoff(days)
+
+        archived = archive_analyses(db, archive_dir, before, batch_size)
+        click.echo(f"✓ {archived} análises anteriores a {before:%Y-%m-%d} arquivadas em {archive_dir}")
+        if archived and not no_compact:
+            for statement in compact_database(db):
+                click.echo(f"✓ {statement}")
+
+    @app.cli.command("index-similarity")
+    @click.option("--batch-size", default=500, show_default=True, help="Analyses indexed per transaction.")
+    def index_similarity_command(batch_size):
+        """Compute the similarity signatures of analyses saved without one."""
+        indexed = index_missing_signatures(db, batch_size)
+        click.echo(f"✓ {indexed} análises adicionadas ao índice de similaridade")
+
+    @app.cli.command("reanalyze")
+    @click.option("--batch-size", type=int, default=None,
+                  help="Analyses per batch and write transaction (default: REANALYSIS_BATCH_SIZE).")
+    @click.option("--workers", type=int, default=None,
+                  help="Analysis processes (default: VALIDATION_POOL_SIZE; 0 analyzes in this process).")
+    @click.option("--max-load", type=float, default=None,
+                  help="Fraction of the time spent working, 0 to 1 (default: REANALYSIS_MAX_LOAD).")
+    @click.option("--limit", type=int, default=None, help="Stop after this many analyses (resume later).")
+    @click.option("--restart", is_flag=True, help="Ignore the checkpoint of an unfinished run.")
+    def reanalyze_command(batch_size, workers, max_load, limit, restart):
+        """Re-analyze stored analyses with the current analyzer version and report level changes."""
+        from reanalysis import reanalyze, run_report
+
+        batch_size = batch_size or app.config.get("REANALYSIS_BATCH_SIZE", 200)
+        max_load = app.config.get("REANALYSIS_MAX_LOAD", 0.5) if max_load is None else max_load
+        limits = get_analysis_limits()
+        pool = get_analysis_pool()
+        if workers is not None:
+            pool.configure(workers, pool.timeout, pool.memory_limit)
+
+        def analyze_many(codes):
+            if pool.enabled:
+                return pool.analyze_many(codes, "3", limits)
+            return [analyze_code(code, "3", limits) for code in codes]
+
+        def progress(run):
+            click.echo(f"  até o id {run.last_id}: {run.scanned} lidas, {run.changed} alteradas, "
+                       f"{run.failed} falhas")
+
+        try:
+            run = reanalyze(db, analyze_many, batch_size, max_load, limit, restart, progress)
+        finally:
+            pool.shutdown()
+
+        report = run_report(run)
+        state = "concluída" if report["finished"] else \
+            f"interrompida no id {report['last_id']} (execute de novo para continuar)"
+        click.echo(f"Reanálise {report['analyzer_version']} {state}")
+        click.echo(f"{report['scanned']} análises lidas, {report['updated']} atualizadas, "
+                   f"{report['changed']} com resultado diferente, {report['failed']} falhas")
+        for title, changes in (("Nível", report["level_changes"]), ("Nível IMC", report["imc_level_changes"])):
+            if changes:
+                click.echo(f"{title}:")
+                for transition, count in changes.items():
+                    click.echo(f"  {transition}: {count}")
@@ -27,4 +27,108 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 SQLALCHEMY_ENGINE_OPTIONS = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
-}
\ No newline at end of file
+}
+
+# Perfil SQLite: pragmas executados em cada nova conexão. WAL permite leituras
+# durante uma escrita; com synchronous=NORMAL um commit é durável após o próximo
+# checkpoint (uma queda de energia pode perder os últimos commits, nunca corromper
+# o banco); busy_timeout (ms) faz uma escrita esperar o bloqueio em vez de falhar
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'cache_size': -16000,
+    'temp_store': 'MEMORY',
+}
+
+# Escritor único por processo que grava as análises de várias requisições
+# simultâneas em uma só transação (ativado por padrão com SQLite). Cada grupo
+# tem no máximo GROUP_COMMIT_MAX_BATCH análises e pode esperar até
+# GROUP_COMMIT_MAX_DELAY segundos por outras requisições (0: sem espera extra).
+# Uma requisição cujo grupo não começou a ser gravado em GROUP_COMMIT_TIMEOUT
+# segundos desiste, sem gravar nada (0: sem limite)
+GROUP_COMMIT = os.environ.get(
+    'GROUP_COMMIT', '1' if SQLALCHEMY_DATABASE_URI.startswith('sqlite') else '0'
+).lower() in ('1', 'true', 'yes')
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 200))
+GROUP_COMMIT_MAX_DELAY = float(os.environ.get('GROUP_COMMIT_MAX_DELAY', 0.0))
+GROUP_COMMIT_TIMEOUT = float(os.environ.get('GROUP_COMMIT_TIMEOUT', 30.0))
+
+# Número máximo de resultados de análise mantidos no cache em memória de cada processo
+ANALYSIS_CACHE_SIZE = int(os.environ.get('ANALYSIS_CACHE_SIZE', 1024))
+
+# Máximo de resultados mantidos no cache do banco por flask prune-cache (0: sem limite;
+# resultados de outras versões do analisador são sempre apagados)
+ANALYSIS_CACHE_DB_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_DB_MAX_ENTRIES', 0))
+
+# Trechos (instruções de nível superior) analisados mantidos em cache por processo,
+# para reanalisar apenas o que mudou em arquivos editados (0 desativa a análise incremental)
+ANALYSIS_CHUNK_CACHE_SIZE = int(os.environ.get('ANALYSIS_CHUNK_CACHE_SIZE', 4096))
+
+# Conjunto de regras de avaliação: o nome de um conjunto embutido ('imc', a
+# calculadora de IMC) ou o caminho de um arquivo JSON com a mesma estrutura
+GRADING_RULESET = os.environ.get('GRADING_RULESET', 'imc')
+
+# Processos usados para analisar em paralelo os arquivos de um envio múltiplo (0 desativa).
+# O pool é de cada worker do gunicorn e seus processos são iniciados sob demanda
+# (cerca de 170 ms e 20-25 MB de memória cada), por isso o padrão é pequeno
+VALIDATION_POOL_SIZE = int(os.environ.get('VALIDATION_POOL_SIZE', min(2, os.cpu_count() or 1)))
+
+# Tempo máximo, em segundos, para a análise de cada arquivo no pool
+VALIDATION_TIMEOUT = float(os.environ.get('VALIDATION_TIMEOUT', 10))
+
+# Analisa também envios de um único arquivo no pool, protegendo o worker de entradas patológicas
+VALIDATION_ISOLATED = os.environ.get('VALIDATION_ISOLATED', '1').lower() in ('1', 'true', 'yes')
+
+# Memória máxima (bytes) de cada processo do pool, aplicada com setrlimit (0 desativa)
+VALIDATION_MEMORY_LIMIT = int(os.environ.get('VALIDATION_MEMORY_LIMIT', 512 * 1024 * 1024))
+
+# Limites de tamanho e complexidade das submissões, verificados antes da análise completa (0 desativa)
+VALIDATION_MAX_SOURCE_BYTES = int(os.environ.get('VALIDATION_MAX_SOURCE_BYTES', 2 * 1024 * 1024))
+VALIDATION_MAX_AST_NODES = int(os.environ.get('VALIDATION_MAX_AST_NODES', 500000))
+VALIDATION_MAX_AST_DEPTH = int(os.environ.get('VALIDATION_MAX_AST_DEPTH', 200))
+
+# Limites para arquivos compactados enviados em /validate/archive e /jobs (proteção contra
+# zip bombs): entradas de qualquer tipo, tamanho de cada arquivo Python e total de bytes
+# descompactados (num .tar, inclui os membros ignorados, que também são descompactados)
+ARCHIVE_MAX_MEMBERS = int(os.environ.get('ARCHIVE_MAX_MEMBERS', 1000))
+ARCHIVE_MAX_FILE_SIZE = int(os.environ.get('ARCHIVE_MAX_FILE_SIZE', 1024 * 1024))
+ARCHIVE_MAX_TOTAL_SIZE = int(os.environ.get('ARCHIVE_MAX_TOTAL_SIZE', 50 * 1024 * 1024))
+
+# Fila de validação em segundo plano (/jobs): itens reservados por vez, duração da
+# reserva em segundos e tentativas antes de marcar um arquivo como falho
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', 10))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+JOB_EVENTS_POLL_INTERVAL = float(os.environ.get('JOB_EVENTS_POLL_INTERVAL', 1.0))
+
+# Duração máxima, em segundos, de uma conexão de /jobs/<id>/events; o cliente
+# reconecta com o after informado no evento reconnect
+JOB_EVENTS_MAX_DURATION = float(os.environ.get('JOB_EVENTS_MAX_DURATION', 300))
+
+# Análises por página na listagem /analyses
+ANALYSES_PAGE_SIZE = int(os.environ.get('ANALYSES_PAGE_SIZE', 50))
+
+# Linhas lidas do banco por vez na exportação de análises (/analyses/export)
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+# Detecção de cópias: similaridade estrutural mínima (0 a 1) para listar uma
+# análise como semelhante e número máximo de análises listadas
+SIMILARITY_THRESHOLD = float(os.environ.get('SIMILARITY_THRESHOLD', 0.8))
+SIMILARITY_MAX_RESULTS = int(os.environ.get('SIMILARITY_MAX_RESULTS', 10))
+
+# Reanálise (flask reanalyze): análises por lote (e por transação) e fração
+# máxima do tempo ocupada pela reanálise, deixando o restante para as requisições
+REANALYSIS_BATCH_SIZE = int(os.environ.get('REANALYSIS_BATCH_SIZE', 200))
+REANALYSIS_MAX_LOAD = float(os.environ.get('REANALYSIS_MAX_LOAD', 0.5))
+
+# Retenção: análises com mais de RETENTION_DAYS dias são movidas pelo comando
+# archive-analyses para arquivos JSONL.gz mensais em ARCHIVE_DIR (relativo à
+# pasta instance), em lotes de ARCHIVE_BATCH_SIZE linhas. 0 desativa.
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 0))
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500))
+
+# Nível de log da aplicação (DEBUG, INFO, WARNING...). DEBUG registra cada comando SQL.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
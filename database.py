@@ -0,0 +1,50 @@
+from functools import partial
+
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import DeclarativeBase
+
+# Define the SQLAlchemy base class
+class Base(DeclarativeBase):
+    pass
+
+# Create the SQLAlchemy instance (bound to the app by create_app)
+db = SQLAlchemy(model_class=Base)
+
+
+def init_db(app):
+    """Create the missing tables, columns and indexes of the database."""
+    # Register all models before creating the tables
+    import models  # noqa: F401
+    from schema import upgrade_schema
+
+    with app.app_context():
+        db.create_all()
+        upgrade_schema(db)
+
+
+def _apply_pragmas(dbapi_connection, connection_record, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_sqlite_pragmas(app):
+    """
+    Run the SQLITE_PRAGMAS of the config on every new SQLite connection.
+
+    WAL lets readers work while a transaction writes, and busy_timeout makes
+    a writer wait for the lock instead of failing with "database is locked".
+    Connections to other databases are left alone.
+    """
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", partial(_apply_pragmas, pragmas=pragmas))
@@ -0,0 +1,102 @@
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+
+from models import CodeAnalysis, SourceBlob
+from queries import apply_filters
+
+# Columns of an export, in the order of CodeAnalysis.to_dict
+EXPORT_FIELDS = [
+    'id', 'filename', 'is_valid', 'error_message', 'error_line', 'skill_level',
+    'skill_score', 'is_imc_calculator', 'imc_critical_criteria',
+    'imc_desirable_criteria', 'imc_level', 'analyzer_version', 'created_at',
+]
+
+# Rows are sent in chunks of about this many characters
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_statement(args, dialect_name, include_code=False):
+    """
+    Build the export query: the listing columns (plus the code, inline or
+    compressed in its SourceBlob), filtered like the listing, newest first.
+
+    Raises:
+        ValueError: If a filter value is invalid
+    """
+    columns = [getattr(CodeAnalysis, field) for field in EXPORT_FIELDS]
+    statement = select(*columns)
+    if include_code:
+        statement = select(*columns, CodeAnalysis._code_content, SourceBlob.data) \
+            .outerjoin(SourceBlob, SourceBlob.hash == CodeAnalysis.source_hash)
+    statement = apply_filters(statement, args, dialect_name)
+    return statement.order_by(CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc())
+
+
+def iter_export_records(session, statement, include_code=False, batch_size=500):
+    """
+    Yield one dict per exported analysis.
+
+    Rows are fetched batch_size at a time through a server-side cursor
+    (yield_per), so memory stays flat no matter how many rows match.
+    """
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    for row in result:
+        record = dict(zip(EXPORT_FIELDS, row))
+        if record['created_at'] is not None:
+            record['created_at'] = record['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+        if include_code:
+            inline_code, blob = row[len(EXPORT_FIELDS):]
+            record['code_content'] = zlib.decompress(blob).decode('utf-8', 'surrogatepass') \
+                if blob is not None else inline_code
+        yield record
+
+
+def iter_csv(records, include_code=False):
+    """
+    Encode records as CSV. The header is sent right away, so the download
+    starts before the first row is fetched; rows follow in CHUNK_SIZE chunks.
+    """
+    fields = EXPORT_FIELDS + (['code_content'] if include_code else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writeheader()
+    yield flush()
+    for record in records:
+        writer.writerow(record)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield flush()
+    yield flush()
+
+
+def iter_jsonl(records):
+    """
+    Encode records as JSON lines. The first line is sent right away, the
+    others in CHUNK_SIZE chunks.
+    """
+    lines = []
+    size = 0
+    for count, record in enumerate(records):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE or count == 0:
+            yield "".join(lines)
+            lines = []
+            size = 0
+    yield "".join(lines)
@@ -0,0 +1,391 @@
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import uuid
+
+import click
+from flask import request, jsonify, url_for, Response, stream_with_context
+from sqlalchemy import and_, or_, update
+
+from models import ValidationJob, JobItem
+from persistence import save_analyses
+
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def enqueue_job(submissions, python_version, db):
+    """
+    Queue a batch of files for background validation.
+
+    Args:
+        submissions (list): (filename, code, error) tuples; files that
+            could not be read have code None and an error message, and are
+            recorded as failed items so they appear in the results
+        python_version (str): The Python version to validate against
+        db: The SQLAlchemy instance
+
+    Returns:
+        ValidationJob: The new job
+    """
+    job = ValidationJob(python_version=python_version, total=len(submissions))
+    db.session.add(job)
+    db.session.flush()
+    now = _utcnow()
+    db.session.add_all([
+        JobItem(job_id=job.id, position=position, filename=filename, code_content=code)
+        if error is None else
+        JobItem(job_id=job.id, position=position, filename=filename, status='failed',
+                error=error, finished_at=now)
+        for position, (filename, code, error) in enumerate(submissions)
+    ])
+    db.session.commit()
+    return job
+
+
+def _claimable(now):
+    """Items waiting for a worker, or whose worker lost its lease."""
+    return or_(
+        JobItem.status == 'pending',
+        and_(JobItem.status == 'running', JobItem.lease_expires_at < now)
+    )
+
+
+def claim_items(db, worker_id, limit, lease_seconds, max_attempts):
+    """
+    Reserve up to limit items for this worker.
+
+    Items are claimed with a conditional UPDATE, so two workers racing for
+    the same item cannot both get it. Items whose lease expired after
+    max_attempts tries are marked as failed instead of being retried.
+
+    Returns:
+        list: The IDs of the claimed items
+    """
+    now = _utcnow()
+
+    db.session.execute(
+        update(JobItem)
+        .where(JobItem.status == 'running', JobItem.lease_expires_at < now,
+               JobItem.attempts >= max_attempts)
+        .values(status='failed', error="Tempo de processamento esgotado em todas as tentativas.",
+                code_content=None, finished_at=now)
+    )
+
+    candidates = db.session.query(JobItem.id).filter(_claimable(now)) \
+        .order_by(JobItem.id).limit(limit).all()
+
+    claimed = []
+    for (item_id,) in candidates:
+        result = db.session.execute(
+            update(JobItem)
+            .where(JobItem.id == item_id, _claimable(now))
+            .values(status='running', lease_owner=worker_id,
+                    lease_expires_at=now + datetime.timedelta(seconds=lease_seconds),
+                    attempts=JobItem.attempts + 1)
+        )
+        if result.rowcount:
+            claimed.append(item_id)
+
+    db.session.commit()
+    return claimed
+
+
+def process_item(item_id, db, worker_id, max_attempts):
+    """
+    Analyze a claimed item and save its result.
+
+    The CodeAnalysis record and the item update are committed together and
+    only if this worker still holds the lease, so an item reclaimed by
+    another worker is never saved twice.
+    """
+    # Imported here to avoid a circular import with routes
+    from routes import analyze_submission
+
+    item = db.session.get(JobItem, item_id)
+    if item is None or item.status != 'running' or item.lease_owner != worker_id:
+        return
+
+    owned = and_(JobItem.id == item_id, JobItem.status == 'running',
+                 JobItem.lease_owner == worker_id)
+    try:
+        validation_result, suggestions, cache_entries = analyze_submission(
+            item.code_content or "", item.job.python_version, db)
+        if "skill_level" not in validation_result:
+            # The analysis timed out or crashed: try again, then fail the item
+            raise RuntimeError(validation_result["error_message"])
+        response_data = save_analyses(
+            [(item.code_content or "", item.filename, validation_result, suggestions)],
+            db, commit=False, cache_entries=cache_entries)[0]
+        values = {
+            "status": 'done',
+            "result": json.dumps(response_data),
+            "analysis_id": response_data.get("analysis_id"),
+            "code_content": None,
+            "finished_at": _utcnow()
+        }
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error processing job item {item_id}: {str(e)}")
+        if item.attempts < max_attempts:
+            values = {"status": 'pending', "lease_owner": None, "error": str(e)}
+        else:
+            values = {"status": 'failed', "error": str(e), "code_content": None,
+                      "finished_at": _utcnow()}
+
+    if db.session.execute(update(JobItem).where(owned).values(**values)).rowcount:
+        db.session.commit()
+    else:
+        # The lease expired and another worker took the item
+        db.session.rollback()
+
+
+def run_worker(app, db, poll_interval=1.0, batch_size=10, lease_seconds=60,
+               max_attempts=3, stop=None):
+    """
+    Drain the job queue until stop() returns True.
+
+    Args:
+        app: The Flask application
+        db: The SQLAlchemy instance
+        poll_interval (float): Seconds to wait when the queue is empty
+        batch_size (int): Items claimed at a time
+        lease_seconds (int): How long a claimed item is reserved
+        max_attempts (int): Tries before an item is marked as failed
+        stop (callable): Returns True when the worker should exit
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    stop = stop or (lambda: False)
+    logging.info(f"Job worker {worker_id} started")
+
+    with app.app_context():
+        while not stop():
+            try:
+                claimed = claim_items(db, worker_id, batch_size, lease_seconds, max_attempts)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error claiming job items: {str(e)}")
+                claimed = []
+
+            if not claimed:
+                time.sleep(poll_interval)
+                continue
+
+            for item_id in claimed:
+                # Unprocessed claims are picked up again when their lease expires
+                if stop():
+                    break
+                process_item(item_id, db, worker_id, max_attempts)
+            db.session.remove()
+
+    logging.info(f"Job worker {worker_id} stopped")
+
+
+def _worker_process(options):
+    """Entry point of each worker process started by the jobs-worker command."""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(True))
+
+    # A spawned process: importing main creates a fresh app and engine
+    from main import app
+    from database import db
+    try:
+        run_worker(app, db, stop=lambda: bool(stopping), **options)
+    except KeyboardInterrupt:
+        pass
+
+
+def job_status(job, db, after=-1):
+    """
+    Build the progress report of a job.
+
+    Args:
+        job (ValidationJob): The job
+        db: The SQLAlchemy instance
+        after (int): Only include results of items after this position
+
+    Returns:
+        dict: Progress counters and the results finished so far
+    """
+    counts = dict(
+        db.session.query(JobItem.status, db.func.count(JobItem.id))
+        .filter(JobItem.job_id == job.id).group_by(JobItem.status).all()
+    )
+    finished = counts.get('done', 0) + counts.get('failed', 0)
+    if finished == job.total:
+        status = 'done'
+    elif counts.get('pending', 0) == job.total:
+        status = 'queued'
+    else:
+        status = 'running'
+
+    items = job.items.filter(JobItem.status.in_(['done', 'failed']),
+                             JobItem.position > after).all()
+
+    return {
+        "job_id": job.id,
+        "status": status,
+        "total": job.total,
+        "done": counts.get('done', 0),
+        "failed": counts.get('failed', 0),
+        "running": counts.get('running', 0),
+        "pending": counts.get('pending', 0),
+        "results": [_item_result(item) for item in items]
+    }
+
+
+def _item_result(item):
+    if item.status == 'done':
+        result = json.loads(item.result)
+    else:
+        result = {
+            "valid": False,
+            "error_message": item.error or "",
+            "error_line": -1,
+            "filename": item.filename,
+            "suggestions": []
+        }
+    result["position"] = item.position
+    return result
+
+
+def init_jobs(app, db):
+    """Initialize the background job routes and the worker command."""
+
+    @app.route("/jobs", methods=["POST"])
+    def create_job():
+        """
+        Queue the uploaded files (or the Python files of uploaded archives)
+        for background validation.
+        """
+        python_version = request.form.get("python_version", "3")
+        limits = {
+            "max_members": app.config.get("ARCHIVE_MAX_MEMBERS", 1000),
+            "max_file_size": app.config.get("ARCHIVE_MAX_FILE_SIZE", 1024 * 1024),
+            "max_total_size": app.config.get("ARCHIVE_MAX_TOTAL_SIZE", 50 * 1024 * 1024),
+        }
+
+        # Imported on demand: tarfile/zipfile are only needed for archives
+        from archive import ArchiveError, iter_archive_members
+
+        def submission(filename, data):
+            # Same messages as /validate/archive; the file becomes a failed item
+            if data is None:
+                return filename, None, f"O arquivo excede {limits['max_file_size']} bytes."
+            try:
+                return filename, data.decode('utf-8'), None
+            except UnicodeDecodeError:
+                return filename, None, "O arquivo não está codificado em UTF-8."
+
+        submissions = []
+        try:
+            for file in request.files.getlist('file'):
+                if not file.filename:
+                    continue
+                if file.filename.lower().endswith(ARCHIVE_EXTENSIONS):
+                    for member_name, data in iter_archive_members(file.stream, file.filename, **limits):
+                        submissions.append(submission(member_name, data))
+                else:
+                    submissions.append(submission(file.filename, file.read()))
+        except ArchiveError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if not submissions:
+            return jsonify({"error": "Nenhum arquivo Python enviado."}), 400
+
+        job = enqueue_job(submissions, python_version, db)
+        return jsonify({
+            "job_id": job.id,
+            "total": job.total,
+            "status_url": url_for("get_job", job_id=job.id),
+            "events_url": url_for("job_events", job_id=job.id)
+        }), 202
+
+    @app.route("/jobs/<int:job_id>")
+    def get_job(job_id):
+        """Report the progress and the partial results of a job."""
+        job = db.get_or_404(ValidationJob, job_id)
+        after = request.args.get("after", -1, type=int)
+        return jsonify(job_status(job, db, after))
+
+    @app.route("/jobs/<int:job_id>/events")
+    def job_events(job_id):
+        """
+        Stream the results of a job as Server-Sent Events.
+
+        A stream lasts at most JOB_EVENTS_MAX_DURATION seconds, so an
+        abandoned or stalled job cannot hold a worker forever. It then ends
+        with a "reconnect" event whose data has the after value to reconnect
+        with: every item up to that position was already sent (items after
+        it may be sent again; results carry their position).
+        """
+        db.get_or_404(ValidationJob, job_id)
+        after = request.args.get("after", -1, type=int)
+        poll_interval = app.config.get("JOB_EVENTS_POLL_INTERVAL", 1.0)
+        max_duration = app.config.get("JOB_EVENTS_MAX_DURATION", 300)
+
+        def generate():
+            # Every item up to done_until was sent; sent holds the positions
+            # sent beyond it, finished out of order
+            done_until = after
+            sent = set()
+            deadline = time.monotonic() + max_duration
+            while True:
+                status = job_status(db.session.get(ValidationJob, job_id), db, done_until)
+                for result in status.pop("results"):
+                    if result["position"] not in sent:
+                        sent.add(result["position"])
+                        yield f"event: result\ndata: {json.dumps(result)}\n\n"
+                while done_until + 1 in sent:
+                    done_until += 1
+                    sent.remove(done_until)
+                yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+                if status["status"] == 'done':
+                    yield "event: done\ndata: {}\n\n"
+                    return
+                # Do not keep a connection checked out while waiting
+                db.session.remove()
+                if time.monotonic() + poll_interval > deadline:
+                    yield f"event: reconnect\ndata: {json.dumps({'after': done_until})}\n\n"
+                    return
+                time.sleep(poll_interval)
+
+        return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.cli.command("jobs-worker")
+    @click.option("--processes", default=1, show_default=True, help="Number of worker processes.")
+    def jobs_worker(processes):
+        """Process queued validation jobs until interrupted."""
+        options = {
+            "poll_interval": app.config.get("JOB_POLL_INTERVAL", 1.0),
+            "batch_size": app.config.get("JOB_BATCH_SIZE", 10),
+            "lease_seconds": app.config.get("JOB_LEASE_SECONDS", 60),
+            "max_attempts": app.config.get("JOB_MAX_ATTEMPTS", 3),
+        }
+        if processes <= 1:
+            try:
+                run_worker(app, db, **options)
+            except KeyboardInterrupt:
+                pass
+            return
+
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=_worker_process, args=(options,)) for _ in range(processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
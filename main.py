@@ -1,35 +1,80 @@
 import os
 import logging
+import weakref
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+from database import db, Base, init_sqlite_pragmas  # noqa: F401 (db is imported from here by older code)
 
-# Define the SQLAlchemy base class
-class Base(DeclarativeBase):
-    pass
 
-# Create the SQLAlchemy instance
-db = SQLAlchemy(model_class=Base)
+# Applications created in this process, whose engines are reset after a fork
+_apps = weakref.WeakSet()
 
-# Create the Flask application
-app = Flask(__name__)
 
-# Carregar configurações do arquivo config.py
-app.config.from_pyfile('config.py')
+def _dispose_engines():
+    """Drop connections inherited from the parent process after a fork."""
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
 
-# Para compatibilidade com ambientes que usam SESSION_SECRET
-if os.environ.get("SESSION_SECRET"):
-    app.secret_key = os.environ.get("SESSION_SECRET")
-db.init_app(app)
 
-# Initialize the database
-with app.app_context():
-    from models import CodeAnalysis
-    db.create_all()
+# Registered once: a hook per create_app call would pile up (and keep every
+# app alive) in processes that build many apps, such as tests and benchmarks
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engines)
 
-# Import and initialize routes
-from routes import init_routes
-init_routes(app, db)
+
+def create_app(config=None):
+    """
+    Create and configure the Flask application.
+    
+    Creating the app does not touch the database: the schema is created by
+    the init-db command. This keeps startup fast and safe with gunicorn
+    --preload, and connection pools are reset in every forked worker.
+    
+    Args:
+        config (dict): Settings that override the ones in config.py
+        
+    Returns:
+        Flask: The application
+    """
+    app = Flask(__name__)
+    
+    # Carregar configurações do arquivo config.py
+    app.config.from_pyfile('config.py')
+    if config:
+        app.config.from_mapping(config)
+    
+    # Para compatibilidade com ambientes que usam SESSION_SECRET
+    if os.environ.get("SESSION_SECRET"):
+        app.secret_key = os.environ.get("SESSION_SECRET")
+    
+    # Set up logging (level from LOG_LEVEL; DEBUG formats every SQL statement)
+    logging.basicConfig(level=app.config.get("LOG_LEVEL", "INFO"))
+    
+    db.init_app(app)
+    init_sqlite_pragmas(app)
+    
+    # Request timing, Server-Timing headers and /metrics
+    from metrics import init_metrics
+    init_metrics(app)
+    
+    # Import and initialize routes
+    from routes import init_routes
+    init_routes(app, db)
+    
+    # Background validation jobs
+    from jobs import init_jobs
+    init_jobs(app, db)
+    
+    # Maintenance commands (flask --app main <command>)
+    from commands import init_commands
+    init_commands(app, db)
+    
+    _apps.add(app)
+    
+    return app
+
+
+# Application used by gunicorn (main:app), run.py and flask --app main
+app = create_app()
@@ -0,0 +1,266 @@
+import bisect
+import contextvars
+import threading
+import time
+
+# Histogram buckets (seconds), from sub-millisecond stages to slow uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in values]
+
+
+class Histogram:
+    """Cumulative histogram with a sum and a count, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [contagem por bucket (+Inf no final), soma]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        samples = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                samples.append((self.name + "_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Collectors are callables returning extra (name, kind, documentation,
+    samples) tuples at scrape time, for counters kept elsewhere (e.g. the
+    result cache).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        families = [(metric.name, metric.kind, metric.documentation, metric.samples())
+                    for metric in self._metrics]
+        for collector in self._collectors:
+            families.extend(collector())
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "validator_stage_seconds", "Time spent in each stage of an analysis or request.", ["stage"])
+REQUESTS = registry.counter(
+    "validator_http_requests_total", "HTTP requests by endpoint, method and status.",
+    ["endpoint", "method", "status"])
+REQUEST_SECONDS = registry.histogram(
+    "validator_http_request_duration_seconds", "HTTP request duration by endpoint.", ["endpoint"])
+FILES = registry.counter(
+    "validator_files_total", "Submitted files analyzed, by validity.", ["valid"])
+BYTES = registry.counter(
+    "validator_bytes_total", "Bytes of submitted code analyzed.")
+ERRORS = registry.counter(
+    "validator_errors_total", "Errors while validating submissions, by type.", ["type"])
+CHUNKS = registry.counter(
+    "validator_chunks_total", "Chunks of incrementally analyzed files, reused from the cache or analyzed.",
+    ["result"])
+GROUP_COMMIT_SIZE = registry.histogram(
+    "validator_group_commit_size", "Analyses saved per group commit of the writer thread.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+
+# Stage timings of the current request, read by the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+# [chunks, reused] of the incremental analyses of the current request
+_request_chunks = contextvars.ContextVar("request_chunks", default=None)
+
+
+class timed:
+    """
+    Time a block, recording it in STAGE_SECONDS and in the Server-Timing
+    header of the current request (if any).
+
+    A plain class rather than a generator-based context manager: it is
+    entered several times per analysis, so it should cost as little as
+    two perf_counter calls and one locked dict update.
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def record_submission(code, validation_result):
+    """Count an analyzed file and its size."""
+    FILES.inc(valid="true" if validation_result.get("valid") else "false")
+    BYTES.inc(len(code.encode("utf-8", "surrogatepass")))
+
+
+def record_chunk_stats(chunk_stats):
+    """Count the chunks of an incremental analysis (None for a whole-module one)."""
+    if not chunk_stats:
+        return
+    reused = chunk_stats["reused"]
+    CHUNKS.inc(reused, result="reused")
+    CHUNKS.inc(chunk_stats["chunks"] - reused, result="analyzed")
+    counts = _request_chunks.get()
+    if counts is not None:
+        counts[0] += chunk_stats["chunks"]
+        counts[1] += reused
+
+
+def server_timing_header(timings, total=None, chunks=None):
+    """
+    Build a Server-Timing header value; repeated stages are summed.
+
+    Args:
+        timings (list): (stage, seconds) pairs, in the order they ran
+        total (float): Whole request duration in seconds, if known
+        chunks (list): [chunks, reused] of incremental analyses, if any
+
+    Returns:
+        str: e.g. "parse;dur=1.20, walk;dur=0.40, total;dur=3.10"
+    """
+    durations = {}
+    for stage, elapsed in timings:
+        durations[stage] = durations.get(stage, 0.0) + elapsed
+    if total is not None:
+        durations["total"] = total
+    entries = [f"{stage};dur={elapsed * 1000:.2f}" for stage, elapsed in durations.items()]
+    if chunks and chunks[0]:
+        entries.append(f'chunks;desc="{chunks[1]}/{chunks[0]} reused ({chunks[1] / chunks[0]:.0%})"')
+    return ", ".join(entries)
+
+
+def init_metrics(app):
+    """
+    Time every request, add the Server-Timing header and serve /metrics.
+
+    Metrics are kept per process: with several gunicorn workers each scrape
+    reads the worker that answered it.
+    """
+    from flask import g, request, Response
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        _request_timings.set([])
+        _request_chunks.set([0, 0])
+
+    @app.after_request
+    def add_server_timing(response):
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "none"
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+        response.headers["Server-Timing"] = server_timing_header(
+            _request_timings.get() or [], elapsed, _request_chunks.get())
+        return response
+
+    @app.teardown_request
+    def clear_request_timings(exc):
+        _request_timings.set(None)
+        _request_chunks.set(None)
+
+    @app.route("/metrics")
+    def metrics():
+        """Expose the metrics of this process in the Prometheus text format."""
+        return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
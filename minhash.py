@@ -0,0 +1,175 @@
+import ast
+import hashlib
+
+# Signature size (bins of one-permutation MinHash) and its split into LSH
+# bands: two analyses become candidates when all the rows of at least one
+# band are equal, which happens with probability 1 - (1 - J**ROWS)**BANDS
+# for a Jaccard similarity J (about 50% at J = 0.5, 99.6% at J = 0.8)
+SIGNATURE_BINS = 64
+BANDS = 16
+ROWS = SIGNATURE_BINS // BANDS
+
+# Node types per shingle (consecutive nodes of a level-order walk)
+SHINGLE_SIZE = 5
+
+# Programs with fewer shingles are not indexed: short programs look alike
+# whether or not they were copied
+MIN_SHINGLES = 20
+
+_BIN_BITS = 6  # log2(SIGNATURE_BINS)
+_VALUE_BITS = 64 - _BIN_BITS
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+
+# Load, Store and Del only say how a name is used
+_SKIPPED = (ast.expr_context,)
+
+_type_ids = {}
+
+
+def node_token(node_type):
+    """
+    Return the token of an AST node type: a small stable id (its name, not a
+    per-process hash), or None for the types left out of shingles.
+    """
+    try:
+        return _type_ids[node_type]
+    except KeyError:
+        token = None if issubclass(node_type, _SKIPPED) else node_type.__name__.encode('ascii')
+        _type_ids[node_type] = token
+        return token
+
+
+def statement_tokens(statement):
+    """
+    Return the node types of a statement in level order (as ast.walk).
+
+    Identifiers, attribute names and literal values are not AST nodes, so
+    they are left out: renaming variables or changing constants gives the
+    same sequence. The analyzer collects the same tokens during its own
+    walk (validator._walk_tree); this is for programs outside an analysis.
+    """
+    tokens = []
+    level = [statement]
+    while level:
+        next_level = []
+        for node in level:
+            token = node_token(type(node))
+            if token is not None:
+                tokens.append(token)
+            next_level.extend(ast.iter_child_nodes(node))
+        level = next_level
+    return tokens
+
+
+def raw_bins(statements):
+    """
+    Hash the shingles of every top-level statement into MinHash bins.
+
+    Shingles never cross top-level statements, so the bins of a module are
+    the bin-wise minimum of the bins of its statements (or of chunks of
+    them), which lets incremental analysis merge cached chunks exactly.
+
+    Args:
+        statements (list): The node type tokens of each top-level statement
+
+    Returns:
+        tuple: (bins, shingle count); bins holds SIGNATURE_BINS minimum
+        values, None for empty bins
+    """
+    bins = [None] * SIGNATURE_BINS
+    count = 0
+    for tokens in statements:
+        if not tokens:
+            continue
+        grams = [tokens] if len(tokens) < SHINGLE_SIZE else \
+            [tokens[i:i + SHINGLE_SIZE] for i in range(len(tokens) - SHINGLE_SIZE + 1)]
+        for gram in grams:
+            digest = hashlib.blake2b(b' '.join(gram), digest_size=8).digest()
+            value = int.from_bytes(digest, 'big')
+            index = value & (SIGNATURE_BINS - 1)
+            value >>= _BIN_BITS
+            current = bins[index]
+            if current is None or value < current:
+                bins[index] = value
+            count += 1
+    return bins, count
+
+
+def merge_bins(parts):
+    """Combine (bins, shingle count) pairs of consecutive chunks."""
+    bins = [None] * SIGNATURE_BINS
+    count = 0
+    for part_bins, part_count in parts:
+        count += part_count
+        for index, value in enumerate(part_bins):
+            if value is not None and (bins[index] is None or value < bins[index]):
+                bins[index] = value
+    return bins, count
+
+
+def densify(bins):
+    """
+    Fill the empty bins, so every bin can be compared.
+
+    An empty bin borrows the value of the next non-empty bin to its right
+    (circularly), tagged with the distance, as in densified one-permutation
+    hashing. Returns None when every bin is empty.
+    """
+    if all(value is None for value in bins):
+        return None
+    signature = []
+    for index in range(SIGNATURE_BINS):
+        distance = 0
+        value = bins[index]
+        while value is None:
+            distance += 1
+            value = bins[(index + distance) % SIGNATURE_BINS]
+        signature.append((distance << _VALUE_BITS) | (value & _VALUE_MASK))
+    return signature
+
+
+def encode(signature):
+    """Pack a signature into bytes (8 per bin)."""
+    return b''.join(value.to_bytes(8, 'big') for value in signature)
+
+
+def decode(data):
+    """Unpack a signature packed by encode."""
+    return [int.from_bytes(data[i:i + 8], 'big') for i in range(0, len(data), 8)]
+
+
+def band_keys(signature):
+    """
+    Return the LSH bucket of each band of a signature.
+
+    The band number is part of the hash, so buckets of different bands
+    never collide.
+    """
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        data = bytes([band]) + b''.join(value.to_bytes(8, 'big') for value in rows)
+        keys.append(hashlib.blake2b(data, digest_size=8).hexdigest())
+    return keys
+
+
+def estimate_similarity(first, second):
+    """Estimate the Jaccard similarity of two signatures (fraction of equal bins)."""
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_BINS
+
+
+def code_signature(code):
+    """
+    Compute the signature of a program on its own (outside an analysis).
+
+    Returns:
+        tuple: (signature bytes, shingle count), or None if the code does
+        not parse or has no statements
+    """
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError, RecursionError, MemoryError):
+        return None
+    bins, count = raw_bins([statement_tokens(statement) for statement in tree.body])
+    signature = densify(bins)
+    return (encode(signature), count) if signature is not None else None
@@ -1,11 +1,17 @@
 import datetime
-from main import db
+import zlib
+from database import db
 
 class CodeAnalysis(db.Model):
     """Model para armazenar resultados de análise de código."""
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
-    code_content = db.Column(db.Text, nullable=False)
+    # Código de análises antigas, guardado na própria linha. O código novo fica
+    # comprimido em SourceBlob (source_hash); use a propriedade code_content.
+    # Carregado apenas quando acessado (listagens não precisam do código)
+    _code_content = db.deferred(db.Column('code_content', db.Text, nullable=False, default=''))
+    source_hash = db.Column(db.String(64), db.ForeignKey('source_blob.hash'), nullable=True, index=True)
+    source = db.relationship('SourceBlob')
     is_valid = db.Column(db.Boolean, default=False)
     error_message = db.Column(db.Text, nullable=True)
     error_line = db.Column(db.Integer, nullable=True)
@@ -20,15 +26,42 @@ class CodeAnalysis(db.Model):
     imc_desirable_criteria = db.Column(db.Boolean, default=False)
     imc_level = db.Column(db.String(50), nullable=True)
     
+    # Versão do analisador (e das regras) que produziu o resultado; NULL em
+    # análises anteriores ao versionamento. Atualizada pelo comando reanalyze
+    analyzer_version = db.Column(db.String(64), nullable=True)
+    
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     
+    # Índices para a listagem (mais recentes primeiro) e para os filtros mais usados
+    __table_args__ = (
+        db.Index('ix_code_analysis_created_at_id', 'created_at', 'id'),
+        db.Index('ix_code_analysis_skill_level_created_at', 'skill_level', 'created_at', 'id'),
+        db.Index('ix_code_analysis_imc_level_created_at', 'imc_level', 'created_at', 'id'),
+        db.Index('ix_code_analysis_is_valid_created_at', 'is_valid', 'created_at', 'id'),
+        # text_pattern_ops permite ao PostgreSQL usar o índice em buscas por prefixo (LIKE 'x%')
+        db.Index('ix_code_analysis_filename', 'filename',
+                 postgresql_ops={'filename': 'text_pattern_ops'}),
+    )
+    
     def __repr__(self):
         return f'<CodeAnalysis {self.filename}>'
     
-    def to_dict(self):
+    @property
+    def code_content(self):
+        """The submitted code, decompressed from its SourceBlob if needed."""
+        if self.source_hash is not None:
+            return self.source.text
+        return self._code_content
+    
+    @code_content.setter
+    def code_content(self, code):
+        self.source_hash = None
+        self._code_content = code
+    
+    def to_dict(self, include_code=False):
         """Convert the model to a dictionary."""
-        return {
+        data = {
             'id': self.id,
             'filename': self.filename,
             'is_valid': self.is_valid,
@@ -40,5 +73,178 @@ class CodeAnalysis(db.Model):
             'imc_critical_criteria': self.imc_critical_criteria,
             'imc_desirable_criteria': self.imc_desirable_criteria,
             'imc_level': self.imc_level,
+            'analyzer_version': self.analyzer_version,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        }
\ No newline at end of file
+        }
+        if include_code:
+            data['code_content'] = self.code_content
+        return data
+
+
+class SourceBlob(db.Model):
+    """Código enviado, comprimido com zlib e armazenado uma única vez por conteúdo."""
+    hash = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    # Tamanho do código antes da compressão, em bytes
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f'<SourceBlob {self.hash}>'
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8', 'surrogatepass')
+
+class AnalysisRollup(db.Model):
+    """Contagem de análises por dia, nível, nível IMC e validade (mantida a cada inserção e exclusão)."""
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    # '' representa um nível ausente (NULL em CodeAnalysis)
+    skill_level = db.Column(db.String(50), nullable=False, default='')
+    imc_level = db.Column(db.String(50), nullable=False, default='')
+    is_valid = db.Column(db.Boolean, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'skill_level', 'imc_level', 'is_valid',
+                            name='uq_analysis_rollup_key'),
+    )
+
+    def __repr__(self):
+        return f'<AnalysisRollup {self.day} {self.skill_level} {self.imc_level} {self.is_valid}>'
+
+
+class SimilaritySignature(db.Model):
+    """Assinatura MinHash da estrutura do código de uma análise (detecção de cópias)."""
+    analysis_id = db.Column(db.Integer, primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+    # Número de shingles (sequências de nós da árvore sintática) da análise
+    shingles = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return f'<SimilaritySignature {self.analysis_id}>'
+
+
+class SimilarityBand(db.Model):
+    """Balde LSH de uma faixa da assinatura; análises no mesmo balde são candidatas a cópia."""
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.String(16), nullable=False)
+    analysis_id = db.Column(db.Integer, nullable=False, index=True)
+
+    __table_args__ = (
+        db.Index('ix_similarity_band_bucket', 'bucket', 'analysis_id'),
+    )
+
+    def __repr__(self):
+        return f'<SimilarityBand {self.bucket} {self.analysis_id}>'
+
+
+class AnalysisFeature(db.Model):
+    """Contagem de uma característica do código de uma análise (uma linha por característica)."""
+    analysis_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False)
+
+    # Busca por característica: name = ? AND value > ? percorre apenas o trecho do índice
+    __table_args__ = (
+        db.Index('ix_analysis_feature_name_value', 'name', 'value', 'analysis_id'),
+    )
+
+    def __repr__(self):
+        return f'<AnalysisFeature {self.analysis_id} {self.name}={self.value}>'
+
+
+class AnalysisSuggestion(db.Model):
+    """Sugestão de melhoria gerada para uma análise."""
+    id = db.Column(db.Integer, primary_key=True)
+    analysis_id = db.Column(db.Integer, nullable=False, index=True)
+    line = db.Column(db.Integer, nullable=True)
+    # Tipo exibido (style, warning, ...) e categoria pesquisável (bare_except, ...)
+    type = db.Column(db.String(20), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_analysis_suggestion_category', 'category', 'analysis_id'),
+    )
+
+    def __repr__(self):
+        return f'<AnalysisSuggestion {self.analysis_id} {self.category}>'
+
+    def to_dict(self):
+        """Convert the suggestion to the format returned by the validator."""
+        return {'line': self.line, 'message': self.message, 'type': self.type, 'category': self.category}
+
+
+class ReanalysisRun(db.Model):
+    """Execução do comando reanalyze: ponto de retomada e relatório das mudanças de nível."""
+    id = db.Column(db.Integer, primary_key=True)
+    analyzer_version = db.Column(db.String(64), nullable=False, index=True)
+    # Maior id de análise já processado (a execução continua a partir dele)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    scanned = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    # JSON: {"nível antigo -> nível novo": quantidade}, do nível geral e do nível IMC
+    level_changes = db.Column(db.Text, nullable=False, default='{}')
+    imc_level_changes = db.Column(db.Text, nullable=False, default='{}')
+    started_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<ReanalysisRun {self.id} {self.analyzer_version}>'
+
+
+class CachedAnalysis(db.Model):
+    """Resultado de análise armazenado pelo hash do conteúdo do código."""
+    key = db.Column(db.String(64), primary_key=True)
+    result = db.Column(db.Text, nullable=False)
+    # Versão do analisador que produziu o resultado (entradas de outras versões
+    # nunca mais são lidas e são apagadas por flask prune-cache)
+    analyzer_version = db.Column(db.String(64), nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<CachedAnalysis {self.key}>'
+
+
+class ValidationJob(db.Model):
+    """Lote de arquivos enviado para validação em segundo plano."""
+    id = db.Column(db.Integer, primary_key=True)
+    python_version = db.Column(db.String(10), nullable=False, default="3")
+    total = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+
+    items = db.relationship('JobItem', backref='job', lazy='dynamic',
+                            cascade='all, delete-orphan', order_by='JobItem.position')
+
+    def __repr__(self):
+        return f'<ValidationJob {self.id}>'
+
+
+class JobItem(db.Model):
+    """Arquivo de um lote, reservado por um worker durante o processamento."""
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('validation_job.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    # Apagado depois do processamento (o código fica em CodeAnalysis)
+    code_content = db.Column(db.Text, nullable=True)
+
+    # pending -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    lease_owner = db.Column(db.String(64), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+    analysis_id = db.Column(db.Integer, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<JobItem {self.job_id}:{self.position} {self.filename}>'
@@ -0,0 +1,105 @@
+from cache import result_cache
+from models import CodeAnalysis
+from validator import analyzer_version
+from storage import attach_sources
+from stats import update_rollups
+from similarity import index_signatures
+from search import store_analysis_facts
+
+
+def build_analysis(code, filename, validation_result, suggestions):
+    """
+    Build the response data and the database record for an analysis.
+
+    Returns:
+        tuple: (response data, CodeAnalysis record or None when the result
+        has no skill level information)
+    """
+    # Prepare response data
+    response_data = {
+        "valid": validation_result["valid"],
+        "error_message": validation_result["error_message"],
+        "error_line": validation_result["error_line"],
+        "filename": filename,
+        "suggestions": suggestions
+    }
+
+    # Skill level information is available for both valid and invalid code
+    if "skill_level" not in validation_result:
+        return response_data, None
+
+    response_data["skill_level"] = validation_result["skill_level"]
+
+    # Create a database record for this analysis
+    analysis = CodeAnalysis(
+        filename=filename,
+        code_content=code,
+        is_valid=validation_result["valid"],
+        error_message=validation_result["error_message"],
+        error_line=validation_result["error_line"],
+        skill_level=validation_result["skill_level"]["level"],
+        skill_score=validation_result["skill_level"]["score"],
+        analyzer_version=analyzer_version()
+    )
+
+    # Add IMC-specific information if available
+    if "imc_analysis" in validation_result["skill_level"]:
+        imc_analysis = validation_result["skill_level"]["imc_analysis"]
+        analysis.is_imc_calculator = imc_analysis["is_imc_calculator"]
+        analysis.imc_critical_criteria = imc_analysis["has_functional_calculation"]
+        analysis.imc_desirable_criteria = imc_analysis["has_classification"]
+        analysis.imc_level = imc_analysis["level"]
+
+    return response_data, analysis
+
+
+def save_analyses(entries, db, commit=True, cache_entries=None):
+    """
+    Save a batch of analyses in a single transaction.
+
+    Each distinct code is stored once in a compressed SourceBlob. The
+    records are inserted with one flush (a bulk INSERT ... RETURNING
+    where the database supports it) and one commit, so either the whole
+    batch is saved or nothing is. The new result cache rows are written
+    in the same transaction.
+
+    Args:
+        entries (list): (code, filename, validation result, suggestions)
+            tuples, one per analysis
+        db: The SQLAlchemy instance
+        commit (bool): Commit the transaction; pass False to add more
+            changes to it before the caller commits
+        cache_entries (dict): Result cache rows (see ResultCache.prepare)
+
+    Returns:
+        list: The response data of each entry, in order, with its
+        analysis_id
+    """
+    built = [build_analysis(*entry) for entry in entries]
+    records = [analysis for _, analysis in built if analysis is not None]
+    codes = [entry[0] for entry, (_, analysis) in zip(entries, built) if analysis is not None]
+
+    if records or cache_entries:
+        try:
+            result_cache.store(cache_entries, db)
+            # The code itself is stored compressed and deduplicated
+            attach_sources(records, codes, db)
+            db.session.add_all(records)
+            db.session.flush()
+            # Read the generated IDs before the commit expires the records
+            for response_data, analysis in built:
+                if analysis is not None:
+                    response_data["analysis_id"] = analysis.id
+            # Statistics, the similarity index and the searchable features and
+            # suggestions are updated in the same transaction
+            update_rollups(records, db)
+            saved = [(analysis.id, entry) for entry, (_, analysis) in zip(entries, built) if analysis is not None]
+            index_signatures([(analysis_id, entry[2].get("similarity")) for analysis_id, entry in saved], db)
+            store_analysis_facts([(analysis_id, entry[2], entry[3]) for analysis_id, entry in saved], db)
+            if commit:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return [response_data for response_data, _ in built]
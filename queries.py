@@ -0,0 +1,215 @@
+import datetime
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import load_only
+
+from models import CodeAnalysis
+
+# Columns shown in the analysis tables; the code and error message are
+# only loaded by view_analysis
+SUMMARY_COLUMNS = (
+    CodeAnalysis.id,
+    CodeAnalysis.filename,
+    CodeAnalysis.is_valid,
+    CodeAnalysis.skill_level,
+    CodeAnalysis.skill_score,
+    CodeAnalysis.is_imc_calculator,
+    CodeAnalysis.imc_critical_criteria,
+    CodeAnalysis.imc_desirable_criteria,
+    CodeAnalysis.imc_level,
+    CodeAnalysis.created_at,
+)
+
+
+# Columns used by CodeAnalysis.to_dict
+LISTING_COLUMNS = SUMMARY_COLUMNS + (
+    CodeAnalysis.error_message,
+    CodeAnalysis.error_line,
+    CodeAnalysis.analyzer_version,
+)
+
+
+def summary_query(columns=SUMMARY_COLUMNS):
+    """Query CodeAnalysis loading only the given columns."""
+    return CodeAnalysis.query.options(load_only(*columns))
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'sim')
+
+
+def _parse_date(value):
+    return datetime.datetime.fromisoformat(value.strip())
+
+
+def filename_prefix_filter(prefix, dialect_name):
+    """
+    Filter analyses whose filename starts with prefix, using the index.
+
+    PostgreSQL uses the text_pattern_ops index for LIKE 'prefix%'. SQLite
+    only uses an index for LIKE in case-insensitive setups, so there the
+    prefix becomes a range over the (binary collated) index.
+    """
+    if dialect_name == 'postgresql':
+        escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return CodeAnalysis.filename.like(escaped + '%')
+    return (CodeAnalysis.filename >= prefix) & (CodeAnalysis.filename < prefix + '\U0010ffff')
+
+
+def apply_filters(query, args, dialect_name):
+    """
+    Apply the listing filters found in args.
+
+    Supported filters: skill_level, imc_level, is_valid, is_imc_calculator,
+    filename (prefix), since and until (ISO dates, on created_at).
+
+    Args:
+        query: The CodeAnalysis query to filter
+        args (dict): The filter values, e.g. request.args
+        dialect_name (str): The database dialect, e.g. "sqlite"
+
+    Returns:
+        The filtered query
+
+    Raises:
+        ValueError: If a filter value is invalid
+    """
+    if args.get('skill_level'):
+        query = query.filter(CodeAnalysis.skill_level == args['skill_level'])
+    if args.get('imc_level'):
+        query = query.filter(CodeAnalysis.imc_level == args['imc_level'])
+    if args.get('is_valid'):
+        query = query.filter(CodeAnalysis.is_valid == _parse_bool(args['is_valid']))
+    if args.get('is_imc_calculator'):
+        query = query.filter(CodeAnalysis.is_imc_calculator == _parse_bool(args['is_imc_calculator']))
+    if args.get('filename'):
+        query = query.filter(filename_prefix_filter(args['filename'], dialect_name))
+    if args.get('since'):
+        query = query.filter(CodeAnalysis.created_at >= _parse_date(args['since']))
+    if args.get('until'):
+        query = query.filter(CodeAnalysis.created_at < _parse_date(args['until']))
+    return query
+
+
+def encode_cursor(analysis):
+    """Encode the (created_at, id) position of an analysis as a page cursor."""
+    return f"{analysis.created_at.isoformat()}_{analysis.id}"
+
+
+def decode_cursor(cursor):
+    """
+    Decode a page cursor.
+
+    Returns:
+        tuple: (created_at, id), or None if the cursor is invalid
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, analysis_id = cursor.rsplit('_', 1)
+        return datetime.datetime.fromisoformat(created_at), int(analysis_id)
+    except ValueError:
+        return None
+
+
+def keyset_page(query, page_size, before=None, after=None):
+    """
+    Fetch one page of analyses, newest first, using keyset pagination.
+
+    Pages are delimited by the (created_at, id) of their first and last
+    rows instead of an OFFSET, so every page costs the same no matter how
+    deep it is.
+
+    Args:
+        query: The CodeAnalysis query to paginate
+        page_size (int): Number of analyses per page
+        before (str): Cursor; return the analyses older than it
+        after (str): Cursor; return the analyses newer than it
+
+    Returns:
+        dict: The page items and the cursors of the next (older) and
+        previous (newer) pages, None when there is no such page
+    """
+    key = tuple_(CodeAnalysis.created_at, CodeAnalysis.id)
+    before, after = decode_cursor(before), decode_cursor(after)
+
+    if after is not None:
+        # Walk forward (oldest first) from the cursor, then restore the order
+        rows = query.filter(key > tuple_(*after)) \
+            .order_by(CodeAnalysis.created_at.asc(), CodeAnalysis.id.asc()) \
+            .limit(page_size + 1).all()
+        has_newer = len(rows) > page_size
+        items = list(reversed(rows[:page_size]))
+        has_older = True
+    else:
+        if before is not None:
+            query = query.filter(key < tuple_(*before))
+        rows = query.order_by(CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc()) \
+            .limit(page_size + 1).all()
+        has_older = len(rows) > page_size
+        items = rows[:page_size]
+        has_newer = before is not None
+
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(items[-1]) if items and has_older else None,
+        "prev_cursor": encode_cursor(items[0]) if items and has_newer else None,
+    }
+
+
+# Representative filters of each access pattern, checked by check-indexes
+PLANNED_FILTERS = {
+    "listing": {},
+    "skill_level": {"skill_level": "Avançado"},
+    "imc_level": {"imc_level": "Desejável"},
+    "is_valid": {"is_valid": "false"},
+    "filename_prefix": {"filename": "aluno_"},
+    "date_range": {"since": "2024-01-01", "until": "2024-02-01"},
+}
+
+
+def explain_planned_queries(session):
+    """
+    Get the query plan of each planned listing query.
+
+    A filtered query must look its rows up through an index on the
+    filtered column: walking the whole listing index and filtering every
+    row is a full scan too. Only the unfiltered listing may scan an index.
+
+    Returns:
+        dict: name -> (plan lines, whether the plan uses an index for
+        code_analysis instead of a full table scan)
+    """
+    engine = session.get_bind()
+    dialect = engine.dialect
+    reports = {}
+
+    for name, filters in PLANNED_FILTERS.items():
+        query = apply_filters(summary_query(), filters, dialect.name) \
+            .order_by(CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc()).limit(50)
+        compiled = query.statement.compile(dialect=dialect)
+        params = compiled.construct_params()
+        if compiled.positional:
+            params = tuple(params[key] for key in compiled.positiontup)
+
+        with engine.connect() as connection:
+            if dialect.name == 'sqlite':
+                rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()
+                plan = [row[-1] for row in rows]
+                # "SCAN code_analysis" reads every row; "SEARCH" looks them up
+                uses_index = not any(
+                    line.startswith('SCAN code_analysis') and (filters or 'INDEX' not in line)
+                    for line in plan)
+            else:
+                # The tables may be too small for the planner to prefer an
+                # index; disabling sequential scans shows whether one is usable
+                connection.exec_driver_sql("SET enable_seqscan = off")
+                rows = connection.exec_driver_sql("EXPLAIN " + str(compiled), params).all()
+                plan = [row[0] for row in rows]
+                uses_index = not any('Seq Scan on code_analysis' in line for line in plan) and \
+                    (not filters or any('Index Cond' in line for line in plan))
+                connection.rollback()
+
+        reports[name] = (plan, uses_index)
+
+    return reports
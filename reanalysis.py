@@ -0,0 +1,204 @@
+import datetime
+import json
+import time
+from collections import Counter, namedtuple
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import joinedload, undefer
+
+from models import CodeAnalysis, ReanalysisRun
+from persistence import build_analysis
+from search import remove_analysis_facts, store_analysis_facts
+from similarity import index_signatures, remove_signatures
+from stats import update_rollups
+from validator import analyzer_version
+
+# Columns rewritten by a re-analysis
+RESULT_FIELDS = (
+    "is_valid", "error_message", "error_line", "skill_level", "skill_score",
+    "is_imc_calculator", "imc_critical_criteria", "imc_desirable_criteria", "imc_level",
+)
+
+# Columns only set by the IMC rule set; other rule sets keep the stored values
+IMC_FIELDS = ("is_imc_calculator", "imc_critical_criteria", "imc_desirable_criteria", "imc_level")
+
+# What a re-analysis reads of an analysis (its stored result is read again
+# when the new one is written)
+_Stored = namedtuple("_Stored", ("id", "filename", "code"))
+
+
+def _transition_counts(text):
+    return Counter(json.loads(text or "{}"))
+
+
+def run_report(run):
+    """
+    Summarize a re-analysis run.
+
+    Returns:
+        dict: The counters of the run and its level transitions
+        ("old -> new": count), most frequent first
+    """
+    return {
+        "run_id": run.id,
+        "analyzer_version": run.analyzer_version,
+        "finished": run.finished_at is not None,
+        "last_id": run.last_id,
+        "scanned": run.scanned,
+        "updated": run.updated,
+        "changed": run.changed,
+        "failed": run.failed,
+        "level_changes": dict(_transition_counts(run.level_changes).most_common()),
+        "imc_level_changes": dict(_transition_counts(run.imc_level_changes).most_common()),
+    }
+
+
+def _outdated(version):
+    return or_(CodeAnalysis.analyzer_version.is_(None), CodeAnalysis.analyzer_version != version)
+
+
+def _read_batch(db, last_id, version, batch_size):
+    """Read the next analyses not produced by this analyzer version, by id."""
+    analyses = CodeAnalysis.query \
+        .options(undefer(CodeAnalysis._code_content), joinedload(CodeAnalysis.source)) \
+        .filter(CodeAnalysis.id > last_id, _outdated(version)) \
+        .order_by(CodeAnalysis.id).limit(batch_size).all()
+    stored = [_Stored(analysis.id, analysis.filename, analysis.code_content) for analysis in analyses]
+    # End the read transaction before the (slow) analysis
+    db.session.rollback()
+    db.session.expunge_all()
+    return stored
+
+
+def _write_batch(db, run, stored, results, version):
+    """
+    Write the new results of a batch and the checkpoint in one transaction.
+
+    The analyses are read again, locked where the database supports it,
+    inside the transaction: those deleted, archived or re-analyzed by
+    another run since the batch was read are skipped, and rollups are moved
+    from the levels stored now to the new ones. The stored features,
+    suggestions and similarity signatures are replaced.
+    """
+    columns = [getattr(CodeAnalysis, field) for field in ("id", "created_at") + RESULT_FIELDS]
+    current = {
+        row.id: row for row in db.session.execute(
+            select(*columns).where(CodeAnalysis.id.in_([old.id for old in stored]), _outdated(version))
+            .with_for_update())
+    }
+
+    levels, imc_levels = Counter(), Counter()
+    rows, old_records, new_records, facts, signatures = [], [], [], [], []
+    for read, result in zip(stored, results):
+        old = current.get(read.id)
+        if old is None:
+            continue
+        if result is None:
+            run.failed += 1
+            continue
+        validation_result, suggestions = result
+        _, record = build_analysis(read.code, read.filename, validation_result, suggestions)
+        if record is None:
+            run.failed += 1
+            continue
+        record.created_at = old.created_at
+        if "imc_analysis" not in validation_result["skill_level"]:
+            for field in IMC_FIELDS:
+                setattr(record, field, getattr(old, field))
+        row = {"id": old.id, "analyzer_version": version}
+        row.update((field, getattr(record, field)) for field in RESULT_FIELDS)
+        rows.append(row)
+        old_records.append(old)
+        new_records.append(record)
+        facts.append((old.id, validation_result, suggestions))
+        signatures.append((old.id, validation_result.get("similarity")))
+
+        if any(getattr(old, field) != row[field] for field in RESULT_FIELDS):
+            run.changed += 1
+        if old.skill_level != record.skill_level:
+            levels[f"{old.skill_level} -> {record.skill_level}"] += 1
+        if old.imc_level != record.imc_level:
+            imc_levels[f"{old.imc_level} -> {record.imc_level}"] += 1
+
+    if rows:
+        ids = [row["id"] for row in rows]
+        db.session.execute(update(CodeAnalysis), rows)
+        update_rollups(old_records, db, removed=True)
+        update_rollups(new_records, db)
+        remove_analysis_facts(ids, db)
+        store_analysis_facts(facts, db)
+        remove_signatures(ids, db)
+        index_signatures(signatures, db)
+
+    run.scanned += len(stored)
+    run.updated += len(rows)
+    run.last_id = stored[-1].id
+    run.level_changes = json.dumps(_transition_counts(run.level_changes) + levels)
+    run.imc_level_changes = json.dumps(_transition_counts(run.imc_level_changes) + imc_levels)
+    run.updated_at = datetime.datetime.utcnow()
+    db.session.add(run)
+    db.session.commit()
+
+
+def reanalyze(db, analyze_many, batch_size=200, max_load=0.5, limit=None, restart=False, progress=None):
+    """
+    Re-analyze the stored analyses with the current analyzer and rules.
+
+    Analyses are read in id order, batch_size at a time, skipping those
+    already produced by the current analyzer version. Each batch is
+    analyzed by analyze_many (e.g. a process pool) outside any transaction,
+    then its results and the checkpoint of the run (the last id done) are
+    written in one short transaction, so an interrupted run resumes where
+    it stopped without repeating or losing work.
+
+    To leave room for live traffic, the run sleeps after each batch so it
+    is busy at most max_load of the time (e.g. 0.5: half of the time).
+
+    Args:
+        db: The SQLAlchemy instance
+        analyze_many (callable): codes -> list of (validation result,
+            suggestions) or None for files that could not be analyzed
+        batch_size (int): Analyses per batch (and per write transaction)
+        max_load (float): Fraction of the time spent working (0 to 1)
+        limit (int): Stop after about this many analyses (None: all)
+        restart (bool): Ignore the checkpoint of an unfinished run
+        progress (callable): Called with the run after each batch
+
+    Returns:
+        ReanalysisRun: The run, finished unless limit stopped it
+    """
+    version = analyzer_version()
+    run = None
+    if not restart:
+        run = ReanalysisRun.query.filter_by(analyzer_version=version, finished_at=None) \
+            .order_by(ReanalysisRun.id.desc()).first()
+    if run is None:
+        run = ReanalysisRun(analyzer_version=version, last_id=0)
+        db.session.add(run)
+        db.session.commit()
+    run_id = run.id
+
+    processed = 0
+    while limit is None or processed < limit:
+        started = time.monotonic()
+        last_id = db.session.get(ReanalysisRun, run_id).last_id
+        stored = _read_batch(db, last_id, version, batch_size if limit is None
+                             else min(batch_size, limit - processed))
+        # The batch read ended the transaction: load the run again
+        if not stored:
+            run = db.session.get(ReanalysisRun, run_id)
+            run.finished_at = run.updated_at = datetime.datetime.utcnow()
+            db.session.commit()
+            return run
+
+        results = analyze_many([old.code for old in stored])
+        run = db.session.get(ReanalysisRun, run_id)
+        _write_batch(db, run, stored, results, version)
+        processed += len(stored)
+        if progress is not None:
+            progress(run)
+
+        if 0 < max_load < 1:
+            time.sleep((time.monotonic() - started) * (1 - max_load) / max_load)
+
+    return db.session.get(ReanalysisRun, run_id)
@@ -0,0 +1,179 @@
+import datetime
+import gzip
+import json
+import os
+
+from sqlalchemy import delete, exists
+from sqlalchemy.orm import joinedload, undefer
+
+from models import CodeAnalysis, SourceBlob
+from stats import update_rollups
+from similarity import remove_signatures
+from search import remove_analysis_facts
+
+# Name of the index of the archive directory: month -> [first id, last id]
+INDEX_NAME = 'index.json'
+
+
+def archive_month_path(archive_dir, month):
+    """Return the path of the archive of a month ('YYYY-MM')."""
+    return os.path.join(archive_dir, f'analyses-{month}.jsonl.gz')
+
+
+def _read_index(archive_dir):
+    try:
+        with open(os.path.join(archive_dir, INDEX_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_index(archive_dir, index):
+    path = os.path.join(archive_dir, INDEX_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+def retention_cutoff(days, now=None):
+    """
+    Return the start of the first day kept by a retention of days days.
+
+    Whole days are archived, so the daily rollups of a day describe either
+    kept or archived analyses, never a mix.
+    """
+    now = now or datetime.datetime.utcnow()
+    return datetime.datetime.combine(now.date() - datetime.timedelta(days=days), datetime.time())
+
+
+def write_archive_batch(archive_dir, analyses):
+    """
+    Append analyses (with their code) to the gzip archive of their month.
+
+    Each call adds one gzip member per month; gzip readers see the members
+    of a file as a single stream. The files are synced before returning, so
+    the rows can then be deleted from the database.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    by_month = {}
+    for analysis in analyses:
+        by_month.setdefault(analysis.created_at.strftime('%Y-%m'), []).append(analysis)
+
+    index = _read_index(archive_dir)
+    for month, month_analyses in sorted(by_month.items()):
+        with open(archive_month_path(archive_dir, month), 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                for analysis in month_analyses:
+                    line = json.dumps(analysis.to_dict(include_code=True), ensure_ascii=False) + '\n'
+                    f.write(line.encode('utf-8', 'surrogatepass'))
+            raw.flush()
+            os.fsync(raw.fileno())
+        ids = [analysis.id for analysis in month_analyses]
+        first, last = index.get(month, [min(ids), max(ids)])
+        index[month] = [min(first, *ids), max(last, *ids)]
+    _write_index(archive_dir, index)
+
+
+def archive_analyses(db, archive_dir, before, batch_size=500):
+    """
+    Move the analyses created before a date to the archive files.
+
+    Works in batches of batch_size rows, oldest first: each batch is
+    written to the archive, then deleted (together with the code blobs no
+    other analysis uses) and subtracted from the rollups in its own short
+    transaction. If the process stops between the two steps the batch is
+    archived again on the next run; lookups return the first copy.
+
+    Args:
+        db: The SQLAlchemy instance
+        archive_dir (str): Directory of the archive files
+        before (datetime.datetime): Analyses created before this are archived
+        batch_size (int): Rows archived per transaction
+
+    Returns:
+        int: Number of archived analyses
+    """
+    archived = 0
+    while True:
+        analyses = CodeAnalysis.query \
+            .options(undefer(CodeAnalysis._code_content), joinedload(CodeAnalysis.source)) \
+            .filter(CodeAnalysis.created_at < before) \
+            .order_by(CodeAnalysis.created_at, CodeAnalysis.id) \
+            .limit(batch_size).all()
+        if not analyses:
+            return archived
+
+        write_archive_batch(archive_dir, analyses)
+
+        ids = [analysis.id for analysis in analyses]
+        hashes = {analysis.source_hash for analysis in analyses if analysis.source_hash}
+        update_rollups(analyses, db, removed=True)
+        remove_signatures(ids, db)
+        remove_analysis_facts(ids, db)
+        db.session.execute(delete(CodeAnalysis).where(CodeAnalysis.id.in_(ids)))
+        if hashes:
+            db.session.execute(delete(SourceBlob).where(
+                SourceBlob.hash.in_(hashes),
+                ~exists().where(CodeAnalysis.source_hash == SourceBlob.hash)
+            ))
+        db.session.commit()
+        db.session.expunge_all()
+        archived += len(ids)
+
+
+def compact_database(db):
+    """
+    Return the space freed by archiving and refresh the planner statistics.
+
+    SQLite: VACUUM (rewrites the whole file, blocking writers meanwhile)
+    then ANALYZE. PostgreSQL: VACUUM ANALYZE of the archived tables.
+
+    Returns:
+        list: The statements run (empty for other databases)
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        statements = ['VACUUM', 'ANALYZE']
+    elif dialect == 'postgresql':
+        statements = ['VACUUM ANALYZE code_analysis', 'VACUUM ANALYZE source_blob']
+    else:
+        return []
+
+    # VACUUM cannot run inside a transaction
+    db.session.remove()
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    return statements
+
+
+def find_archived_analysis(archive_dir, analysis_id):
+    """
+    Look an analysis up in the archive files.
+
+    Only the months whose id range includes analysis_id are read.
+
+    Returns:
+        CodeAnalysis: A transient (not added to the session) analysis, or
+        None if it is not archived
+    """
+    for month, (first, last) in sorted(_read_index(archive_dir).items()):
+        if not first <= analysis_id <= last:
+            continue
+        path = archive_month_path(archive_dir, month)
+        if not os.path.exists(path):
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8', errors='surrogatepass') as f:
+            for line in f:
+                # Skip decoding the JSON of the other lines
+                if not line.startswith(f'{{"id": {analysis_id},'):
+                    continue
+                data = json.loads(line)
+                code = data.pop('code_content')
+                data['created_at'] = datetime.datetime.strptime(data['created_at'], '%Y-%m-%d %H:%M:%S')
+                analysis = CodeAnalysis(**data)
+                analysis.code_content = code
+                return analysis
+    return None
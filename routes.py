@@ -1,16 +1,34 @@
+import datetime
+import json
 import logging
-from flask import render_template, request, jsonify, redirect, url_for
+import os
+import shutil
+import tempfile
+from sqlalchemy.orm import undefer, joinedload
+from flask import render_template, request, jsonify, redirect, url_for, Response, stream_with_context, current_app, abort
 from models import CodeAnalysis
-from validator import validate_python_code, suggest_improvements
+from validator import analyze_code, check_syntax, chunk_cache, AnalysisLimits
+from cache import result_cache
+from metrics import timed, record_submission, ERRORS
+from persistence import save_analyses
+from stats import update_rollups, rollup_stats
+from queries import summary_query, keyset_page, apply_filters, LISTING_COLUMNS
+from similarity import similar_analyses, remove_signatures
+from search import SearchError, analysis_facts, apply_search, rank_search, remove_analysis_facts
+from rules import use_ruleset
 
 def init_routes(app, db):
     """Initialize all routes for the application."""
+    result_cache.configure(app.config.get("ANALYSIS_CACHE_SIZE", 1024))
+    chunk_cache.configure(app.config.get("ANALYSIS_CHUNK_CACHE_SIZE", 4096))
+    # Compiled once here; an invalid rule set stops the startup
+    use_ruleset(app.config.get("GRADING_RULESET", "imc"))
     
     @app.route("/")
     def index():
         """Render the main page."""
         # Recuperar a lista de análises anteriores para exibir na tabela
-        analyses = CodeAnalysis.query.order_by(CodeAnalysis.created_at.desc()).limit(50).all()
+        analyses = summary_query().order_by(CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc()).limit(50).all()
         return render_template("index.html", analyses=analyses)
     
     @app.route("/validate", methods=["POST"])
@@ -28,21 +46,18 @@ def init_routes(app, db):
             
             # Se tiver arquivos, processa cada um deles
             if files and files[0].filename:
-                results = []
-                for file in files:
-                    # Read the content of the file
-                    code = file.read().decode('utf-8')
-                    filename = file.filename
-                    
-                    # Process this file
-                    result = process_and_save_code(code, filename, python_version, db)
-                    results.append(result)
+                # Read the content of each file
+                submissions = [(file.filename, file.read().decode('utf-8')) for file in files]
+                
+                # Process all files, analyzing them in parallel when possible
+                results = process_and_save_files(submissions, python_version, db)
                 
                 # Return the results for all files
-                return jsonify({
-                    "multi_file": True,
-                    "results": results
-                })
+                with timed("serialize"):
+                    return jsonify({
+                        "multi_file": True,
+                        "results": results
+                    })
             else:
                 # Processar código direto do textarea
                 code = request.form.get("code", "")
@@ -52,9 +67,11 @@ def init_routes(app, db):
                 result = process_and_save_code(code, filename, python_version, db)
                 
                 # For backward compatibility, return a single result
-                return jsonify(result)
+                with timed("serialize"):
+                    return jsonify(result)
         
         except Exception as e:
+            ERRORS.inc(type=type(e).__name__)
             logging.error(f"Error during validation: {str(e)}")
             return jsonify({
                 "valid": False,
@@ -63,26 +80,260 @@ def init_routes(app, db):
                 "suggestions": []
             })
     
+    @app.route("/validate/quick", methods=["POST"])
+    def validate_quick():
+        """
+        Check only the syntax of the code, for as-you-type validation.
+        
+        Nothing is analyzed beyond the parse and nothing is saved or cached.
+        The code is read from the "code" form field or, to skip form
+        parsing, from a plain text request body.
+        """
+        if request.mimetype in ("application/x-www-form-urlencoded", "multipart/form-data"):
+            code = request.form.get("code", "")
+        else:
+            code = request.get_data(as_text=True)
+        
+        with timed("parse"):
+            result = check_syntax(code, app.config.get("VALIDATION_MAX_SOURCE_BYTES"))
+        response = jsonify(result)
+        response.headers["Cache-Control"] = "no-store"
+        return response
+    
+    @app.route("/validate/archive", methods=["POST"])
+    def validate_archive():
+        """
+        Validate every Python file of a .zip or .tar.gz archive.
+        
+        Results are streamed as NDJSON, one line per file as soon as it is
+        analyzed, followed by a summary line.
+        """
+        python_version = request.form.get("python_version", "3")
+        upload = request.files.get("file")
+        if upload is None or not upload.filename:
+            return jsonify({"error": "Nenhum arquivo compactado enviado."}), 400
+        
+        # Imported on demand: tarfile/zipfile are only needed for archives
+        from archive import ArchiveError, iter_archive_members
+        
+        limits = {
+            "max_members": app.config.get("ARCHIVE_MAX_MEMBERS", 1000),
+            "max_file_size": app.config.get("ARCHIVE_MAX_FILE_SIZE", 1024 * 1024),
+            "max_total_size": app.config.get("ARCHIVE_MAX_TOTAL_SIZE", 50 * 1024 * 1024),
+        }
+        
+        # The uploaded file is closed when the request ends, before the
+        # streamed response is consumed, so keep our own (compressed) copy
+        archive_file = tempfile.TemporaryFile()
+        shutil.copyfileobj(upload.stream, archive_file)
+        archive_file.seek(0)
+        archive_name = upload.filename
+        
+        def generate():
+            summary = {"files": 0, "valid": 0, "error": None}
+            try:
+                for member_name, data in iter_archive_members(archive_file, archive_name, **limits):
+                    summary["files"] += 1
+                    if data is None:
+                        result = member_error(member_name, f"O arquivo excede {limits['max_file_size']} bytes.")
+                    else:
+                        try:
+                            code = data.decode('utf-8')
+                        except UnicodeDecodeError:
+                            result = member_error(member_name, "O arquivo não está codificado em UTF-8.")
+                        else:
+                            result = process_and_save_code(code, member_name, python_version, db)
+                    
+                    if result["valid"]:
+                        summary["valid"] += 1
+                    yield json.dumps(result) + "\n"
+            except ArchiveError as e:
+                summary["error"] = str(e)
+            except Exception as e:
+                logging.error(f"Error during archive validation: {str(e)}")
+                summary["error"] = f"Internal server error: {str(e)}"
+            finally:
+                archive_file.close()
+            
+            yield json.dumps({"summary": summary}) + "\n"
+        
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+    
     @app.route("/analyses")
     def list_analyses():
-        """List all saved code analyses."""
-        analyses = CodeAnalysis.query.order_by(CodeAnalysis.created_at.desc()).all()
-        return render_template("analyses.html", analyses=analyses)
+        """List the saved code analyses, one page at a time."""
+        page = keyset_page(summary_query(), app.config.get("ANALYSES_PAGE_SIZE", 50),
+                           before=request.args.get("before"), after=request.args.get("after"))
+        return render_template("analyses.html", analyses=page["items"],
+                               next_cursor=page["next_cursor"], prev_cursor=page["prev_cursor"])
+    
+    @app.route("/api/analyses")
+    def api_list_analyses():
+        """
+        List analyses as JSON, newest first, with optional filters.
+        
+        Filters: skill_level, imc_level, is_valid, is_imc_calculator,
+        filename (prefix), since and until (ISO dates). Pages are requested
+        with the before/after cursors returned in the response.
+        """
+        page_size = min(request.args.get("limit", 50, type=int), 500)
+        try:
+            query = apply_filters(summary_query(LISTING_COLUMNS), request.args,
+                                  db.engine.dialect.name)
+        except ValueError as e:
+            return jsonify({"error": f"Filtro inválido: {str(e)}"}), 400
+        
+        page = keyset_page(query, max(page_size, 1),
+                           before=request.args.get("before"), after=request.args.get("after"))
+        return jsonify({
+            "items": [analysis.to_dict() for analysis in page["items"]],
+            "next_cursor": page["next_cursor"],
+            "prev_cursor": page["prev_cursor"]
+        })
+    
+    @app.route("/api/analyses/search")
+    def api_search_analyses():
+        """
+        Search analyses by their stored features and suggestions.
+        
+        Query parameters: q (e.g. "error_handling > 0 AND imc_level = 'Crítico'"),
+        sort (a feature, suggestions, skill_score or created_at, with a
+        leading '-' for descending order), limit, and the filters of
+        /api/analyses. Without sort, results are newest first and paged
+        with the before/after cursors; with sort, the first limit results
+        are returned.
+        """
+        page_size = max(min(request.args.get("limit", 50, type=int), 500), 1)
+        try:
+            query = apply_filters(summary_query(LISTING_COLUMNS), request.args,
+                                  db.engine.dialect.name)
+            query = apply_search(query, request.args.get("q", ""))
+            if request.args.get("sort"):
+                page = {"items": rank_search(query, request.args["sort"]).limit(page_size).all(),
+                        "next_cursor": None, "prev_cursor": None}
+            else:
+                page = keyset_page(query, page_size,
+                                   before=request.args.get("before"), after=request.args.get("after"))
+        except SearchError as e:
+            return jsonify({"error": f"Busca inválida: {str(e)}"}), 400
+        except ValueError as e:
+            return jsonify({"error": f"Filtro inválido: {str(e)}"}), 400
+        
+        facts = analysis_facts([analysis.id for analysis in page["items"]], db)
+        items = []
+        for analysis in page["items"]:
+            item = analysis.to_dict()
+            item["features"] = facts[analysis.id]["features"]
+            item["suggestion_categories"] = sorted(
+                {suggestion["category"] for suggestion in facts[analysis.id]["suggestions"]})
+            items.append(item)
+        return jsonify({
+            "items": items,
+            "next_cursor": page["next_cursor"],
+            "prev_cursor": page["prev_cursor"]
+        })
+    
+    @app.route("/analyses/export")
+    def export_analyses():
+        """
+        Stream every analysis matching the listing filters as CSV or JSONL.
+        
+        Query parameters: format (csv or jsonl), include_code, and the
+        filters of /api/analyses. Rows are read through a server-side cursor
+        and written as they arrive, so memory use does not grow with the
+        number of rows.
+        """
+        from export import EXPORT_FORMATS, export_statement, iter_export_records, iter_csv, iter_jsonl
+        
+        export_format = request.args.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": f"Formato inválido: {export_format} (use csv ou jsonl)"}), 400
+        include_code = request.args.get("include_code", "").lower() in ("1", "true", "yes", "sim")
+        try:
+            statement = export_statement(request.args, db.engine.dialect.name, include_code)
+        except ValueError as e:
+            return jsonify({"error": f"Filtro inválido: {str(e)}"}), 400
+        
+        records = iter_export_records(db.session, statement, include_code,
+                                      app.config.get("EXPORT_BATCH_SIZE", 500))
+        body = iter_csv(records, include_code) if export_format == "csv" else iter_jsonl(records)
+        filename = f"analises-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+        return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format], headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            # Não deixar proxies (nginx) acumularem a resposta inteira
+            "X-Accel-Buffering": "no",
+        })
     
     @app.route("/analysis/<int:analysis_id>")
     def view_analysis(analysis_id):
-        """View a specific code analysis."""
-        analysis = CodeAnalysis.query.get_or_404(analysis_id)
-        return render_template("view_analysis.html", analysis=analysis)
+        """View a specific code analysis, looking in the archive if it is no longer in the database."""
+        analysis = CodeAnalysis.query.options(undefer(CodeAnalysis._code_content), joinedload(CodeAnalysis.source)) \
+            .filter_by(id=analysis_id).first()
+        if analysis is not None:
+            similar = similar_analyses(analysis_id, db, app.config.get("SIMILARITY_THRESHOLD", 0.8),
+                                       app.config.get("SIMILARITY_MAX_RESULTS", 10))
+            return render_template("view_analysis.html", analysis=analysis, similar=similar,
+                                   facts=analysis_facts([analysis_id], db)[analysis_id])
+        
+        from retention import find_archived_analysis
+        analysis = find_archived_analysis(get_archive_dir(), analysis_id)
+        if analysis is None:
+            abort(404)
+        return render_template("view_analysis.html", analysis=analysis, archived=True)
 
+    @app.route("/api/analyses/<int:analysis_id>/similar")
+    def api_similar_analyses(analysis_id):
+        """
+        List the analyses whose code has the same structure as this one
+        (near-duplicates, e.g. copies with renamed variables).
+        
+        Query parameters: threshold (0 to 1, default SIMILARITY_THRESHOLD)
+        and limit.
+        """
+        if db.session.get(CodeAnalysis, analysis_id) is None:
+            return jsonify({"error": "Análise não encontrada"}), 404
+        try:
+            threshold = float(request.args.get("threshold", app.config.get("SIMILARITY_THRESHOLD", 0.8)))
+            limit = min(int(request.args.get("limit", app.config.get("SIMILARITY_MAX_RESULTS", 10))), 100)
+        except ValueError as e:
+            return jsonify({"error": f"Parâmetro inválido: {str(e)}"}), 400
+        return jsonify({
+            "analysis_id": analysis_id,
+            "threshold": threshold,
+            "similar": similar_analyses(analysis_id, db, threshold, limit),
+        })
+    
     @app.route("/analysis/<int:analysis_id>/delete", methods=["POST"])
     def delete_analysis(analysis_id):
         """Delete a specific code analysis."""
         analysis = CodeAnalysis.query.get_or_404(analysis_id)
+        update_rollups([analysis], db, removed=True)
+        remove_signatures([analysis.id], db)
+        remove_analysis_facts([analysis.id], db)
         db.session.delete(analysis)
         db.session.commit()
         return redirect(url_for("list_analyses"))
     
+    @app.route("/stats")
+    def stats():
+        """
+        Return the number of analyses per day by level, IMC level and
+        validity, read from the rollups (last 7 days by default).
+        """
+        try:
+            until = datetime.date.fromisoformat(request.args["until"]) \
+                if request.args.get("until") else datetime.datetime.utcnow().date()
+            since = datetime.date.fromisoformat(request.args["since"]) \
+                if request.args.get("since") else until - datetime.timedelta(days=6)
+        except ValueError as e:
+            return jsonify({"error": f"Data inválida: {str(e)}"}), 400
+        return jsonify(rollup_stats(since, until))
+    
+    @app.route("/cache/stats")
+    def cache_stats():
+        """Return the result cache counters of this worker."""
+        return jsonify(result_cache.stats())
+    
     @app.errorhandler(404)
     def page_not_found(e):
         """Handle 404 errors."""
@@ -93,53 +344,150 @@ def init_routes(app, db):
         """Handle 500 errors."""
         return render_template('index.html'), 500
 
-def process_and_save_code(code, filename, python_version, db):
-    """Process the code and save the results to the database."""
-    # Validate the code
-    validation_result = validate_python_code(code, python_version)
-    
-    # Get improvement suggestions if syntax is valid
-    suggestions = []
-    if validation_result["valid"]:
-        suggestions = suggest_improvements(code)
-    
-    # Prepare response data
-    response_data = {
-        "valid": validation_result["valid"],
-        "error_message": validation_result["error_message"],
-        "error_line": validation_result["error_line"],
+def get_analysis_pool():
+    """
+    Return the process pool of this worker, configured from the app.
+    
+    The pool module (multiprocessing, concurrent.futures) is only imported
+    by the first multi-file upload.
+    """
+    from analysis_pool import analysis_pool
+    analysis_pool.configure(current_app.config.get("VALIDATION_POOL_SIZE", 0),
+                            current_app.config.get("VALIDATION_TIMEOUT", 10),
+                            current_app.config.get("VALIDATION_MEMORY_LIMIT", 0))
+    return analysis_pool
+
+def persist_analyses(entries, db, cache_entries=None):
+    """
+    Save analyses and new result cache rows in one transaction, through the
+    group-commit writer of this process when GROUP_COMMIT is enabled, or
+    else in the request's own transaction.
+    """
+    if not current_app.config.get("GROUP_COMMIT"):
+        return save_analyses(entries, db, cache_entries=cache_entries)
+    from writer import group_writer
+    group_writer.configure(current_app._get_current_object(), db,
+                           current_app.config.get("GROUP_COMMIT_MAX_BATCH", 200),
+                           current_app.config.get("GROUP_COMMIT_MAX_DELAY", 0.0),
+                           current_app.config.get("GROUP_COMMIT_TIMEOUT", 30.0))
+    return group_writer.save(entries, cache_entries)
+
+def get_archive_dir():
+    """Return the directory of the archived analyses (ARCHIVE_DIR, relative to the instance folder)."""
+    return os.path.join(current_app.instance_path, current_app.config.get("ARCHIVE_DIR", "archive"))
+
+
+def get_analysis_limits():
+    """Return the size and complexity limits configured for the app."""
+    return AnalysisLimits(current_app.config.get("VALIDATION_MAX_SOURCE_BYTES"),
+                          current_app.config.get("VALIDATION_MAX_AST_NODES"),
+                          current_app.config.get("VALIDATION_MAX_AST_DEPTH"))
+
+def analysis_timeout_result():
+    """
+    Build the result of a file whose analysis timed out or crashed.
+    
+    It has no skill level, so it is reported to the user but not saved as
+    an analysis (see build_analysis): an infrastructure failure says nothing
+    about the code and must not count in the statistics or searches.
+    """
+    return {
+        "valid": False,
+        "error_message": "A análise deste arquivo excedeu o tempo limite ou falhou.",
+        "error_line": -1
+    }
+
+def member_error(filename, message):
+    """Build the result of a file that could not be analyzed."""
+    return {
+        "valid": False,
+        "error_message": message,
+        "error_line": -1,
         "filename": filename,
-        "suggestions": suggestions
+        "suggestions": []
     }
+
+def analyze_submission(code, python_version, db):
+    """
+    Analyze the code, reusing the cached result of identical submissions.
     
-    # Add skill level information - now available for both valid and invalid code
-    if "skill_level" in validation_result:
-        response_data["skill_level"] = validation_result["skill_level"]
-        
-        # Create a database record for this analysis
-        analysis = CodeAnalysis(
-            filename=filename,
-            code_content=code,
-            is_valid=validation_result["valid"],
-            error_message=validation_result["error_message"],
-            error_line=validation_result["error_line"],
-            skill_level=validation_result["skill_level"]["level"],
-            skill_score=validation_result["skill_level"]["score"]
-        )
-        
-        # Add IMC-specific information if available
-        if "imc_analysis" in validation_result["skill_level"]:
-            imc_analysis = validation_result["skill_level"]["imc_analysis"]
-            analysis.is_imc_calculator = imc_analysis["is_imc_calculator"]
-            analysis.imc_critical_criteria = imc_analysis["has_functional_calculation"]
-            analysis.imc_desirable_criteria = imc_analysis["has_classification"]
-            analysis.imc_level = imc_analysis["level"]
-        
-        # Save to database
-        db.session.add(analysis)
-        db.session.commit()
-        
-        # Add the database ID to the response
-        response_data["analysis_id"] = analysis.id
-        
-    return response_data
\ No newline at end of file
+    Returns:
+        tuple: (validation result, suggestions, cache rows); the cache rows
+        of a new result are written by the caller, in the transaction that
+        saves the analysis (see save_analyses)
+    """
+    limits = get_analysis_limits()
+    with timed("cache"):
+        cached = result_cache.get(code, python_version, db, limits)
+    if cached is not None:
+        validation_result, suggestions = cached
+        return validation_result, suggestions, {}
+    
+    # Validate the code and get improvement suggestions (only for valid
+    # syntax) from a single parse of the source; in isolated mode this runs
+    # in the process pool, under its time and memory limits
+    analysis_pool = get_analysis_pool() if current_app.config.get("VALIDATION_ISOLATED") else None
+    with timed("analyze"):
+        if analysis_pool is not None and analysis_pool.enabled:
+            result = analysis_pool.analyze_many([code], python_version, limits)[0]
+            if result is None:
+                # Timed out or failed: report it, but never cache or save it
+                ERRORS.inc(type="AnalysisTimeout")
+                return analysis_timeout_result(), [], {}
+            validation_result, suggestions = result
+        else:
+            validation_result, suggestions = analyze_code(code, python_version, limits)
+    with timed("cache"):
+        cache_entries = result_cache.prepare([(code, python_version, validation_result, suggestions)], limits)
+    return validation_result, suggestions, cache_entries
+
+def process_and_save_code(code, filename, python_version, db):
+    """Process the code and save the results to the database."""
+    validation_result, suggestions, cache_entries = analyze_submission(code, python_version, db)
+    record_submission(code, validation_result)
+    with timed("db"):
+        return persist_analyses([(code, filename, validation_result, suggestions)], db, cache_entries)[0]
+
+def process_and_save_files(submissions, python_version, db):
+    """
+    Process several files and save the results to the database.
+    
+    Files missing from the cache are analyzed in the process pool when it
+    is enabled. All analyses and the new result cache rows are saved in a
+    single transaction and results are returned in the same order as
+    submissions.
+    """
+    limits = get_analysis_limits()
+    with timed("cache"):
+        analyzed = [result_cache.get(code, python_version, db, limits) for _, code in submissions]
+    pending = [i for i, result in enumerate(analyzed) if result is None]
+    
+    isolated = current_app.config.get("VALIDATION_ISOLATED")
+    analysis_pool = get_analysis_pool() if pending and (isolated or len(pending) > 1) else None
+    with timed("analyze"):
+        if analysis_pool is not None and analysis_pool.enabled:
+            pool_results = analysis_pool.analyze_many(
+                [submissions[i][1] for i in pending], python_version, limits)
+        else:
+            pool_results = [analyze_code(submissions[i][1], python_version, limits) for i in pending]
+    
+    new_results = []
+    for i, result in zip(pending, pool_results):
+        code = submissions[i][1]
+        if result is None:
+            # Timed out or failed: report it, but never cache or save it
+            ERRORS.inc(type="AnalysisTimeout")
+            analyzed[i] = (analysis_timeout_result(), [])
+        else:
+            new_results.append((code, python_version, result[0], result[1]))
+            analyzed[i] = result
+    with timed("cache"):
+        cache_entries = result_cache.prepare(new_results, limits)
+    
+    for (_, code), (validation_result, _) in zip(submissions, analyzed):
+        record_submission(code, validation_result)
+    with timed("db"):
+        return persist_analyses([
+            (code, filename, validation_result, suggestions)
+            for (filename, code), (validation_result, suggestions) in zip(submissions, analyzed)
+        ], db, cache_entries)
@@ -0,0 +1,419 @@
+import ast
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+
+# IMC-related keywords
+IMC_KEYWORDS = [
+    'imc', 'índice de massa corporal', 'indice de massa corporal',
+    'massa corporal', 'body mass index', 'bmi',
+    'peso / (altura', 'peso/(altura', 'peso/(altura * altura)',
+    'peso / (altura * altura)', 'peso/altura**2', 'peso / altura**2',
+    'weight / (height', 'weight/(height'
+]
+
+# The IMC formula or variations
+IMC_FORMULA_PATTERNS = [
+    'peso / (altura', 'peso/(altura',
+    'peso / altura**2', 'peso/altura**2',
+    'peso / (altura * altura)', 'peso/(altura*altura)',
+    'weight / (height', 'weight/(height',
+    'imc = peso', 'bmi = weight'
+]
+
+# Classification-related keywords and patterns
+IMC_CLASSIFICATION_KEYWORDS = [
+    'abaixo do peso', 'peso normal', 'sobrepeso', 'obesidade',
+    'underweight', 'normal weight', 'overweight', 'obesity',
+    'if imc <', 'if imc >', 'elif imc', 'if bmi <', 'if bmi >'
+]
+
+# The IMC calculator assignment, the first rule set. A rule set has:
+#   features: AST node predicates, counted during the walk of the tree and
+#       weighted into the score of code that is not the assignment
+#   patterns: token patterns (lowercase substrings of the code) by category
+#   criteria: flags that hold when every listed pattern category is found
+#   assignment: the levels of code that meets the "criterion" flag, the
+#       first level whose criteria all hold being used
+#   empty, general_levels: the levels of other code, by size and by
+#       weighted feature score
+IMC_RULESET = {
+    "name": "imc",
+    "features": [
+        {"name": "functions", "nodes": ["FunctionDef"], "weight": 2},
+        {"name": "classes", "nodes": ["ClassDef"], "weight": 3},
+        {"name": "imports", "nodes": ["Import", "ImportFrom"], "weight": 1},
+        {"name": "comprehensions", "nodes": ["ListComp", "DictComp", "SetComp"], "weight": 3},
+        {"name": "error_handling", "nodes": ["Try"], "weight": 3},
+        {"name": "advanced_types", "nodes": ["Set", "GeneratorExp"], "weight": 2},
+        {"name": "docstrings", "nodes": ["FunctionDef", "ClassDef"], "where": "has_docstring", "weight": 2},
+        {"name": "decorators", "nodes": ["FunctionDef", "ClassDef"], "where": "has_decorators", "weight": 4},
+        {"name": "complex_structures", "nodes": ["Dict", "List"], "where": {"min_items": 6}, "weight": 2},
+        {"name": "advanced_features",
+         "nodes": ["AsyncFunctionDef", "Await", "AsyncFor", "AsyncWith", "YieldFrom"], "weight": 5},
+    ],
+    "patterns": {
+        "imc": IMC_KEYWORDS,
+        "formula": IMC_FORMULA_PATTERNS,
+        "classification": IMC_CLASSIFICATION_KEYWORDS,
+        # Float conversion of the inputs, output of the result and conditional statements
+        "float": ["float"],
+        "output": ["print", "return"],
+        "conditional": ["if "],
+        "colon": [":"],
+    },
+    "criteria": {
+        "is_imc_calculator": ["imc"],
+        "has_functional_calculation": ["float", "formula", "output"],
+        "has_classification": ["classification", "conditional", "colon"],
+    },
+    "assignment": {
+        "result_key": "imc_analysis",
+        "criterion": "is_imc_calculator",
+        "unmet_level": "Não Atende Critérios",
+        "levels": [
+            {"criteria": ["has_functional_calculation", "has_classification"],
+             "level": "Desejável", "score": 100, "assignment_level": "Desejável"},
+            {"criteria": ["has_functional_calculation"],
+             "level": "Crítico", "score": 50, "assignment_level": "Crítico"},
+            {"criteria": [], "level": "Com Erros", "score": 25},
+        ],
+    },
+    "empty": {
+        "level": "Vazio",
+        "score": 0,
+        # Any of these: at most max_lines lines and at most the given feature counts
+        "when": [
+            {"max_lines": 1},
+            {"max_lines": 3, "max_features": {"functions": 0}},
+        ],
+    },
+    "general_levels": [
+        {"min_score": 15, "level": "Avançado", "score": 75},
+        {"min_score": 8, "level": "Intermediário", "score": 50},
+        {"min_score": 0, "level": "Iniciante", "score": 25},
+    ],
+}
+
+# Rule sets available by name (GRADING_RULESET); any other value is the path of a JSON file
+BUILTIN_RULESETS = {
+    "imc": IMC_RULESET,
+}
+
+
+class RulesetError(ValueError):
+    """Raised when a rule set definition is invalid."""
+
+
+def has_docstring(node):
+    """Check if a function or class body starts with a string literal."""
+    return bool(node.body and isinstance(node.body[0], ast.Expr) and
+                isinstance(node.body[0].value, ast.Constant) and
+                isinstance(node.body[0].value.value, str))
+
+
+def _has_decorators(node):
+    return bool(node.decorator_list)
+
+
+def _min_items(count):
+    def test(node):
+        items = node.keys if isinstance(node, ast.Dict) else node.elts
+        return len(items) >= count
+    return test
+
+
+def _calls(names):
+    names = frozenset(names)
+
+    def test(node):
+        func = node.func
+        name = func.id if isinstance(func, ast.Name) else getattr(func, 'attr', None)
+        return name in names
+    return test
+
+
+def _named(names):
+    names = frozenset(names)
+    return lambda node: node.id in names
+
+
+# Predicates usable in "where": a name, or {name: argument} for the factories
+PREDICATES = {
+    "has_docstring": has_docstring,
+    "has_decorators": _has_decorators,
+}
+PREDICATE_FACTORIES = {
+    # Dict, List, Set or Tuple with at least this many items
+    "min_items": _min_items,
+    # Call of one of these functions or methods
+    "calls": _calls,
+    # Name node with one of these identifiers
+    "named": _named,
+}
+
+
+def _compile_predicate(where):
+    if where is None:
+        return None
+    if isinstance(where, str) and where in PREDICATES:
+        return PREDICATES[where]
+    if isinstance(where, dict) and len(where) == 1:
+        (name, argument), = where.items()
+        if name in PREDICATE_FACTORIES:
+            return PREDICATE_FACTORIES[name](argument)
+    raise RulesetError(f"predicado desconhecido: {where!r}")
+
+
+def _compile_patterns(patterns):
+    """
+    Compile every token pattern into a single regular expression.
+
+    The expression is a lookahead, so it matches at every position where a
+    pattern starts and overlapping patterns are all found. At a given
+    position only the longest pattern is reported, so each pattern also
+    carries the categories of the shorter patterns that are its prefixes.
+    """
+    categories = defaultdict(set)
+    for category, category_patterns in patterns.items():
+        for pattern in category_patterns:
+            categories[pattern.lower()].add(category)
+    if not categories:
+        return None, {}
+
+    ordered = sorted(categories, key=len, reverse=True)
+    merged = {}
+    for pattern in ordered:
+        merged[pattern] = frozenset().union(*(
+            categories[other] for other in ordered if pattern.startswith(other)
+        ))
+
+    regex = re.compile('(?=(' + '|'.join(re.escape(p) for p in ordered) + '))')
+    return regex, merged
+
+
+class Ruleset:
+    """
+    A rule set compiled for the analyzer.
+
+    Feature rules are grouped in a dispatch table keyed by AST node type,
+    so the walk of a tree checks every rule with one dict lookup per node;
+    token patterns are merged into one regular expression, so the code text
+    is scanned once for all of them.
+    """
+
+    def __init__(self, definition):
+        try:
+            self._compile(definition)
+        except (KeyError, TypeError, AttributeError) as e:
+            raise RulesetError(f"regra inválida: {e!r}")
+        canonical = json.dumps(definition, sort_keys=True, ensure_ascii=False)
+        self.definition = definition
+        self.fingerprint = hashlib.blake2b(canonical.encode('utf-8'), digest_size=4).hexdigest()
+
+    def _compile(self, definition):
+        self.name = definition["name"]
+
+        self.feature_names = tuple(rule["name"] for rule in definition.get("features", []))
+        self.weights = {rule["name"]: rule.get("weight", 0) for rule in definition.get("features", [])}
+        dispatch = defaultdict(list)
+        for rule in definition.get("features", []):
+            test = _compile_predicate(rule.get("where"))
+            for node_name in rule["nodes"]:
+                node_type = getattr(ast, node_name, None)
+                if not (isinstance(node_type, type) and issubclass(node_type, ast.AST)):
+                    raise RulesetError(f"tipo de nó desconhecido: {node_name}")
+                dispatch[node_type].append((rule["name"], test))
+        self.dispatch = {node_type: tuple(rules) for node_type, rules in dispatch.items()}
+
+        self.patterns = {category: list(patterns) for category, patterns in definition.get("patterns", {}).items()}
+        self.pattern_re, self.pattern_categories = _compile_patterns(self.patterns)
+
+        self.criteria = {name: frozenset(categories) for name, categories in definition.get("criteria", {}).items()}
+        for name, categories in self.criteria.items():
+            if not categories <= set(self.patterns):
+                raise RulesetError(f"critério {name} usa categorias sem padrões: {sorted(categories - set(self.patterns))}")
+
+        assignment = definition.get("assignment") or {}
+        self.result_key = assignment.get("result_key", "assignment_analysis")
+        self.criterion = assignment.get("criterion")
+        self.unmet_level = assignment.get("unmet_level", "Não Atende Critérios")
+        self.assignment_levels = [
+            (frozenset(level.get("criteria", [])), level["level"], level["score"],
+             level.get("assignment_level", self.unmet_level))
+            for level in assignment.get("levels", [])
+        ]
+        if self.criterion is not None and self.criterion not in self.criteria:
+            raise RulesetError(f"critério desconhecido: {self.criterion}")
+
+        empty = definition.get("empty") or {}
+        self.empty_level = (empty.get("level", "Vazio"), empty.get("score", 0))
+        self.empty_when = [(when.get("max_lines"), when.get("max_features", {})) for when in empty.get("when", [])]
+
+        self.general_levels = sorted(
+            ((level["min_score"], level["level"], level["score"]) for level in definition["general_levels"]),
+            reverse=True)
+        if not self.general_levels:
+            raise RulesetError("general_levels não pode ser vazio")
+
+    def categories(self, text):
+        """Return the categories of every token pattern found in the text."""
+        found = set()
+        if self.pattern_re is not None:
+            for match in self.pattern_re.finditer(text.lower()):
+                found |= self.pattern_categories[match.group(1)]
+        return found
+
+    def signals(self, found):
+        """Evaluate the criteria for the pattern categories found in the code."""
+        return {name: categories <= found for name, categories in self.criteria.items()}
+
+    def empty_analysis(self, signals=None):
+        """The assignment analysis of code that does not meet the assignment."""
+        analysis = dict.fromkeys(self.criteria, False)
+        if signals is not None and self.criterion is not None:
+            analysis[self.criterion] = signals[self.criterion]
+        analysis["level"] = self.unmet_level
+        return analysis
+
+    def grade(self, features, lines_of_code, signals):
+        """
+        Score valid code.
+
+        Returns:
+            tuple: (level, score, assignment analysis)
+        """
+        analysis = dict(signals)
+        analysis["level"] = self.unmet_level
+
+        if self.criterion is not None and signals[self.criterion]:
+            for criteria, level, score, assignment_level in self.assignment_levels:
+                if all(signals[name] for name in criteria):
+                    analysis["level"] = assignment_level
+                    return level, score, analysis
+
+        for max_lines, max_features in self.empty_when:
+            if (max_lines is None or lines_of_code <= max_lines) and \
+                    all(features.get(name, 0) <= limit for name, limit in max_features.items()):
+                return self.empty_level + (analysis,)
+
+        features_score = sum(features[name] * weight for name, weight in self.weights.items())
+        for min_score, level, score in self.general_levels:
+            if features_score >= min_score:
+                return level, score, analysis
+        _, level, score = self.general_levels[-1]
+        return level, score, analysis
+
+    def rule_costs(self, codes, repeat=3):
+        """
+        Measure how long each rule takes, on its own, over a set of programs.
+
+        Feature rules are timed over the nodes of every parsed program
+        (programs that do not parse are skipped), minus the time of the loop
+        over the nodes; token pattern categories are timed as a scan of the
+        text with only their own patterns.
+
+        Returns:
+            dict: "feature/<name>" or "pattern/<category>" -> microseconds
+            per program
+        """
+        nodes = []
+        for code in codes:
+            try:
+                nodes.extend(ast.walk(ast.parse(code)))
+            except (SyntaxError, ValueError, RecursionError, MemoryError):
+                continue
+        texts = [code.lower() for code in codes]
+
+        rules = defaultdict(list)
+        for node_type, node_rules in self.dispatch.items():
+            for name, test in node_rules:
+                rules[name].append((node_type, test))
+
+        def time_table(table):
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for node in nodes:
+                    tests = table.get(type(node))
+                    if tests is not None:
+                        for test in tests:
+                            if test is None or test(node):
+                                pass
+                best = min(best, time.perf_counter() - started)
+            return best
+
+        # The walk itself is paid once for all rules: report only what each rule adds
+        walk = time_table({})
+        costs = {}
+        for name in self.feature_names:
+            table = {}
+            for node_type, test in rules[name]:
+                table.setdefault(node_type, []).append(test)
+            costs[f"feature/{name}"] = max(0.0, time_table(table) - walk) / max(len(codes), 1) * 1e6
+
+        for category, patterns in self.patterns.items():
+            regex = re.compile('(?=(' + '|'.join(re.escape(p.lower()) for p in
+                                                 sorted(patterns, key=len, reverse=True)) + '))')
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                for text in texts:
+                    for match in regex.finditer(text):
+                        pass
+                best = min(best, time.perf_counter() - started)
+            costs[f"pattern/{category}"] = best / max(len(codes), 1) * 1e6
+        return costs
+
+
+def load_ruleset(spec):
+    """
+    Load and compile a rule set.
+
+    Args:
+        spec: The name of a built-in rule set, the path of a JSON file or a
+            rule set definition (dict)
+
+    Returns:
+        Ruleset: The compiled rule set
+
+    Raises:
+        RulesetError: If the rule set cannot be found or is invalid
+    """
+    if isinstance(spec, dict):
+        return Ruleset(spec)
+    if spec in BUILTIN_RULESETS:
+        return Ruleset(BUILTIN_RULESETS[spec])
+    try:
+        with open(spec, encoding='utf-8') as f:
+            definition = json.load(f)
+    except (OSError, ValueError) as e:
+        raise RulesetError(f"não foi possível ler o conjunto de regras {spec}: {e}")
+    return Ruleset(definition)
+
+
+_active_lock = threading.Lock()
+_active = Ruleset(IMC_RULESET)
+
+
+def get_ruleset():
+    """Return the rule set used by the analyzer in this process."""
+    return _active
+
+
+def use_ruleset(spec):
+    """
+    Compile a rule set and make the analyzer use it in this process.
+
+    Returns:
+        Ruleset: The compiled rule set
+    """
+    global _active
+    ruleset = spec if isinstance(spec, Ruleset) else load_ruleset(spec)
+    with _active_lock:
+        if ruleset.fingerprint != _active.fingerprint:
+            _active = ruleset
+        return _active
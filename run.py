@@ -6,6 +6,7 @@ Este script facilita a execução em ambientes locais.
 
 import os
 from main import app
+from database import init_db
 
 if __name__ == "__main__":
     # Definir host e porta padrão, com opção de sobrescrever por variáveis de ambiente
@@ -13,6 +14,9 @@ if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("DEBUG", "true").lower() == "true"
     
+    # Criar as tabelas que ainda não existem (em produção: flask --app main init-db)
+    init_db(app)
+    
     print(f"Iniciando aplicação no endereço http://{host}:{port}")
     print("Use Ctrl+C para encerrar o servidor")
     
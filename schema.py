@@ -0,0 +1,35 @@
+import logging
+
+from sqlalchemy import inspect
+
+
+def upgrade_schema(db):
+    """
+    Bring an existing database up to date with the models.
+
+    db.create_all() only creates missing tables. This also adds the
+    columns and indexes that were added to existing tables over time.
+    New columns must be nullable (or have a server default) so they can
+    be added to tables that already have rows.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}')
+                logging.info(f"Added column {table.name}.{column.name}")
+
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
@@ -0,0 +1,248 @@
+import re
+
+from sqlalchemy import and_, delete, func, insert, select
+
+from models import AnalysisFeature, AnalysisSuggestion, CodeAnalysis
+from rules import get_ruleset
+
+# Columns of CodeAnalysis usable in a search, with the type of their values
+COLUMN_FIELDS = {
+    "skill_level": str,
+    "imc_level": str,
+    "filename": str,
+    "skill_score": float,
+    "is_valid": bool,
+    "is_imc_calculator": bool,
+    "imc_critical_criteria": bool,
+    "imc_desirable_criteria": bool,
+}
+
+# Condition on the suggestion categories: suggestion = 'bare_except'
+SUGGESTION_FIELD = "suggestion"
+
+# Sort key counting the suggestions of each analysis
+SUGGESTION_COUNT = "suggestions"
+
+_OPERATORS = {
+    "=": lambda column, value: column == value,
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+}
+
+_TOKEN = re.compile(r"""\s*(?:
+    (?P<op>!=|==|>=|<=|=|>|<)
+  | '(?P<single>[^']*)'
+  | "(?P<double>[^"]*)"
+  | (?P<number>-?\d+(?:\.\d+)?)
+  | (?P<word>[^\W\d]\w*)
+)""", re.VERBOSE)
+
+_BOOLEANS = {"true": True, "sim": True, "false": False, "nao": False, "não": False}
+
+
+class SearchError(ValueError):
+    """Raised when a search expression is invalid."""
+
+
+def store_analysis_facts(entries, db):
+    """
+    Store the features and suggestions of analyses in the current transaction.
+
+    Args:
+        entries (list): (analysis id, validation result, suggestions) tuples
+        db: The SQLAlchemy instance
+    """
+    features = []
+    suggestions = []
+    for analysis_id, validation_result, analysis_suggestions in entries:
+        skill_level = validation_result.get("skill_level") or {}
+        features.extend({"analysis_id": analysis_id, "name": name, "value": value}
+                        for name, value in (skill_level.get("features") or {}).items())
+        suggestions.extend({
+            "analysis_id": analysis_id,
+            "line": suggestion.get("line"),
+            "type": suggestion.get("type", "info"),
+            "category": suggestion.get("category", suggestion.get("type", "info")),
+            "message": suggestion.get("message", ""),
+        } for suggestion in analysis_suggestions or ())
+
+    if features:
+        db.session.execute(insert(AnalysisFeature), features)
+    if suggestions:
+        db.session.execute(insert(AnalysisSuggestion), suggestions)
+
+
+def remove_analysis_facts(analysis_ids, db):
+    """Remove the features and suggestions of analyses, in the current transaction."""
+    if not analysis_ids:
+        return
+    db.session.execute(delete(AnalysisFeature).where(AnalysisFeature.analysis_id.in_(analysis_ids)))
+    db.session.execute(delete(AnalysisSuggestion).where(AnalysisSuggestion.analysis_id.in_(analysis_ids)))
+
+
+def analysis_facts(analysis_ids, db):
+    """
+    Load the stored features and suggestions of analyses.
+
+    Returns:
+        dict: analysis id -> {"features": {...}, "suggestions": [...]}
+    """
+    facts = {analysis_id: {"features": {}, "suggestions": []} for analysis_id in analysis_ids}
+    if not facts:
+        return facts
+    for row in db.session.execute(
+            select(AnalysisFeature).where(AnalysisFeature.analysis_id.in_(facts))).scalars():
+        facts[row.analysis_id]["features"][row.name] = row.value
+    for row in db.session.execute(
+            select(AnalysisSuggestion).where(AnalysisSuggestion.analysis_id.in_(facts))
+            .order_by(AnalysisSuggestion.id)).scalars():
+        facts[row.analysis_id]["suggestions"].append(row.to_dict())
+    return facts
+
+
+def _tokens(expression):
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise SearchError(f"expressão inválida perto de '{expression[position:position + 20]}'")
+        position = match.end()
+        kind = match.lastgroup
+        if kind in ("single", "double"):
+            yield "string", match.group(kind)
+        else:
+            yield kind, match.group(kind)
+
+
+def parse_search(expression):
+    """
+    Parse a search expression into (field, operator, value) conditions.
+
+    The expression is a list of conditions joined by AND, e.g.
+    "error_handling > 0 AND imc_level = 'Crítico'". Values are numbers,
+    quoted strings or true/false.
+
+    Returns:
+        list: The conditions, in order
+
+    Raises:
+        SearchError: If the expression is invalid
+    """
+    tokens = list(_tokens(expression or ""))
+    conditions = []
+    position = 0
+    while position < len(tokens):
+        if conditions:
+            kind, text = tokens[position]
+            if kind != "word" or text.upper() != "AND":
+                raise SearchError(f"esperado AND, encontrado '{text}'")
+            position += 1
+        condition = tokens[position:position + 3]
+        if len(condition) < 3 or condition[0][0] != "word" or condition[1][0] != "op" \
+                or condition[2][0] not in ("string", "number", "word"):
+            raise SearchError("condição incompleta (use campo operador valor)")
+        (_, field), (_, operator), (kind, value) = condition
+        if kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "word":
+            if value.lower() not in _BOOLEANS:
+                raise SearchError(f"valor inválido: {value} (textos vão entre aspas)")
+            value = _BOOLEANS[value.lower()]
+        conditions.append((field, operator, value))
+        position += 3
+    return conditions
+
+
+def _column_condition(field, operator, value):
+    expected = COLUMN_FIELDS[field]
+    if expected is bool and not isinstance(value, bool):
+        raise SearchError(f"{field} aceita apenas true ou false")
+    if expected is float and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise SearchError(f"{field} aceita apenas números")
+    if expected is str and not isinstance(value, str):
+        raise SearchError(f"{field} aceita apenas textos entre aspas")
+    if expected is bool and operator not in ("=", "==", "!="):
+        raise SearchError(f"{field} aceita apenas = e !=")
+    return _OPERATORS[operator](getattr(CodeAnalysis, field), value)
+
+
+def _feature_condition(field, operator, value):
+    if isinstance(value, (bool, str)):
+        raise SearchError(f"{field} aceita apenas números")
+    matching = select(AnalysisFeature.analysis_id).where(
+        AnalysisFeature.name == field, _OPERATORS[operator](AnalysisFeature.value, value))
+    return CodeAnalysis.id.in_(matching)
+
+
+def _suggestion_condition(operator, value):
+    if not isinstance(value, str) or operator not in ("=", "==", "!="):
+        raise SearchError(f"{SUGGESTION_FIELD} aceita apenas = ou != e uma categoria entre aspas")
+    matching = select(AnalysisSuggestion.analysis_id).where(AnalysisSuggestion.category == value)
+    return CodeAnalysis.id.notin_(matching) if operator == "!=" else CodeAnalysis.id.in_(matching)
+
+
+def apply_search(query, expression, ruleset=None):
+    """
+    Filter a CodeAnalysis query with a search expression (see parse_search).
+
+    Fields are the columns in COLUMN_FIELDS, the features of the rule set
+    (counts, e.g. error_handling > 0) and suggestion (a suggestion
+    category, e.g. suggestion = 'bare_except'). Feature and suggestion
+    conditions are answered from the side tables through their indexes,
+    without reading the code. Analyses without stored features (invalid
+    code) match no feature condition.
+
+    Raises:
+        SearchError: If the expression is invalid
+    """
+    ruleset = ruleset or get_ruleset()
+    for field, operator, value in parse_search(expression):
+        if field in COLUMN_FIELDS:
+            condition = _column_condition(field, operator, value)
+        elif field in ruleset.feature_names:
+            condition = _feature_condition(field, operator, value)
+        elif field == SUGGESTION_FIELD:
+            condition = _suggestion_condition(operator, value)
+        else:
+            raise SearchError(f"campo desconhecido: {field}")
+        query = query.filter(condition)
+    return query
+
+
+def rank_search(query, sort, ruleset=None):
+    """
+    Order a search by a feature, the suggestion count or a column.
+
+    A feature key joins the feature row of each analysis (its primary key
+    is analysis_id, name), so the order comes from the joined value instead
+    of a subquery per row; analyses without the feature rank as 0.
+
+    Args:
+        query: The CodeAnalysis query
+        sort (str): The sort key, with a leading '-' for descending order,
+            e.g. "-error_handling"
+
+    Raises:
+        SearchError: If the sort key is unknown
+    """
+    ruleset = ruleset or get_ruleset()
+    descending = sort.startswith("-")
+    field = sort.lstrip("-")
+    if field in ruleset.feature_names:
+        query = query.outerjoin(AnalysisFeature, and_(
+            AnalysisFeature.analysis_id == CodeAnalysis.id, AnalysisFeature.name == field))
+        key = func.coalesce(AnalysisFeature.value, 0)
+    elif field == SUGGESTION_COUNT:
+        key = select(func.count(AnalysisSuggestion.id)).where(
+            AnalysisSuggestion.analysis_id == CodeAnalysis.id).scalar_subquery()
+    elif field in COLUMN_FIELDS or field == "created_at":
+        key = getattr(CodeAnalysis, field)
+    else:
+        raise SearchError(f"ordenação desconhecida: {field}")
+    return query.order_by(key.desc() if descending else key.asc(),
+                          CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc())
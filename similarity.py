@@ -0,0 +1,151 @@
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import joinedload, undefer
+
+import minhash
+from models import CodeAnalysis, SimilarityBand, SimilaritySignature
+
+# Candidates read per lookup, those sharing the most bands first; bounds
+# the cost of a lookup even when a bucket holds many analyses
+MAX_CANDIDATES = 200
+
+
+def index_signatures(entries, db):
+    """
+    Store the signatures and LSH buckets of analyses in the current transaction.
+
+    Programs with fewer than minhash.MIN_SHINGLES shingles are not indexed:
+    short programs look alike whether or not they were copied.
+
+    Args:
+        entries (list): (analysis id, "similarity" of its validation
+            result, or None) pairs
+        db: The SQLAlchemy instance
+
+    Returns:
+        int: Number of analyses indexed
+    """
+    signatures = []
+    bands = []
+    for analysis_id, similarity in entries:
+        if not similarity or similarity["shingles"] < minhash.MIN_SHINGLES:
+            continue
+        data = bytes.fromhex(similarity["signature"])
+        signatures.append({"analysis_id": analysis_id, "signature": data, "shingles": similarity["shingles"]})
+        bands.extend({"bucket": bucket, "analysis_id": analysis_id}
+                     for bucket in minhash.band_keys(minhash.decode(data)))
+
+    if signatures:
+        db.session.execute(insert(SimilaritySignature), signatures)
+        db.session.execute(insert(SimilarityBand), bands)
+    return len(signatures)
+
+
+def remove_signatures(analysis_ids, db):
+    """Remove analyses from the similarity index, in the current transaction."""
+    if not analysis_ids:
+        return
+    db.session.execute(delete(SimilarityBand).where(SimilarityBand.analysis_id.in_(analysis_ids)))
+    db.session.execute(delete(SimilaritySignature).where(SimilaritySignature.analysis_id.in_(analysis_ids)))
+
+
+def similar_to(signature, db, threshold, limit=10, exclude=None):
+    """
+    Find the indexed analyses whose structure is similar to a signature.
+
+    Only the analyses sharing an LSH bucket with the signature are read,
+    through the bucket index, so the cost depends on the number of
+    candidates, not on the number of analyses.
+
+    Args:
+        signature (list): A densified MinHash signature
+        db: The SQLAlchemy instance
+        threshold (float): Minimum estimated similarity (0 to 1)
+        limit (int): Maximum number of results
+        exclude (int): An analysis id left out (the analysis itself)
+
+    Returns:
+        list: (analysis id, estimated similarity) pairs, most similar first
+    """
+    shared = func.count(SimilarityBand.id)
+    query = select(SimilarityBand.analysis_id) \
+        .where(SimilarityBand.bucket.in_(minhash.band_keys(signature)))
+    if exclude is not None:
+        query = query.where(SimilarityBand.analysis_id != exclude)
+    query = query.group_by(SimilarityBand.analysis_id) \
+        .order_by(shared.desc(), SimilarityBand.analysis_id.desc()).limit(MAX_CANDIDATES)
+    candidates = db.session.execute(query).scalars().all()
+    if not candidates:
+        return []
+
+    rows = db.session.execute(
+        select(SimilaritySignature.analysis_id, SimilaritySignature.signature)
+        .where(SimilaritySignature.analysis_id.in_(candidates)))
+    scored = []
+    for analysis_id, data in rows:
+        similarity = minhash.estimate_similarity(signature, minhash.decode(data))
+        if similarity >= threshold:
+            scored.append((analysis_id, similarity))
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
+
+
+def similar_analyses(analysis_id, db, threshold, limit=10):
+    """
+    List the analyses similar to a stored one, for display.
+
+    Returns:
+        list: Dicts with analysis_id, filename, created_at and similarity,
+        most similar first (empty if the analysis is not indexed)
+    """
+    row = db.session.get(SimilaritySignature, analysis_id)
+    if row is None:
+        return []
+    scored = similar_to(minhash.decode(row.signature), db, threshold, limit, exclude=analysis_id)
+    if not scored:
+        return []
+
+    analyses = {
+        analysis.id: analysis for analysis in db.session.execute(
+            select(CodeAnalysis.id, CodeAnalysis.filename, CodeAnalysis.created_at)
+            .where(CodeAnalysis.id.in_([analysis_id for analysis_id, _ in scored])))
+    }
+    return [
+        {
+            "analysis_id": similar_id,
+            "filename": analyses[similar_id].filename,
+            "created_at": analyses[similar_id].created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            "similarity": round(similarity, 3),
+        }
+        for similar_id, similarity in scored if similar_id in analyses
+    ]
+
+
+def index_missing_signatures(db, batch_size=500):
+    """
+    Compute and index the signatures of analyses saved without one (e.g.
+    before the similarity index existed), batch_size analyses at a time.
+
+    Returns:
+        int: Number of analyses indexed
+    """
+    indexed = 0
+    last_id = 0
+    while True:
+        indexed_ids = select(SimilaritySignature.analysis_id)
+        analyses = CodeAnalysis.query \
+            .options(undefer(CodeAnalysis._code_content), joinedload(CodeAnalysis.source)) \
+            .filter(CodeAnalysis.id > last_id, CodeAnalysis.id.notin_(indexed_ids)) \
+            .order_by(CodeAnalysis.id).limit(batch_size).all()
+        if not analyses:
+            return indexed
+
+        entries = []
+        for analysis in analyses:
+            computed = minhash.code_signature(analysis.code_content)
+            if computed is not None:
+                data, shingles = computed
+                entries.append((analysis.id, {"signature": data.hex(), "shingles": shingles}))
+        last_id = analyses[-1].id
+        indexed += index_signatures(entries, db)
+        db.session.commit()
+        db.session.expunge_all()
@@ -37,6 +37,79 @@ hello_world()
 `);
 }
 
+// Delay (ms) after the last keystroke before checking the syntax
+const QUICK_CHECK_DELAY = 400;
+let quickCheckTimer = null;
+let quickCheckController = null;
+let quickErrorLine = null;
+
+// Schedule a syntax check, restarting the delay on every change
+function scheduleQuickCheck() {
+    clearTimeout(quickCheckTimer);
+    quickCheckTimer = setTimeout(quickCheck, QUICK_CHECK_DELAY);
+}
+
+// Check only the syntax of the editor content, cancelling any check still in flight
+async function quickCheck() {
+    if (quickCheckController) {
+        quickCheckController.abort();
+    }
+    const controller = new AbortController();
+    quickCheckController = controller;
+    
+    try {
+        const response = await fetch("/validate/quick", {
+            method: "POST",
+            headers: { "Content-Type": "text/plain; charset=utf-8" },
+            body: codeEditor.getValue(),
+            signal: controller.signal
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! Status: ${response.status}`);
+        }
+        
+        displayQuickCheck(await response.json());
+    } catch (error) {
+        if (error.name !== "AbortError") {
+            console.error("Error checking syntax:", error);
+            displayQuickCheck(null);
+        }
+    } finally {
+        if (quickCheckController === controller) {
+            quickCheckController = null;
+        }
+    }
+}
+
+// Show the result of the syntax check below the editor and highlight the error line
+function displayQuickCheck(data) {
+    const quickStatus = document.getElementById("quickStatus");
+    
+    if (quickErrorLine !== null) {
+        codeEditor.removeLineClass(quickErrorLine, "background", "quick-error-line");
+        quickErrorLine = null;
+    }
+    
+    if (!data || (!data.valid && data.error_line === -1 && !codeEditor.getValue().trim())) {
+        quickStatus.className = "form-text";
+        quickStatus.textContent = "";
+    } else if (data.valid) {
+        quickStatus.className = "form-text text-success";
+        quickStatus.innerHTML = '<i class="fas fa-check me-1"></i>Sintaxe válida';
+    } else {
+        quickStatus.className = "form-text text-danger";
+        if (data.error_line > 0) {
+            const column = data.error_column > 0 ? `, coluna ${data.error_column}` : "";
+            quickStatus.textContent = `Linha ${data.error_line}${column}: ${data.error_message}`;
+            const line = Math.min(data.error_line, codeEditor.lineCount()) - 1;
+            quickErrorLine = codeEditor.addLineClass(line, "background", "quick-error-line");
+        } else {
+            quickStatus.textContent = data.error_message;
+        }
+    }
+}
+
 // Function to validate the Python code
 async function validateCode() {
     // Show a loading indicator
@@ -474,6 +547,9 @@ document.addEventListener("DOMContentLoaded", function() {
     // Initialize CodeMirror
     initCodeEditor();
     
+    // Check the syntax as the user types
+    codeEditor.on("change", scheduleQuickCheck);
+    
     // Set up the validate button
     const validateBtn = document.getElementById("validateBtn");
     if (validateBtn) {
@@ -0,0 +1,175 @@
+import datetime
+from collections import defaultdict
+
+from sqlalchemy import func
+
+from models import AnalysisRollup, CodeAnalysis
+
+ROLLUP_KEY = ('day', 'skill_level', 'imc_level', 'is_valid')
+
+
+def _rollup_key(analysis):
+    created_at = analysis.created_at or datetime.datetime.utcnow()
+    return (created_at.date(), analysis.skill_level or '', analysis.imc_level or '',
+            bool(analysis.is_valid))
+
+
+def _rollup_deltas(analyses, sign):
+    deltas = defaultdict(lambda: [0, 0.0])
+    for analysis in analyses:
+        delta = deltas[_rollup_key(analysis)]
+        delta[0] += sign
+        delta[1] += sign * (analysis.skill_score or 0)
+    return deltas
+
+
+def update_rollups(analyses, db, removed=False):
+    """
+    Add (or, with removed, subtract) analyses to the daily rollups.
+
+    Runs in the caller's transaction, so the rollups are committed together
+    with the inserts or deletes they describe. The analyses must have been
+    flushed (their created_at is set at flush time).
+    """
+    deltas = _rollup_deltas(analyses, -1 if removed else 1)
+    if not deltas:
+        return
+
+    rows = [
+        dict(zip(ROLLUP_KEY, key), count=count, score_sum=score_sum)
+        for key, (count, score_sum) in deltas.items()
+    ]
+
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(AnalysisRollup)
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(ROLLUP_KEY),
+                set_={
+                    "count": AnalysisRollup.count + statement.excluded.count,
+                    "score_sum": AnalysisRollup.score_sum + statement.excluded.score_sum,
+                }
+            ),
+            rows
+        )
+        return
+
+    for row in rows:
+        rollup = AnalysisRollup.query.filter_by(**{name: row[name] for name in ROLLUP_KEY}) \
+            .with_for_update().first()
+        if rollup is None:
+            db.session.add(AnalysisRollup(**row))
+        else:
+            rollup.count += row["count"]
+            rollup.score_sum += row["score_sum"]
+    db.session.flush()
+
+
+def rollup_stats(since, until):
+    """
+    Read the rollups of a date range.
+
+    Args:
+        since (datetime.date): First day, inclusive
+        until (datetime.date): Last day, inclusive
+
+    Returns:
+        dict: One entry per day with its counters, plus the totals of the
+        whole range
+    """
+    rows = AnalysisRollup.query.filter(
+        AnalysisRollup.day >= since, AnalysisRollup.day <= until, AnalysisRollup.count != 0
+    ).order_by(AnalysisRollup.day).all()
+
+    def empty():
+        return {"count": 0, "score_sum": 0.0, "valid": 0,
+                "by_skill_level": defaultdict(int), "by_imc_level": defaultdict(int)}
+
+    days = defaultdict(empty)
+    totals = empty()
+    for row in rows:
+        for bucket in (days[row.day.isoformat()], totals):
+            bucket["count"] += row.count
+            bucket["score_sum"] += row.score_sum
+            bucket["valid"] += row.count if row.is_valid else 0
+            bucket["by_skill_level"][row.skill_level or None] += row.count
+            bucket["by_imc_level"][row.imc_level or None] += row.count
+
+    def finish(bucket):
+        score_sum = bucket.pop("score_sum")
+        bucket["avg_score"] = round(score_sum / bucket["count"], 2) if bucket["count"] else None
+        bucket["by_skill_level"] = dict(bucket["by_skill_level"])
+        bucket["by_imc_level"] = dict(bucket["by_imc_level"])
+        return bucket
+
+    return {
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "days": {day: finish(bucket) for day, bucket in days.items()},
+        "totals": finish(totals)
+    }
+
+
+def compute_rollups(db):
+    """
+    Recompute the rollups from CodeAnalysis.
+
+    Returns:
+        dict: rollup key -> (count, score_sum)
+    """
+    day = func.date(CodeAnalysis.created_at)
+    query = db.session.query(
+        day, CodeAnalysis.skill_level, CodeAnalysis.imc_level, CodeAnalysis.is_valid,
+        func.count(CodeAnalysis.id), func.coalesce(func.sum(CodeAnalysis.skill_score), 0)
+    ).filter(CodeAnalysis.created_at.isnot(None)) \
+        .group_by(day, CodeAnalysis.skill_level, CodeAnalysis.imc_level, CodeAnalysis.is_valid)
+
+    rollups = defaultdict(lambda: [0, 0.0])
+    for row_day, skill_level, imc_level, is_valid, count, score_sum in query:
+        if isinstance(row_day, str):
+            row_day = datetime.date.fromisoformat(row_day)
+        key = (row_day, skill_level or '', imc_level or '', bool(is_valid))
+        rollups[key][0] += count
+        rollups[key][1] += float(score_sum)
+    return {key: tuple(value) for key, value in rollups.items()}
+
+
+def rebuild_rollups(db, check_only=False):
+    """
+    Compare the stored rollups with a full recomputation and fix them.
+
+    Args:
+        db: The SQLAlchemy instance
+        check_only (bool): Only report the drift, without changing anything
+
+    Returns:
+        list: (rollup key, stored (count, score_sum), expected) for every
+        key that drifted
+    """
+    expected = compute_rollups(db)
+    stored = {
+        (row.day, row.skill_level, row.imc_level, row.is_valid): (row.count, row.score_sum)
+        for row in AnalysisRollup.query.all()
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        have = stored.get(key, (0, 0.0))
+        want = expected.get(key, (0, 0.0))
+        if have[0] != want[0] or abs(have[1] - want[1]) > 1e-6:
+            drift.append((key, have, want))
+
+    if not check_only:
+        AnalysisRollup.query.delete()
+        db.session.add_all([
+            AnalysisRollup(**dict(zip(ROLLUP_KEY, key)), count=count, score_sum=score_sum)
+            for key, (count, score_sum) in expected.items()
+        ])
+        db.session.commit()
+
+    return drift
@@ -0,0 +1,148 @@
+import hashlib
+import zlib
+
+from sqlalchemy import func
+from sqlalchemy.orm import undefer
+
+from models import CodeAnalysis, SourceBlob
+
+COMPRESSION_LEVEL = 6
+
+
+def source_hash(code):
+    """Return the SHA-256 of the code, used as the key of its SourceBlob."""
+    return hashlib.sha256(code.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _insert_ignore_existing(db, rows):
+    """Insert SourceBlob rows, skipping hashes that already exist."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        existing = {
+            key for (key,) in db.session.query(SourceBlob.hash)
+            .filter(SourceBlob.hash.in_([row["hash"] for row in rows]))
+        }
+        db.session.add_all([SourceBlob(**row) for row in rows if row["hash"] not in existing])
+        db.session.flush()
+        return
+
+    # ON CONFLICT DO NOTHING keeps a concurrent insert of the same code by
+    # another worker from failing this transaction
+    db.session.execute(insert(SourceBlob).values(rows).on_conflict_do_nothing(index_elements=['hash']))
+
+
+def store_sources(codes, db):
+    """
+    Store each distinct code once, compressed, in the current transaction.
+
+    Args:
+        codes (list): The source code strings
+        db: The SQLAlchemy instance
+
+    Returns:
+        dict: code -> hash of its SourceBlob
+    """
+    hashes = {}
+    for code in codes:
+        if code not in hashes:
+            hashes[code] = source_hash(code)
+
+    existing = set()
+    for start in range(0, len(hashes), 500):
+        chunk = list(hashes.values())[start:start + 500]
+        existing.update(key for (key,) in db.session.query(SourceBlob.hash).filter(SourceBlob.hash.in_(chunk)))
+
+    rows = []
+    for code, key in hashes.items():
+        if key in existing:
+            continue
+        raw = code.encode('utf-8', 'surrogatepass')
+        rows.append({
+            "hash": key,
+            "data": zlib.compress(raw, COMPRESSION_LEVEL),
+            "size": len(raw)
+        })
+        existing.add(key)
+
+    if rows:
+        _insert_ignore_existing(db, rows)
+
+    return hashes
+
+
+def attach_sources(analyses, codes, db):
+    """
+    Move the code of new analyses into SourceBlob rows.
+
+    Args:
+        analyses (list): CodeAnalysis records
+        codes (list): The code of each record, in the same order
+        db: The SQLAlchemy instance
+    """
+    hashes = store_sources(codes, db)
+    for analysis, code in zip(analyses, codes):
+        analysis.source_hash = hashes[code]
+        analysis._code_content = ''
+
+
+def migrate_sources(db, batch_size=500):
+    """
+    Move the code stored inline in old CodeAnalysis rows into SourceBlob.
+
+    Rows are migrated in batches ordered by id, one transaction per batch,
+    so the migration can be interrupted and run again.
+
+    Returns:
+        int: Number of migrated rows
+    """
+    migrated = 0
+    last_id = 0
+    while True:
+        rows = CodeAnalysis.query.options(undefer(CodeAnalysis._code_content)) \
+            .filter(CodeAnalysis.id > last_id, CodeAnalysis.source_hash.is_(None)) \
+            .order_by(CodeAnalysis.id).limit(batch_size).all()
+        if not rows:
+            return migrated
+
+        attach_sources(rows, [row._code_content or '' for row in rows], db)
+        last_id = rows[-1].id
+        migrated += len(rows)
+        db.session.commit()
+
+
+def storage_report(db):
+    """
+    Measure the space used by submitted code.
+
+    Returns:
+        dict: Logical size of all submissions, bytes actually stored
+        (compressed blobs plus code still inline) and the savings
+    """
+    session = db.session
+    analyses = session.query(func.count(CodeAnalysis.id)).scalar() or 0
+    inline_rows, inline_bytes = session.query(
+        func.count(CodeAnalysis.id), func.coalesce(func.sum(func.length(CodeAnalysis._code_content)), 0)
+    ).filter(CodeAnalysis.source_hash.is_(None)).one()
+    referenced_bytes = session.query(func.coalesce(func.sum(SourceBlob.size), 0)) \
+        .select_from(CodeAnalysis).join(SourceBlob, CodeAnalysis.source_hash == SourceBlob.hash).scalar()
+    blobs, blob_bytes, stored_bytes = session.query(
+        func.count(SourceBlob.hash), func.coalesce(func.sum(SourceBlob.size), 0),
+        func.coalesce(func.sum(func.length(SourceBlob.data)), 0)
+    ).one()
+
+    logical = int(referenced_bytes) + int(inline_bytes)
+    stored = int(stored_bytes) + int(inline_bytes)
+    return {
+        "analyses": analyses,
+        "inline_analyses": inline_rows,
+        "blobs": blobs,
+        "logical_bytes": logical,
+        "unique_bytes": int(blob_bytes) + int(inline_bytes),
+        "stored_bytes": stored,
+        "saved_bytes": logical - stored,
+        "ratio": (stored / logical) if logical else 1.0
+    }
@@ -0,0 +1,21 @@
+import pytest
+
+from database import db, init_db
+from main import create_app
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a temporary SQLite database, analyzing in this process."""
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'test.db'}",
+        "TESTING": True,
+        "LOG_LEVEL": "WARNING",
+        "VALIDATION_ISOLATED": False,
+        "GROUP_COMMIT": False,
+    })
+    init_db(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
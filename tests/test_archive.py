@@ -0,0 +1,73 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from archive import ArchiveError, iter_archive_members
+
+# Tar headers (512 bytes each) count in the decompressed size
+LIMITS = {"max_members": 3, "max_file_size": 100, "max_total_size": 10000}
+
+
+def _zip(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    data.seek(0)
+    return data
+
+
+def _tar(files):
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    data.seek(0)
+    return data
+
+
+@pytest.fixture(params=[("a.zip", _zip), ("a.tar.gz", _tar)], ids=["zip", "tar"])
+def archive(request):
+    return request.param
+
+
+def test_python_files_are_returned(archive):
+    filename, build = archive
+    files = {"a.py": b"x = 1\n", "notes.txt": b"skip", "pkg/b.py": b"y = 2\n"}
+    members = list(iter_archive_members(build(files), filename, **LIMITS))
+    assert members == [("a.py", b"x = 1\n"), ("pkg/b.py", b"y = 2\n")]
+
+
+def test_oversize_file_is_returned_without_content(archive):
+    filename, build = archive
+    members = list(iter_archive_members(build({"big.py": b"#" * 101, "ok.py": b"#" * 100}), filename, **LIMITS))
+    assert members == [("big.py", None), ("ok.py", b"#" * 100)]
+
+
+def test_too_many_members(archive):
+    filename, build = archive
+    files = {f"f{i}.txt": b"" for i in range(4)}
+    with pytest.raises(ArchiveError, match="mais de 3 arquivos"):
+        list(iter_archive_members(build(files), filename, **LIMITS))
+
+
+def test_total_size_of_python_files():
+    limits = dict(LIMITS, max_total_size=150)
+    with pytest.raises(ArchiveError, match="excede 150 bytes"):
+        list(iter_archive_members(_zip({"a.py": b"#" * 100, "b.py": b"#" * 100}), "a.zip", **limits))
+
+
+def test_tar_total_size_counts_skipped_members():
+    # A tar stream decompresses the members it skips, so they count too
+    files = {"a.py": b"x = 1\n", "data.bin": b"\0" * 20000, "b.py": b"y = 2\n"}
+    with pytest.raises(ArchiveError, match="excede 10000 bytes"):
+        list(iter_archive_members(_tar(files), "a.tar.gz", **LIMITS))
+
+
+def test_unsupported_format():
+    with pytest.raises(ArchiveError):
+        iter_archive_members(io.BytesIO(b""), "a.rar", **LIMITS)
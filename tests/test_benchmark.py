@@ -0,0 +1,38 @@
+from benchmark import compare
+
+
+def _report(**metrics):
+    return {"results": {"validate/typical": metrics}}
+
+
+def test_latency_within_threshold_passes():
+    assert compare(_report(p50_ms=10.0), _report(p50_ms=12.0), threshold=0.2) == []
+
+
+def test_latency_over_threshold_fails():
+    regressions = compare(_report(p50_ms=10.0), _report(p50_ms=12.1), threshold=0.2)
+    assert [(r["benchmark"], r["metric"]) for r in regressions] == [("validate/typical", "p50_ms")]
+    assert regressions[0]["change"] == 0.21
+
+
+def test_small_latency_changes_are_noise():
+    assert compare(_report(p99_ms=0.01), _report(p99_ms=0.05), min_delta_ms=0.05) == []
+    assert compare(_report(p99_ms=0.01), _report(p99_ms=0.07), min_delta_ms=0.05) != []
+
+
+def test_throughput_regresses_when_it_drops():
+    assert compare(_report(throughput=100.0), _report(throughput=200.0)) == []
+    assert compare(_report(throughput=100.0), _report(throughput=80.0), threshold=0.2) == []
+    assert compare(_report(throughput=100.0), _report(throughput=79.0), threshold=0.2) != []
+
+
+def test_memory_uses_its_own_threshold():
+    baseline, current = _report(peak_memory_kb=100.0), _report(peak_memory_kb=130.0)
+    assert compare(baseline, current, threshold=0.5, memory_threshold=0.2) != []
+    assert compare(baseline, current, threshold=0.1, memory_threshold=0.5) == []
+
+
+def test_new_and_missing_benchmarks_are_ignored():
+    baseline = {"results": {"old/typical": {"p50_ms": 1.0}}}
+    current = {"results": {"new/typical": {"p50_ms": 100.0}}}
+    assert compare(baseline, current) == []
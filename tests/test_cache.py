@@ -0,0 +1,41 @@
+import cache
+from cache import ResultCache, cache_key
+from database import db
+from validator import AnalysisLimits
+
+LIMITS = AnalysisLimits(1000, 500, 50)
+
+
+def test_key_changes_with_every_input():
+    key = cache_key("x = 1\n", "3", LIMITS)
+    assert cache_key("x = 1\n", "3", LIMITS) == key
+    assert cache_key("x = 2\n", "3", LIMITS) != key
+    assert cache_key("x = 1\n", "2", LIMITS) != key
+    assert cache_key("x = 1\n", "3", AnalysisLimits(1000, 500, 60)) != key
+    assert cache_key("x = 1\n", "3") != key
+
+
+def test_key_changes_with_the_analyzer_version(monkeypatch):
+    key = cache_key("x = 1\n", "3", LIMITS)
+    monkeypatch.setattr(cache, "analyzer_version", lambda: "0+other.rules")
+    assert cache_key("x = 1\n", "3", LIMITS) != key
+
+
+def test_results_are_not_shared_across_limits(app):
+    results = ResultCache()
+    results.put("x = 1\n", "3", {"valid": True}, [], db, LIMITS)
+    assert results.get("x = 1\n", "3", db, LIMITS) == ({"valid": True}, [])
+    assert results.get("x = 1\n", "3", db, AnalysisLimits(1000, 500, 60)) is None
+
+    # The database tier answers once the in-process tier is gone
+    results.clear()
+    assert results.get("x = 1\n", "3", db, LIMITS) == ({"valid": True}, [])
+
+
+def test_prune_drops_other_versions(app, monkeypatch):
+    results = ResultCache()
+    results.put("x = 1\n", "3", {"valid": True}, [], db, LIMITS)
+    monkeypatch.setattr(cache, "analyzer_version", lambda: "0+other.rules")
+    assert results.prune(db) == 1
+    results.clear()
+    assert results.get("x = 1\n", "3", db, LIMITS) is None
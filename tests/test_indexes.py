@@ -0,0 +1,17 @@
+import pytest
+
+from database import db
+from queries import PLANNED_FILTERS, explain_planned_queries
+
+
+@pytest.mark.parametrize("name", list(PLANNED_FILTERS))
+def test_planned_queries_use_an_index(app, name):
+    plan, uses_index = explain_planned_queries(db.session)[name]
+    assert uses_index, f"{name} does a full scan of code_analysis:\n" + "\n".join(plan)
+
+
+def test_a_missing_index_is_detected(app):
+    db.session.execute(db.text("DROP INDEX ix_code_analysis_skill_level_created_at"))
+    db.session.commit()
+    _, uses_index = explain_planned_queries(db.session)["skill_level"]
+    assert not uses_index
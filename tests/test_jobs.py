@@ -0,0 +1,58 @@
+import json
+
+import jobs
+from database import db
+from models import JobItem
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def _fail(job_id, position):
+    item = JobItem.query.filter_by(job_id=job_id, position=position).one()
+    item.status = 'failed'
+    item.error = "falhou"
+    db.session.commit()
+
+
+def test_events_only_reload_items_after_the_sent_ones(app, monkeypatch):
+    app.config.update(JOB_EVENTS_POLL_INTERVAL=0, JOB_EVENTS_MAX_DURATION=60)
+    job = jobs.enqueue_job([(f"{n}.py", "x = 1\n", None) for n in range(4)], "3", db)
+    job_id = job.id
+    _fail(job_id, 0)
+    _fail(job_id, 2)
+
+    afters = []
+    job_status = jobs.job_status
+
+    def polled(job, db, after=-1):
+        afters.append(after)
+        status = job_status(job, db, after)
+        # The remaining items finish between polls, out of order
+        if len(afters) <= 2:
+            _fail(job_id, len(afters) * 2 - 1)
+        return status
+
+    monkeypatch.setattr(jobs, "job_status", polled)
+    events = _events(app.test_client().get(f"/jobs/{job_id}/events").get_data(as_text=True))
+
+    assert afters == [-1, 0, 2]
+    assert [data["position"] for name, data in events if name == "result"] == [0, 2, 1, 3]
+    assert events[-1][0] == "done"
+
+
+def test_events_reconnect_after_the_contiguous_sent_items(app):
+    app.config.update(JOB_EVENTS_POLL_INTERVAL=0, JOB_EVENTS_MAX_DURATION=0)
+    job = jobs.enqueue_job([(f"{n}.py", "x = 1\n", None) for n in range(3)], "3", db)
+    _fail(job.id, 0)
+    _fail(job.id, 2)
+
+    events = _events(app.test_client().get(f"/jobs/{job.id}/events").get_data(as_text=True))
+
+    assert [data["position"] for name, data in events if name == "result"] == [0, 2]
+    assert events[-1] == ("reconnect", {"after": 0})
@@ -0,0 +1,50 @@
+import datetime
+
+from database import db
+from models import CodeAnalysis
+from queries import keyset_page, summary_query
+
+
+def _add_analyses(count):
+    start = datetime.datetime(2024, 1, 1)
+    # Pairs of analyses share a timestamp: the id breaks the tie
+    db.session.add_all([
+        CodeAnalysis(filename=f"f{i}.py", code_content="", is_valid=True,
+                     created_at=start + datetime.timedelta(minutes=i // 2))
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [analysis.id for analysis in
+            CodeAnalysis.query.order_by(CodeAnalysis.created_at.desc(), CodeAnalysis.id.desc())]
+
+
+def _ids(page):
+    return [analysis.id for analysis in page["items"]]
+
+
+def test_pages_forward_and_back(app):
+    newest_first = _add_analyses(7)
+
+    first = keyset_page(summary_query(), 3)
+    assert _ids(first) == newest_first[:3]
+    assert first["prev_cursor"] is None
+
+    second = keyset_page(summary_query(), 3, before=first["next_cursor"])
+    assert _ids(second) == newest_first[3:6]
+
+    last = keyset_page(summary_query(), 3, before=second["next_cursor"])
+    assert _ids(last) == newest_first[6:]
+    assert last["next_cursor"] is None
+
+    back = keyset_page(summary_query(), 3, after=last["prev_cursor"])
+    assert _ids(back) == newest_first[3:6]
+
+    top = keyset_page(summary_query(), 3, after=back["prev_cursor"])
+    assert _ids(top) == newest_first[:3]
+    assert top["prev_cursor"] is None
+    assert top["next_cursor"] is not None
+
+
+def test_invalid_cursor_starts_from_the_newest(app):
+    newest_first = _add_analyses(2)
+    assert _ids(keyset_page(summary_query(), 5, before="not-a-cursor")) == newest_first
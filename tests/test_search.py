@@ -0,0 +1,32 @@
+import datetime
+
+from database import db
+from models import CodeAnalysis
+from queries import summary_query
+from search import apply_search, rank_search, store_analysis_facts
+
+
+def _add_analysis(minute, features):
+    analysis = CodeAnalysis(filename=f"f{minute}.py", code_content="", is_valid=True,
+                            created_at=datetime.datetime(2024, 1, 1, 0, minute))
+    db.session.add(analysis)
+    db.session.flush()
+    store_analysis_facts([(analysis.id, {"skill_level": {"features": features}}, [])], db)
+    return analysis.id
+
+
+def test_rank_by_feature(app):
+    two = _add_analysis(0, {"functions": 2, "decorators": 5})
+    none = _add_analysis(1, {})
+    one = _add_analysis(2, {"functions": 1})
+    other_one = _add_analysis(3, {"functions": 1})
+    db.session.commit()
+
+    def ranked(sort, expression=""):
+        query = apply_search(summary_query(), expression)
+        return [analysis.id for analysis in rank_search(query, sort).all()]
+
+    # Missing features rank as 0; ties are newest first
+    assert ranked("-functions") == [two, other_one, one, none]
+    assert ranked("functions") == [none, other_one, one, two]
+    assert ranked("-functions", "functions > 0") == [two, other_one, one]
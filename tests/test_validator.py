@@ -0,0 +1,62 @@
+import ast
+
+import pytest
+
+import minhash
+import validator
+from benchmark import CATEGORIES, generate_corpus
+
+CORPUS = generate_corpus(seed=0, size=3)
+
+
+@pytest.mark.parametrize("code", [code for category in CATEGORIES for code in CORPUS[category]])
+def test_chunked_analysis_matches_whole_module(code):
+    validator.chunk_cache.configure(0)
+    whole = validator.analyze_code(code)
+    validator.chunk_cache.configure(4096)
+    try:
+        first = validator.analyze_code(code)
+        edited = f"{code}\n# edição\n"
+        validator.analyze_code(edited)
+        validator.chunk_cache.configure(0)
+        edited_whole = validator.analyze_code(edited)
+        validator.chunk_cache.configure(4096)
+        # The second time the chunks come from the cache
+        edited_chunked = validator.analyze_code(edited)
+    finally:
+        validator.chunk_cache.configure(4096)
+
+    assert first == whole
+    assert edited_chunked == edited_whole
+
+
+def test_long_files_are_analyzed_in_chunks():
+    code = CORPUS["huge"][0]
+    validator.chunk_cache.configure(4096)
+    validator.CodeAnalyzer(code)
+    analyzer = validator.CodeAnalyzer(code)
+    assert analyzer.chunk_stats["chunks"] > 1
+    assert analyzer.chunk_stats["reused"] == analyzer.chunk_stats["chunks"]
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+@pytest.mark.parametrize("code", [CORPUS["typical"][0], CORPUS["huge"][0]])
+def test_analysis_signature_matches_code_signature(code, incremental):
+    validator.chunk_cache.configure(4096)
+    similarity = validator.CodeAnalyzer(code, incremental=incremental).similarity()
+    data, shingles = minhash.code_signature(code)
+    assert similarity == {"signature": data.hex(), "shingles": shingles}
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_node_limit_applies_to_the_whole_module(incremental):
+    code = CORPUS["huge"][0]
+    # Empty the cache, so the chunks are parsed and checked afresh
+    validator.chunk_cache.configure(0)
+    validator.chunk_cache.configure(4096)
+    total = sum(1 for _ in ast.walk(ast.parse(code)))
+    limits = validator.AnalysisLimits(0, total - 1, 0)
+    analyzer = validator.CodeAnalyzer(code, limits=limits, incremental=incremental)
+    assert isinstance(analyzer.parse_error, validator.SubmissionTooComplex)
+    assert validator.CodeAnalyzer(code, limits=validator.AnalysisLimits(0, total, 0),
+                                  incremental=incremental).is_valid
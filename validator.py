@@ -1,95 +1,725 @@
 import ast
+import hashlib
 import io
 import sys
+import threading
 import tokenize
 import re
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, namedtuple
+from operator import itemgetter
 
-def validate_python_code(code, python_version="3"):
+import minhash
+from metrics import timed, record_chunk_stats
+from rules import (IMC_KEYWORDS, IMC_FORMULA_PATTERNS, IMC_CLASSIFICATION_KEYWORDS,  # noqa: F401
+                   get_ruleset, has_docstring)
+
+# Bump whenever a change to the analysis can change its output, so that
+# results cached by older versions are no longer used
+ANALYZER_VERSION = "5"
+
+def analyzer_version():
     """
-    Validate Python code syntax.
-    
+    Identify the results of the analyzer: ANALYZER_VERSION plus the name and
+    fingerprint of the active rule set, since changing the rules changes the
+    results too.
+    """
+    ruleset = get_ruleset()
+    return f"{ANALYZER_VERSION}+{ruleset.name}.{ruleset.fingerprint}"
+
+# Limits of the guarded mode; None (or 0) disables a limit
+AnalysisLimits = namedtuple("AnalysisLimits", ["max_source_bytes", "max_nodes", "max_depth"])
+
+class SubmissionTooComplex(Exception):
+    """Raised when a submission exceeds the limits of the guarded mode."""
+
+def _check_tree_limits(tree, max_nodes, max_depth, counted=0):
+    """
+    Count the nodes and measure the depth of the AST without recursion,
+    stopping as soon as a limit is exceeded.
+
     Args:
-        code (str): The Python code to validate
-        python_version (str): The Python version to validate against (2 or 3)
-        
+        counted (int): Nodes already counted elsewhere (the chunks before
+            this one), which use up part of max_nodes
+    """
+    stack = [(tree, 1)]
+    count = counted
+    while stack:
+        node, depth = stack.pop()
+        count += 1
+        if max_nodes and count > max_nodes:
+            raise SubmissionTooComplex(f"mais de {max_nodes} nós na árvore sintática")
+        if max_depth and depth > max_depth:
+            raise SubmissionTooComplex(f"aninhamento com mais de {max_depth} níveis")
+        depth += 1
+        stack.extend((child, depth) for child in ast.iter_child_nodes(node))
+
+# Facts collected by one walk of a tree (a whole module or one chunk of
+# it). Suggestions are (depth, line, message, type, category) tuples;
+# minhash is the (bins, shingle count) of the tree's node types.
+_TreeFacts = namedtuple("_TreeFacts", [
+    "features", "function_suggestions", "except_suggestions",
+    "imported_names", "used_names", "nodes", "depth", "minhash",
+])
+
+# Everything cached for one chunk: its tree facts and the token pattern
+# categories found in its text
+_ChunkFacts = namedtuple("_ChunkFacts", ["tree", "pattern_categories"])
+
+# Files shorter than this are always analyzed as a whole
+INCREMENTAL_MIN_LINES = 50
+
+def _walk_tree(tree, ruleset):
+    """
+    Walk the AST once, collecting features and suggestion data.
+
+    Every feature rule of the rule set is checked during this walk, through
+    its dispatch table: one lookup by node type finds the rules to check.
+
+    Nodes are visited level by level, in the same order as ast.walk; the
+    depth of each suggestion is kept so that the facts of consecutive chunks
+    can be merged in the order of a walk of the whole module.
+
+    Below the root, the nodes of each level are grouped by the top-level
+    statement they belong to, so the same walk also lists the node types of
+    every statement, level by level, for its MinHash shingles.
+
     Returns:
-        dict: A dictionary containing validation results
+        _TreeFacts: What the walk found
     """
-    result = {
-        "valid": False,
-        "error_message": "",
-        "error_line": -1,
-    }
-    
-    # Check if code is empty or whitespace only
-    if not code or code.strip() == "":
-        result["error_message"] = "O código está vazio."
-        result["skill_level"] = {
-            "level": "Vazio",
+    features = dict.fromkeys(ruleset.feature_names, 0)
+    dispatch = ruleset.dispatch
+    function_suggestions = []
+    except_suggestions = []
+    imported_names = set()
+    used_names = set()
+    node_token = minhash.node_token
+
+    # (node type tokens of a statement, its nodes at the current level)
+    statements = [([], [child]) for child in ast.iter_child_nodes(tree)]
+    groups = [(None, [tree])]
+    depth = nodes = 0
+    while groups:
+        depth += 1
+        next_groups = []
+        for tokens, level in groups:
+            children = []
+            for node in level:
+                children.extend(ast.iter_child_nodes(node))
+                node_type = type(node)
+                if tokens is not None:
+                    token = node_token(node_type)
+                    if token is not None:
+                        tokens.append(token)
+
+                # Feature rules of the rule set
+                rules = dispatch.get(node_type)
+                if rules is not None:
+                    for feature, test in rules:
+                        if test is None or test(node):
+                            features[feature] += 1
+
+                if node_type is ast.FunctionDef:
+                    if not has_docstring(node):
+                        function_suggestions.append((
+                            depth, node.lineno,
+                            f"Function '{node.name}' is missing a docstring.",
+                            "documentation", "missing_docstring"
+                        ))
+
+                    # Check for mutable default arguments
+                    for default in [d for d in node.args.defaults if d]:
+                        if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                            function_suggestions.append((
+                                depth, node.lineno,
+                                f"Function '{node.name}' uses a mutable default argument, which can lead to unexpected behavior.",
+                                "warning", "mutable_default"
+                            ))
+
+                # Remember the imported names
+                elif node_type is ast.Import:
+                    for name in node.names:
+                        imported_names.add(name.name)
+
+                elif node_type is ast.ImportFrom:
+                    for name in node.names:
+                        imported_names.add(name.asname or name.name)
+
+                # Names used anywhere in the code (for unused imports)
+                elif node_type is ast.Name:
+                    used_names.add(node.id)
+
+                # Check for bare except clauses
+                elif node_type is ast.ExceptHandler:
+                    if node.type is None:
+                        except_suggestions.append((
+                            depth, node.lineno,
+                            "Bare except clause found. It's better to specify which exceptions to catch.",
+                            "warning", "bare_except"
+                        ))
+
+            nodes += len(level)
+            if tokens is not None and children:
+                next_groups.append((tokens, children))
+        groups = next_groups if depth > 1 else statements
+
+    bins, shingles = minhash.raw_bins([tokens for tokens, _ in statements])
+    return _TreeFacts(features, tuple(function_suggestions), tuple(except_suggestions),
+                      frozenset(imported_names), frozenset(used_names), nodes, depth,
+                      (tuple(bins), shingles))
+
+
+class ChunkCache:
+    """
+    Process-local LRU of the facts of analyzed chunks, keyed by the hash of
+    their text. A False entry marks a chunk that does not parse on its own.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize):
+        """Change the number of cached chunks; 0 disables incremental analysis."""
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses}
+
+
+# Chunks analyzed by this process, shared by all submissions
+chunk_cache = ChunkCache()
+
+# Lines starting with these words continue the statement above them
+_CONTINUATION_RE = re.compile(r'(?:else|elif|except|finally)\b')
+_TRIPLE_QUOTE_RE = re.compile(r'"""|\'\'\'')
+
+def split_statements(code):
+    """
+    Split the code into chunks of top-level statements.
+
+    A chunk starts at every line that begins at column 0 with something
+    other than a comment, a closing bracket or a keyword that continues the
+    previous statement (else, elif, except, finally); decorators stay with
+    the definition below them, and lines inside triple-quoted strings or
+    after a backslash continuation never start a chunk. This is a
+    heuristic: a chunk split in the middle of a statement does not parse on
+    its own, and the analyzer then parses the whole module instead.
+
+    Args:
+        code (str): The Python code to split
+
+    Returns:
+        list: (line offset, text) of each chunk, in order
+    """
+    # A lone carriage return is a line break for Python but not here
+    if '\r' in code.replace('\r\n', ''):
+        return [(0, code)]
+
+    lines = code.split('\n')
+    chunks = []
+    start = 0
+    decorated = continued = False
+    in_string = None
+    for i, line in enumerate(lines):
+        first = line[:1]
+        if (i > start and in_string is None and not continued and not decorated
+                and first and first not in ' \t\r\f#)]}' and not _CONTINUATION_RE.match(line)):
+            chunks.append((start, '\n'.join(lines[start:i]) + '\n'))
+            start = i
+        if first and first not in ' \t\r\f#' and in_string is None and not continued:
+            decorated = first == '@'
+
+        if '"""' in line or "'''" in line:
+            for match in _TRIPLE_QUOTE_RE.finditer(line):
+                if in_string is None:
+                    in_string = match.group()
+                elif match.group() == in_string:
+                    in_string = None
+        continued = line.rstrip('\r').endswith('\\')
+
+    chunks.append((start, '\n'.join(lines[start:])))
+    return chunks
+
+def _chunk_key(text, code_only, ruleset):
+    digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16)
+    if code_only:
+        digest.update(b'\0code_only')
+    # Facts depend on the rules they were collected with
+    digest.update(b'\0' + ruleset.fingerprint.encode('ascii'))
+    return digest.digest()
+
+def _check_counts(nodes, depth, limits):
+    """Raise SubmissionTooComplex if the counts exceed the limits."""
+    if limits.max_nodes and nodes > limits.max_nodes:
+        raise SubmissionTooComplex(f"mais de {limits.max_nodes} nós na árvore sintática")
+    if limits.max_depth and depth > limits.max_depth:
+        raise SubmissionTooComplex(f"aninhamento com mais de {limits.max_depth} níveis")
+
+class CodeAnalyzer:
+    """
+    Single-pass analyzer for a Python submission.
+
+    The source is parsed once and the AST is walked once; that walk fills
+    the feature counters used by the skill level and the AST-based
+    suggestions (docstrings, mutable defaults, bare excepts, unused imports).
+    The IMC keyword detectors also run only once per submission; with
+    code_only they ignore keywords inside comments and strings.
+
+    Features, detectors and scoring come from a rule set (rules.Ruleset,
+    the active one of the process by default).
+
+    With limits (an AnalysisLimits), the source size is checked before
+    parsing and the node count and depth of the tree before the walk; a
+    submission over a limit is reported as too large or complex instead of
+    being analyzed.
+
+    Longer files are analyzed incrementally: the module is split into
+    chunks of top-level statements and only chunks missing from chunk_cache
+    are parsed and walked, so resubmitting an edited file re-analyzes only
+    what changed. The merged output is the same as a whole-module analysis;
+    chunk_stats reports how many chunks were reused. In that mode tree is
+    None, since the module is never parsed as a whole.
+    """
+
+    def __init__(self, code, code_only=False, limits=None, incremental=None, ruleset=None):
+        self.code = code
+        self.code_only = code_only
+        self.ruleset = ruleset or get_ruleset()
+        self.lines = code.split('\n')
+        self.tree = None
+        self.parse_error = None
+        self.features = dict.fromkeys(self.ruleset.feature_names, 0)
+        self.chunk_stats = None
+
+        self._function_suggestions = []
+        self._except_suggestions = []
+        self._imported_names = set()
+        self._used_names = set()
+        self._imc_signals = None
+        self._minhash = None
+
+        if incremental is None:
+            incremental = chunk_cache.enabled and len(self.lines) >= INCREMENTAL_MIN_LINES
+
+        try:
+            if limits is not None and limits.max_source_bytes and \
+                    len(code.encode('utf-8', 'surrogatepass')) > limits.max_source_bytes:
+                raise SubmissionTooComplex(f"mais de {limits.max_source_bytes} bytes")
+            chunks = self._analyze_chunks(limits) if incremental else None
+            if chunks is None:
+                chunks = [(0, self._analyze_module(limits))]
+        except Exception as e:
+            self.parse_error = e
+            return
+
+        self._merge(chunks)
+
+    @property
+    def is_valid(self):
+        return self.parse_error is None
+
+    def _analyze_module(self, limits):
+        """Parse and walk the whole module."""
+        with timed("parse"):
+            try:
+                tree = ast.parse(self.code)
+            except (RecursionError, MemoryError):
+                raise SubmissionTooComplex("o analisador sintático excedeu seus limites")
+        if limits is not None and (limits.max_nodes or limits.max_depth):
+            _check_tree_limits(tree, limits.max_nodes, limits.max_depth)
+        self.tree = tree
+
+        with timed("walk"):
+            facts = _walk_tree(tree, self.ruleset)
+        self._minhash = facts.minhash
+        return facts
+
+    def _analyze_chunks(self, limits):
+        """
+        Analyze the module chunk by chunk, reusing cached chunks.
+
+        Returns:
+            list: (line offset, _TreeFacts) of each chunk, or None when a
+            chunk does not parse on its own and the whole module must be
+            parsed instead
+        """
+        chunks = split_statements(self.code)
+        keys = [_chunk_key(text, self.code_only, self.ruleset) for _, text in chunks]
+        cached = [chunk_cache.get(key) for key in keys]
+        self.chunk_stats = {"chunks": len(chunks), "reused": 0}
+        if False in cached:
+            return None
+
+        reused = 0
+        nodes = 1
+        depth = 0
+        found = set()
+        merged = []
+        minhash_parts = []
+        for (offset, text), key, facts in zip(chunks, keys, cached):
+            if facts is None:
+                with timed("parse"):
+                    try:
+                        tree = ast.parse(text)
+                    except (SyntaxError, ValueError):
+                        chunk_cache.put(key, False)
+                        return None
+                    except (RecursionError, MemoryError):
+                        raise SubmissionTooComplex("o analisador sintático excedeu seus limites")
+                if limits is not None and (limits.max_nodes or limits.max_depth):
+                    # Check before walking, with what the previous chunks
+                    # left of the node budget (the chunk's own Module node
+                    # is not part of the whole tree)
+                    _check_tree_limits(tree, limits.max_nodes, limits.max_depth, counted=nodes - 1)
+                with timed("walk"):
+                    tree_facts = _walk_tree(tree, self.ruleset)
+                with timed("imc"):
+                    scanned = _mask_non_code(text) if self.code_only else text
+                    facts = _ChunkFacts(tree_facts, frozenset(self.ruleset.categories(scanned)))
+                chunk_cache.put(key, facts)
+            else:
+                reused += 1
+
+            # The chunk's own Module node is not part of the whole tree
+            nodes += facts.tree.nodes - 1
+            depth = max(depth, facts.tree.depth)
+            if limits is not None:
+                # Cached chunks were not checked against this request's budget
+                _check_counts(nodes, depth, limits)
+
+            found |= facts.pattern_categories
+            minhash_parts.append(facts.tree.minhash)
+            merged.append((offset, facts.tree))
+
+        self.chunk_stats["reused"] = reused
+        self._imc_signals = self.ruleset.signals(found)
+        self._minhash = minhash.merge_bins(minhash_parts)
+        return merged
+
+    def _merge(self, chunks):
+        """Combine the facts of each chunk into the analyzer's state."""
+        features = self.features
+        function_suggestions = []
+        except_suggestions = []
+        for offset, facts in chunks:
+            for name, count in facts.features.items():
+                features[name] += count
+            function_suggestions.extend(
+                (depth, line + offset, message, kind, category)
+                for depth, line, message, kind, category in facts.function_suggestions)
+            except_suggestions.extend(
+                (depth, line + offset, message, kind, category)
+                for depth, line, message, kind, category in facts.except_suggestions)
+            self._imported_names |= facts.imported_names
+            self._used_names |= facts.used_names
+
+        # A stable sort by depth gives the order of a walk of the whole module
+        if len(chunks) > 1:
+            function_suggestions.sort(key=itemgetter(0))
+            except_suggestions.sort(key=itemgetter(0))
+        self._function_suggestions = [
+            {"line": line, "message": message, "type": kind, "category": category}
+            for _, line, message, kind, category in function_suggestions]
+        self._except_suggestions = [
+            {"line": line, "message": message, "type": kind, "category": category}
+            for _, line, message, kind, category in except_suggestions]
+
+    def imc_signals(self):
+        """Run the IMC detectors (a single scan) once and cache their results."""
+        if self._imc_signals is None:
+            with timed("imc"):
+                self._imc_signals = detect_imc_signals(self.code, self.code_only, self.ruleset)
+        return self._imc_signals
+
+    def skill_level(self):
+        """
+        Build the skill level assessment for valid code.
+
+        Returns:
+            dict: A dictionary containing skill level assessment
+        """
+        ruleset = self.ruleset
+        result = {
+            "level": "Iniciante",
             "score": 0,
             "features": {},
-            "imc_analysis": {
-                "is_imc_calculator": False,
-                "has_functional_calculation": False,
-                "has_classification": False,
-                "level": "Não Atende Critérios"
-            }
+            ruleset.result_key: ruleset.empty_analysis()
         }
+
+        if not self.is_valid:
+            return result
+
+        try:
+            with timed("grade"):
+                level, score, analysis = ruleset.grade(self.features, len(self.lines), self.imc_signals())
+
+            # Update the result
+            result["score"] = score
+            result["level"] = level
+            result["features"] = dict(self.features)
+            result[ruleset.result_key] = analysis
+
+        except Exception:
+            # In case of error in analysis, return basic level
+            pass
+
         return result
-    
-    try:
-        # Try to parse the code using AST
-        ast.parse(code)
-        
-        # If we got here, the syntax is valid
-        result["valid"] = True
-        
-        # Calculate programming skill level
-        skill_level = analyze_skill_level(code)
-        result["skill_level"] = skill_level
-        
-        return result
-    
-    except SyntaxError as e:
-        # Get the error details
-        result["error_message"] = str(e)
-        result["error_line"] = e.lineno
-        
-        # Even for invalid code, we want to provide a skill level
-        result["skill_level"] = {
-            "level": "Com Erros",
-            "score": 25,  # 25 points for code with syntax errors
-            "features": {},
-            "imc_analysis": {
-                "is_imc_calculator": detect_imc_calculator(code),
-                "has_functional_calculation": False,
-                "has_classification": False,
-                "level": "Não Atende Critérios"
-            }
+
+    def similarity(self):
+        """
+        Build the MinHash signature of the code's structure, used to find
+        near-duplicate submissions (see minhash.py).
+
+        Returns:
+            dict: signature (hex) and shingles (count), or None for code
+            without statements
+        """
+        if self._minhash is None:
+            return None
+        bins, shingles = self._minhash
+        signature = minhash.densify(bins)
+        if signature is None:
+            return None
+        return {"signature": minhash.encode(signature).hex(), "shingles": shingles}
+
+    def validation_result(self):
+        """
+        Build the result returned by validate_python_code.
+
+        Returns:
+            dict: A dictionary containing validation results
+        """
+        result = {
+            "valid": False,
+            "error_message": "",
+            "error_line": -1,
         }
-        
+
+        # Check if code is empty or whitespace only
+        if not self.code or self.code.strip() == "":
+            result["error_message"] = "O código está vazio."
+            result["skill_level"] = {
+                "level": "Vazio",
+                "score": 0,
+                "features": {},
+                self.ruleset.result_key: self.ruleset.empty_analysis()
+            }
+            return result
+
+        if self.is_valid:
+            result["valid"] = True
+            result["skill_level"] = self.skill_level()
+            similarity = self.similarity()
+            if similarity is not None:
+                result["similarity"] = similarity
+            return result
+
+        error = self.parse_error
+        if isinstance(error, SubmissionTooComplex):
+            result = analysis_error_result(
+                f"A submissão é muito grande ou complexa para ser analisada ({error}).")
+        elif isinstance(error, SyntaxError):
+            result["error_message"] = str(error)
+            result["error_line"] = error.lineno
+
+            # Even for invalid code, we want to provide a skill level
+            result["skill_level"] = {
+                "level": "Com Erros",
+                "score": 25,  # 25 points for code with syntax errors
+                "features": {},
+                self.ruleset.result_key: self.ruleset.empty_analysis(self.imc_signals())
+            }
+        else:
+            # Handle other potential errors
+            result = analysis_error_result(f"Unexpected error: {str(error)}")
+
         return result
+
+    def suggestions(self):
+        """
+        Build the improvement suggestions for the code.
+
+        Returns:
+            list: A list of improvement suggestions
+        """
+        with timed("suggestions"):
+            return self._build_suggestions()
+
+    def _build_suggestions(self):
+        suggestions = []
+
+        # Check for long lines
+        for i, line in enumerate(self.lines):
+            if len(line) > 79:  # PEP 8 recommendation
+                suggestions.append({
+                    "line": i + 1,
+                    "message": f"Line {i + 1} is too long ({len(line)} characters). Consider breaking it into multiple lines.",
+                    "type": "style",
+                    "category": "line_length"
+                })
+
+        # Check for mixed tabs and spaces
+        if '\t' in self.code and '    ' in self.code:
+            suggestions.append({
+                "line": 1,
+                "message": "Mixed use of tabs and spaces detected. Stick to using either tabs or spaces for indentation.",
+                "type": "style",
+                "category": "mixed_indentation"
+            })
+
+        if not self.is_valid:
+            # If the code could not be parsed, add it as a note
+            suggestions.append({
+                "line": 1,
+                "message": f"Could not complete full code analysis: {str(self.parse_error)}",
+                "type": "info",
+                "category": "incomplete_analysis"
+            })
+            return suggestions
+
+        suggestions.extend(self._function_suggestions)
+        suggestions.extend(self._except_suggestions)
+
+        for unused_import in self._imported_names - self._used_names:
+            suggestions.append({
+                "line": 1,  # We don't have the exact line number here
+                "message": f"Unused import: '{unused_import}'",
+                "type": "warning",
+                "category": "unused_import"
+            })
+
+        return suggestions
+
+def analysis_error_result(message):
+    """
+    Build a validation result for code whose analysis could not complete.
     
-    except Exception as e:
-        # Handle other potential errors
-        result["error_message"] = f"Unexpected error: {str(e)}"
+    Args:
+        message (str): The error message shown to the user
         
-        # Provide basic skill level for unknown errors
-        result["skill_level"] = {
+    Returns:
+        dict: A dictionary with the same shape as validate_python_code results
+    """
+    ruleset = get_ruleset()
+    return {
+        "valid": False,
+        "error_message": message,
+        "error_line": -1,
+        "skill_level": {
             "level": "Com Erros",
             "score": 25,
             "features": {},
-            "imc_analysis": {
-                "is_imc_calculator": False,
-                "has_functional_calculation": False,
-                "has_classification": False,
-                "level": "Não Atende Critérios"
-            }
+            ruleset.result_key: ruleset.empty_analysis()
         }
+    }
+
+def analyze_code(code, python_version="3", limits=None):
+    """
+    Validate the code and build its suggestions with a single parse.
+
+    Args:
+        code (str): The Python code to analyze
+        python_version (str): The Python version to validate against (2 or 3)
+        limits (AnalysisLimits): Size and complexity limits (guarded mode)
+
+    Returns:
+        tuple: (validation result, suggestions); suggestions are only
+        generated for code with valid syntax
+    """
+    validation_result, suggestions, chunk_stats = analyze_code_with_stats(code, python_version, limits)
+    record_chunk_stats(chunk_stats)
+    return validation_result, suggestions
+
+def analyze_code_with_stats(code, python_version="3", limits=None):
+    """
+    Same as analyze_code, also returning the chunk reuse of an incremental
+    analysis ({"chunks": n, "reused": k}, or None for a whole-module one).
+    """
+    analyzer = CodeAnalyzer(code or "", limits=limits)
+    result = analyzer.validation_result()
+    suggestions = analyzer.suggestions() if result["valid"] else []
+    return result, suggestions, analyzer.chunk_stats
+
+def validate_python_code(code, python_version="3", limits=None):
+    """
+    Validate Python code syntax.
+    
+    Args:
+        code (str): The Python code to validate
+        python_version (str): The Python version to validate against (2 or 3)
+        limits (AnalysisLimits): Size and complexity limits (guarded mode)
         
-        return result
+    Returns:
+        dict: A dictionary containing validation results
+    """
+    return CodeAnalyzer(code or "", limits=limits).validation_result()
         
+def check_syntax(code, max_source_bytes=None):
+    """
+    Check only the syntax of the code (no skill analysis, no suggestions).
+
+    Used for as-you-type validation, so it parses the code and nothing else.
+
+    Args:
+        code (str): The Python code to check
+        max_source_bytes (int): Larger sources are rejected without parsing
+
+    Returns:
+        dict: valid, error_message, error_line and error_column (-1 when
+        unknown)
+    """
+    result = {"valid": False, "error_message": "", "error_line": -1, "error_column": -1}
+
+    if not code or code.strip() == "":
+        result["error_message"] = "O código está vazio."
+        return result
+    if max_source_bytes and len(code.encode('utf-8', 'surrogatepass')) > max_source_bytes:
+        result["error_message"] = f"A submissão é muito grande para ser analisada (mais de {max_source_bytes} bytes)."
+        return result
+
+    try:
+        ast.parse(code)
+    except SyntaxError as e:
+        result["error_message"] = str(e)
+        result["error_line"] = e.lineno if e.lineno is not None else -1
+        result["error_column"] = e.offset if e.offset is not None else -1
+    except (RecursionError, MemoryError):
+        result["error_message"] = "A submissão é muito grande ou complexa para ser analisada."
+    except ValueError as e:
+        result["error_message"] = str(e)
+    else:
+        result["valid"] = True
+    return result
+
 def analyze_skill_level(code):
     """
     Analyze the skill level of the Python code.
@@ -100,266 +730,120 @@ def analyze_skill_level(code):
     Returns:
         dict: A dictionary containing skill level assessment
     """
-    result = {
-        "level": "Iniciante",
-        "score": 0,
-        "features": {},
-        "imc_analysis": {
-            "is_imc_calculator": False,
-            "has_functional_calculation": False, 
-            "has_classification": False,
-            "level": "Não Atende Critérios"
-        }
-    }
-    
-    # Parse the code
+    return CodeAnalyzer(code).skill_level()
+
+PatternMatch = namedtuple('PatternMatch', ['position', 'pattern', 'categories'])
+
+def _mask_non_code(code):
+    """
+    Replace comments and string literals with spaces, keeping offsets.
+
+    If the code cannot be fully tokenized, the part after the error is kept
+    as is.
+    """
+    lines = code.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    chars = list(code)
     try:
-        tree = ast.parse(code)
-        
-        # Count various programming constructs
-        features = {
-            "functions": 0,
-            "classes": 0,
-            "imports": 0,
-            "comprehensions": 0,
-            "error_handling": 0,
-            "advanced_types": 0,
-            "docstrings": 0,
-            "decorators": 0,
-            "complex_structures": 0,
-            "advanced_features": 0
-        }
-        
-        # Analysis variables
-        lines_of_code = len(code.split('\n'))
-        
-        # Check if this code is an IMC calculator
-        # We'll do this by analyzing code structure and keywords
-        is_imc_calculator = detect_imc_calculator(code)
-        has_functional_calculation = detect_functional_imc_calculation(code)
-        has_classification = detect_imc_classification(code)
-        
-        # Walk through the AST to count features
-        for node in ast.walk(tree):
-            # Count functions
-            if isinstance(node, ast.FunctionDef):
-                features["functions"] += 1
-                
-                # Check for docstrings in functions
-                if (node.body and isinstance(node.body[0], ast.Expr) and 
-                    isinstance(node.body[0].value, ast.Str)):
-                    features["docstrings"] += 1
-                    
-                # Check for decorators
-                if node.decorator_list:
-                    features["decorators"] += 1
-                    
-            # Count classes
-            elif isinstance(node, ast.ClassDef):
-                features["classes"] += 1
-                
-                # Check for docstrings in classes
-                if (node.body and isinstance(node.body[0], ast.Expr) and 
-                    isinstance(node.body[0].value, ast.Str)):
-                    features["docstrings"] += 1
-                    
-                # Check for decorators on classes
-                if node.decorator_list:
-                    features["decorators"] += 1
-                    
-            # Count imports
-            elif isinstance(node, (ast.Import, ast.ImportFrom)):
-                features["imports"] += 1
-                
-            # Count list/dict/set comprehensions
-            elif isinstance(node, (ast.ListComp, ast.DictComp, ast.SetComp)):
-                features["comprehensions"] += 1
-                
-            # Count try/except blocks (error handling)
-            elif isinstance(node, ast.Try):
-                features["error_handling"] += 1
-                
-            # Count advanced types (sets, generators)
-            elif isinstance(node, (ast.Set, ast.GeneratorExp)):
-                features["advanced_types"] += 1
-                
-            # Count complex data structures
-            elif isinstance(node, (ast.Dict, ast.List)) and len(getattr(node, 'keys', lambda: [])() or getattr(node, 'elts', [])) > 5:
-                features["complex_structures"] += 1
-                
-            # Count advanced features
-            elif isinstance(node, (ast.AsyncFunctionDef, ast.Await, ast.AsyncFor, ast.AsyncWith, ast.YieldFrom)):
-                features["advanced_features"] += 1
-        
-        # Determine if code is empty
-        is_empty = lines_of_code <= 1 or (lines_of_code <= 3 and features["functions"] == 0)
-        
-        # Calculate special score based on criteria
-        score = 0
-        
-        # Check if it's an IMC calculator
-        if detect_imc_calculator(code):
-            # IMC calculator-specific scoring
-            if has_functional_calculation and has_classification:
-                # Desejável - maximum score
-                score = 100
-                level = "Desejável"
-            elif has_functional_calculation:
-                # Crítico - medium score
-                score = 50
-                level = "Crítico"
-            else:
-                # IMC calculator but with errors - low score
-                score = 25
-                level = "Com Erros"
-        else:
-            # General Python code scoring
-            if is_empty:
-                score = 0
-                level = "Vazio"
-            else:
-                # Calculate traditional score for non-IMC code
-                features_score = (
-                    features["functions"] * 2 +
-                    features["classes"] * 3 +
-                    features["imports"] +
-                    features["comprehensions"] * 3 +
-                    features["error_handling"] * 3 +
-                    features["advanced_types"] * 2 +
-                    features["docstrings"] * 2 +
-                    features["decorators"] * 4 +
-                    features["complex_structures"] * 2 +
-                    features["advanced_features"] * 5
-                )
-                
-                # Base level on complexity
-                if features_score >= 15:
-                    level = "Avançado"
-                    score = 75
-                elif features_score >= 8:
-                    level = "Intermediário"
-                    score = 50
-                else:
-                    level = "Iniciante"
-                    score = 25
-        
-        # Determine IMC calculator level
-        imc_level = "Não Atende Critérios"
-        if is_imc_calculator:
-            if has_functional_calculation and has_classification:
-                imc_level = "Desejável"
-            elif has_functional_calculation:
-                imc_level = "Crítico"
-                
-        # Update the result
-        result["score"] = score
-        result["level"] = level
-        result["features"] = features
-        result["imc_analysis"] = {
-            "is_imc_calculator": is_imc_calculator,
-            "has_functional_calculation": has_functional_calculation,
-            "has_classification": has_classification,
-            "level": imc_level
-        }
-        
-    except Exception as e:
-        # In case of error in analysis, return basic level
+        for token in tokenize.generate_tokens(io.StringIO(code).readline):
+            if token.type in (tokenize.COMMENT, tokenize.STRING):
+                start = offsets[token.start[0] - 1] + token.start[1]
+                end = offsets[token.end[0] - 1] + token.end[1]
+                for i in range(start, end):
+                    if chars[i] != '\n':
+                        chars[i] = ' '
+    except (tokenize.TokenError, SyntaxError):
         pass
-        
-    return result
 
-def detect_imc_calculator(code):
+    return ''.join(chars)
+
+def find_imc_patterns(code, code_only=False, ruleset=None):
     """
-    Detect if the code is likely an IMC calculator.
+    Find every token pattern of the rule set (the IMC, formula and
+    classification patterns for the IMC rule set) in a single scan.
     
     Args:
         code (str): The Python code to analyze
+        code_only (bool): Ignore patterns inside comments and strings
+        ruleset (Ruleset): The rule set (default: the active one)
         
     Returns:
-        bool: True if the code appears to be an IMC calculator, False otherwise
+        list: PatternMatch tuples with the offset of the match in the
+        lowercased code, the matched pattern and its categories
     """
-    code_lower = code.lower()
-    
-    # Check for IMC-related keywords
-    imc_keywords = [
-        'imc', 'índice de massa corporal', 'indice de massa corporal', 
-        'massa corporal', 'body mass index', 'bmi',
-        'peso / (altura', 'peso/(altura', 'peso/(altura * altura)',
-        'peso / (altura * altura)', 'peso/altura**2', 'peso / altura**2',
-        'weight / (height', 'weight/(height'
+    ruleset = ruleset or get_ruleset()
+    if code_only:
+        code = _mask_non_code(code)
+    if ruleset.pattern_re is None:
+        return []
+
+    return [
+        PatternMatch(match.start(), match.group(1), ruleset.pattern_categories[match.group(1)])
+        for match in ruleset.pattern_re.finditer(code.lower())
     ]
+
+def detect_imc_signals(code, code_only=False, ruleset=None):
+    """
+    Evaluate all the criteria of the rule set over a single scan of the code.
     
-    # Check if any of the IMC keywords are in the code
-    for keyword in imc_keywords:
-        if keyword in code_lower:
-            return True
+    Args:
+        code (str): The Python code to analyze
+        code_only (bool): Ignore patterns inside comments and strings
+        ruleset (Ruleset): The rule set (default: the active one)
+        
+    Returns:
+        dict: The criteria flags; for the IMC rule set is_imc_calculator,
+        has_functional_calculation and has_classification
+    """
+    ruleset = ruleset or get_ruleset()
+    if code_only:
+        code = _mask_non_code(code)
+    return ruleset.signals(ruleset.categories(code))
+
+def detect_imc_calculator(code, code_only=False):
+    """
+    Detect if the code is likely an IMC calculator.
     
-    return False
+    Args:
+        code (str): The Python code to analyze
+        code_only (bool): Ignore keywords inside comments and strings
+        
+    Returns:
+        bool: True if the code appears to be an IMC calculator, False otherwise
+    """
+    return detect_imc_signals(code, code_only)["is_imc_calculator"]
 
-def detect_functional_imc_calculation(code):
+def detect_functional_imc_calculation(code, code_only=False):
     """
     Detect if the code has a functional IMC calculation.
     
+    The code must convert its inputs with float, contain the IMC formula and
+    show the result with print or return.
+    
     Args:
         code (str): The Python code to analyze
+        code_only (bool): Ignore patterns inside comments and strings
         
     Returns:
         bool: True if the code has a functional IMC calculation, False otherwise
     """
-    code_lower = code.lower()
-    
-    # Check for float conversions for inputs
-    has_float_conversion = 'float' in code_lower
-    
-    # Check for the IMC formula or variations
-    formula_patterns = [
-        'peso / (altura', 'peso/(altura',
-        'peso / altura**2', 'peso/altura**2',
-        'peso / (altura * altura)', 'peso/(altura*altura)',
-        'weight / (height', 'weight/(height',
-        'imc = peso', 'bmi = weight'
-    ]
-    
-    # Check if we have a proper calculation
-    has_calculation = False
-    for pattern in formula_patterns:
-        if pattern in code_lower:
-            has_calculation = True
-            break
-            
-    # Make sure print or return is used to show the result
-    has_output = 'print' in code_lower or 'return' in code_lower
-    
-    return has_float_conversion and has_calculation and has_output
+    return detect_imc_signals(code, code_only)["has_functional_calculation"]
 
-def detect_imc_classification(code):
+def detect_imc_classification(code, code_only=False):
     """
     Detect if the code includes IMC classification.
     
     Args:
         code (str): The Python code to analyze
+        code_only (bool): Ignore keywords inside comments and strings
         
     Returns:
         bool: True if the code includes IMC classification, False otherwise
     """
-    code_lower = code.lower()
-    
-    # Check for classification-related keywords and patterns
-    classification_keywords = [
-        'abaixo do peso', 'peso normal', 'sobrepeso', 'obesidade',
-        'underweight', 'normal weight', 'overweight', 'obesity',
-        'if imc <', 'if imc >', 'elif imc', 'if bmi <', 'if bmi >'
-    ]
-    
-    # Check for conditional statements, which are typically used for classification
-    has_conditionals = 'if ' in code_lower and (':' in code)
-    
-    # Check if any of the classification keywords are in the code
-    for keyword in classification_keywords:
-        if keyword in code_lower:
-            return has_conditionals
-    
-    return False
+    return detect_imc_signals(code, code_only)["has_classification"]
 
 def suggest_improvements(code):
     """
@@ -371,90 +855,214 @@ def suggest_improvements(code):
     Returns:
         list: A list of improvement suggestions
     """
-    suggestions = []
-    
-    # Check for common issues
     try:
-        # Check for long lines
-        lines = code.split('\n')
-        for i, line in enumerate(lines):
-            if len(line) > 79:  # PEP 8 recommendation
-                suggestions.append({
-                    "line": i + 1,
-                    "message": f"Line {i + 1} is too long ({len(line)} characters). Consider breaking it into multiple lines.",
-                    "type": "style"
-                })
-        
-        # Check for mixed tabs and spaces
-        if '\t' in code and '    ' in code:
-            suggestions.append({
-                "line": 1,
-                "message": "Mixed use of tabs and spaces detected. Stick to using either tabs or spaces for indentation.",
-                "type": "style"
-            })
-        
-        # Check for missing docstrings in functions
-        tree = ast.parse(code)
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                if not (node.body and isinstance(node.body[0], ast.Expr) and 
-                        isinstance(node.body[0].value, ast.Str)):
-                    suggestions.append({
-                        "line": node.lineno,
-                        "message": f"Function '{node.name}' is missing a docstring.",
-                        "type": "documentation"
-                    })
-            
-            # Check for mutable default arguments
-            if isinstance(node, ast.FunctionDef):
-                for default in [d for d in node.args.defaults if d]:
-                    if isinstance(default, (ast.List, ast.Dict, ast.Set)):
-                        suggestions.append({
-                            "line": node.lineno,
-                            "message": f"Function '{node.name}' uses a mutable default argument, which can lead to unexpected behavior.",
-                            "type": "warning"
-                        })
-        
-        # Check for bare except clauses
-        for node in ast.walk(tree):
-            if isinstance(node, ast.ExceptHandler) and node.type is None:
-                suggestions.append({
-                    "line": node.lineno,
-                    "message": "Bare except clause found. It's better to specify which exceptions to catch.",
-                    "type": "warning"
-                })
-        
-        # Check for unused imports
-        imported_names = set()
-        used_names = set()
-        
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for name in node.names:
-                    imported_names.add(name.name)
-            elif isinstance(node, ast.ImportFrom):
-                for name in node.names:
-                    if name.asname:
-                        imported_names.add(name.asname)
-                    else:
-                        imported_names.add(name.name)
-            elif isinstance(node, ast.Name):
-                used_names.add(node.id)
-        
-        for unused_import in imported_names - used_names:
-            suggestions.append({
-                "line": 1,  # We don't have the exact line number here
-                "message": f"Unused import: '{unused_import}'",
-                "type": "warning"
-            })
-    
+        return CodeAnalyzer(code).suggestions()
     except Exception as e:
         # If any error occurs during analysis, add it as a note
-        suggestions.append({
+        return [{
             "line": 1,
             "message": f"Could not complete full code analysis: {str(e)}",
-            "type": "info"
-        })
+            "type": "info",
+            "category": "incomplete_analysis"
+        }]
+
+# Command line interface: python -m validator <dir or file>...
+# It only depends on this module, so it starts without Flask or the database.
+
+CSV_FIELDS = [
+    "path", "valid", "error_line", "error_message", "skill_level", "skill_score",
+    "is_imc_calculator", "has_functional_calculation", "has_classification",
+    "imc_level", "suggestions"
+]
+
+def _iter_python_files(paths):
+    """Yield the .py files under the given files and directories, sorted."""
+    import os
+
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d != '__pycache__')
+            for name in sorted(files):
+                if name.endswith('.py'):
+                    yield os.path.join(root, name)
+
+def analyze_file(path, python_version="3"):
+    """
+    Analyze one file for the command line interface.
     
-    return suggestions
+    Args:
+        path (str): Path of the Python file
+        python_version (str): The Python version to validate against
+        
+    Returns:
+        dict: A flat record with the validation result, skill level,
+        IMC analysis, features and suggestions of the file
+    """
+    record = {"path": path}
+    try:
+        with open(path, encoding='utf-8') as file:
+            code = file.read()
+    except (OSError, UnicodeDecodeError) as e:
+        record.update(valid=False, error_line=-1, error_message=f"Could not read file: {str(e)}",
+                      read_error=True)
+        return record
+
+    result, suggestions = analyze_code(code, python_version)
+    skill_level = result["skill_level"]
+    # The criteria of the rule set (the IMC flags for the IMC rule set)
+    assignment = dict(skill_level[get_ruleset().result_key])
+    assignment_level = assignment.pop("level")
+    record.update(
+        valid=result["valid"],
+        error_line=result["error_line"],
+        error_message=result["error_message"],
+        skill_level=skill_level["level"],
+        skill_score=skill_level["score"],
+        **assignment,
+        imc_level=assignment_level,
+        features=skill_level["features"],
+        suggestions=suggestions
+    )
+    return record
+
+def _analyze_file_job(args):
+    return analyze_file(*args)
+
+def _completed_paths(output, output_format):
+    """
+    Read the paths already written to an output file, for --resume.
+    
+    A truncated last line (from an interrupted run) is removed so new
+    records are appended after the last complete one.
+    """
+    import csv
+    import json
+    import os
+
+    if not os.path.exists(output):
+        return set()
+
+    with open(output, 'rb+') as file:
+        data = file.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            file.truncate(end)
+        text = data[:end].decode('utf-8')
+
+    if output_format == 'csv':
+        return {row["path"] for row in csv.DictReader(io.StringIO(text))}
+
+    done = set()
+    for line in text.splitlines():
+        try:
+            done.add(json.loads(line)["path"])
+        except (ValueError, KeyError):
+            continue
+    return done
+
+def main(argv=None):
+    """Run the command line interface; returns the process exit code."""
+    import argparse
+    import csv
+    import json
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(
+        prog="python -m validator",
+        description="Valida e analisa arquivos Python, gravando um resultado por arquivo.")
+    parser.add_argument("paths", nargs="+", help="Arquivos ou diretórios a analisar")
+    parser.add_argument("-o", "--output", help="Arquivo de saída (padrão: saída padrão)")
+    parser.add_argument("-f", "--format", choices=["jsonl", "csv"], default="jsonl",
+                        help="Formato de saída (padrão: jsonl)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Processos em paralelo (padrão: número de CPUs)")
+    parser.add_argument("--python-version", default="3", help="Versão do Python (padrão: 3)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continua uma execução interrompida, pulando os arquivos já presentes em --output")
+    parser.add_argument("--rules", default=os.environ.get("GRADING_RULESET", "imc"),
+                        help="Conjunto de regras: nome embutido ou arquivo JSON (padrão: imc)")
+    args = parser.parse_args(argv)
+
+    from rules import use_ruleset, RulesetError
+    try:
+        ruleset = use_ruleset(args.rules)
+    except RulesetError as e:
+        parser.error(str(e))
+
+    if args.resume and not args.output:
+        parser.error("--resume requer --output")
+
+    started = time.monotonic()
+    done = _completed_paths(args.output, args.format) if args.resume else set()
+    paths = [path for path in _iter_python_files(args.paths) if path not in done]
+
+    if args.output:
+        exists = os.path.exists(args.output) and os.path.getsize(args.output) > 0
+        out = open(args.output, 'a' if args.resume else 'w', encoding='utf-8', newline='')
+        write_header = not (args.resume and exists)
+    else:
+        out = sys.stdout
+        write_header = True
+
+    writer = None
+    if args.format == 'csv':
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        if write_header:
+            writer.writeheader()
+
+    summary = {
+        "files": len(paths) + len(done),
+        "resumed": len(done),
+        "analyzed": 0,
+        "valid": 0,
+        "invalid": 0,
+        "read_errors": 0,
+        "levels": defaultdict(int),
+        "imc_levels": defaultdict(int),
+    }
+
+    jobs = [(path, args.python_version) for path in paths]
+    pool = None
+    if args.jobs > 1 and len(jobs) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(min(args.jobs, len(jobs)), initializer=use_ruleset,
+                                    initargs=(ruleset.definition,))
+        records = pool.imap_unordered(_analyze_file_job, jobs, chunksize=8)
+    else:
+        records = map(_analyze_file_job, jobs)
+
+    try:
+        for record in records:
+            if writer is not None:
+                row = dict(record)
+                row["suggestions"] = len(record.get("suggestions", []))
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+            summary["analyzed"] += 1
+            summary["valid" if record["valid"] else "invalid"] += 1
+            if record.get("read_error"):
+                summary["read_errors"] += 1
+            else:
+                summary["levels"][record["skill_level"]] += 1
+                summary["imc_levels"][record["imc_level"]] += 1
+    except KeyboardInterrupt:
+        summary["interrupted"] = True
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if out is not sys.stdout:
+            out.close()
+
+    summary["elapsed_seconds"] = round(time.monotonic() - started, 3)
+    print(json.dumps({"summary": summary}, ensure_ascii=False), file=sys.stderr)
+    return 130 if summary.get("interrupted") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
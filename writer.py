@@ -0,0 +1,194 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from metrics import GROUP_COMMIT_SIZE
+from persistence import save_analyses
+
+# Put in the queue to make the writer thread stop
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Single writer thread that saves the analyses of concurrent requests in
+    shared transactions (group commit).
+
+    A request hands its entries to the writer and waits for its
+    analysis_id. The writer takes everything that is queued (up to
+    max_batch entries) and saves it with one save_analyses call, so N
+    concurrent requests pay for one write lock and one commit instead of N.
+    While a group is being committed new requests queue up and form the
+    next group, so an idle server adds no delay; max_delay (seconds) can
+    hold a group open a little longer to make groups bigger.
+
+    Latency: a request waits for the group being committed when it arrived,
+    plus max_delay, plus the commit of its own group, as long as fewer than
+    max_batch entries are queued ahead of it; with a longer backlog it also
+    waits for one group per max_batch entries ahead of it. A request gives
+    up after timeout seconds if its group was not started by then.
+
+    The thread belongs to the process that started it and is started again
+    after a fork (e.g. gunicorn --preload), on first use. Requests still
+    queued when a thread stops or dies are handed to the next one, and the
+    requests of the group it was committing are failed.
+    """
+
+    def __init__(self, max_batch=200, max_delay=0.0, timeout=30.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self._app = None
+        self._db = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, app, db, max_batch, max_delay, timeout=30.0):
+        """
+        Set the app and database used by the writer, the size and delay of
+        the groups and how long a request waits (seconds, 0 for no limit).
+        """
+        self._app = app
+        self._db = db
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max(0.0, max_delay)
+        self.timeout = max(0.0, timeout)
+
+    def _put(self, item):
+        """Queue a request, starting the writer thread if it is not running."""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                old_queue = self._queue if self._pid == os.getpid() else None
+                self._queue = queue.Queue()
+                # Requests left behind by a stopped or dead thread of this
+                # process (after a fork they belong to the parent)
+                while old_queue is not None:
+                    try:
+                        old_item = old_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if old_item is not _STOP:
+                        self._queue.put(old_item)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name="group-commit-writer", daemon=True)
+                self._thread.start()
+            self._queue.put(item)
+
+    def save(self, entries, cache_entries=None):
+        """
+        Save analyses through the writer, waiting for their commit.
+
+        Args:
+            entries (list): (code, filename, validation result, suggestions)
+                tuples, as for save_analyses
+            cache_entries (dict): Result cache rows, saved in the same transaction
+
+        Returns:
+            list: The response data of each entry, with its analysis_id
+
+        Raises:
+            TimeoutError: If the writer did not take the request in time
+                (nothing was saved)
+            Exception: The error of the transaction, if it failed
+        """
+        future = Future()
+        self._put((entries, cache_entries or {}, future))
+        timeout = self.timeout or None
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            if future.cancel():
+                raise TimeoutError(f"The analyses were not saved within {self.timeout} s") from None
+            # Already in a group being committed: wait for its outcome
+            return future.result(timeout)
+
+    def _collect(self, pending):
+        """Wait for a request, then take the ones queued behind it (a group)."""
+        group = []
+        size = 0
+        deadline = None
+        while size < self.max_batch:
+            try:
+                if deadline is None:
+                    item = pending.get()
+                else:
+                    remaining = deadline - time.monotonic()
+                    item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                if not group:
+                    return None
+                # Commit what was taken, then stop
+                pending.put(_STOP)
+                break
+            # Skip requests that gave up waiting
+            if not item[2].set_running_or_notify_cancel():
+                continue
+            if deadline is None:
+                deadline = time.monotonic() + self.max_delay
+            group.append(item)
+            size += len(item[0])
+        return group
+
+    def _run(self, pending):
+        group = []
+        try:
+            while True:
+                group = self._collect(pending)
+                if group is None:
+                    return
+                with self._app.app_context():
+                    try:
+                        self._commit(group)
+                    finally:
+                        self._db.session.remove()
+        finally:
+            # Never leave a request waiting for a thread that is gone
+            for _, _, future in group or ():
+                if not future.done():
+                    future.set_exception(RuntimeError("The group commit writer stopped"))
+
+    def _commit(self, group):
+        entries = [entry for request_entries, _, _ in group for entry in request_entries]
+        cache_entries = {}
+        for _, request_cache_entries, _ in group:
+            cache_entries.update(request_cache_entries)
+        try:
+            results = save_analyses(entries, self._db, cache_entries=cache_entries)
+        except Exception as e:
+            if len(group) > 1:
+                # One bad request must not fail the others: save each on its own
+                for item in group:
+                    self._commit([item])
+                return
+            logging.warning(f"Group commit failed: {str(e)}")
+            group[0][2].set_exception(e)
+            return
+
+        GROUP_COMMIT_SIZE.observe(len(entries))
+        start = 0
+        for request_entries, _, future in group:
+            future.set_result(results[start:start + len(request_entries)])
+            start += len(request_entries)
+
+    def shutdown(self, timeout=5):
+        """Commit the queued requests and stop the thread."""
+        with self._lock:
+            thread, pending = self._thread, self._queue
+            self._thread = None
+        if thread is not None and self._pid == os.getpid() and thread.is_alive():
+            pending.put(_STOP)
+            thread.join(timeout)
+
+
+# Writer shared by all requests handled by this process
+group_writer = GroupCommitWriter()
+atexit.register(group_writer.shutdown)